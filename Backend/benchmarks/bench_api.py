@@ -0,0 +1,282 @@
+"""
+Benchmark: /track and /analytics end to end against a fake Supabase.
+
+Runs the real FastAPI app (lifespan, auth dependency, routes, caches)
+in-process over ASGI, with the Supabase clients replaced by
+benchmarks.fake_supabase. The fake sleeps `--latency-ms` per PostgREST
+round trip and `--auth-latency-ms` per GoTrue get_user call. N concurrent
+clients issue requests for each scenario:
+
+    track               POST /track, token already verified
+    analytics_cached    GET /analytics, result cache hit
+    analytics_uncached  GET /analytics with the result cache off
+                        (aggregation through analytics_click_counts)
+    analytics_scan      as above with analytics_use_rpc off, so raw
+                        clicks are paged and counted in Python (slow at
+                        large sizes; not run by default)
+    auth_miss           GET /analytics with a new token per request, so
+                        every request verifies with GoTrue
+
+Results (requests/sec, p50/p95/p99 latency in ms, errors) are written as
+JSON together with the commit and settings, so runs can be diffed with
+--compare.
+
+    cd Backend
+    python -m benchmarks.bench_api [--events 1000 100000 1000000 10000000]
+        [--concurrency 1 16 64] [--requests 1000] [--latency-ms 2]
+        [--output bench_api.json] [--compare previous.json]
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+# Settings are read on first import of config; the fake replaces the clients
+os.environ.setdefault("SUPABASE_URL", "http://supabase.invalid")
+os.environ.setdefault("SUPABASE_KEY", "benchmark")
+os.environ.setdefault("SUPABASE_SERVICE_KEY", "benchmark")
+
+import httpx
+import numpy as np
+
+import config
+from benchmarks.fake_supabase import FEATURES, FakeSupabase, seed
+
+SCENARIOS = ["track", "analytics_cached", "analytics_uncached", "analytics_scan", "auth_miss"]
+DEFAULT_SCENARIOS = ["track", "analytics_cached", "analytics_uncached", "auth_miss"]
+USERS = 5000
+WINDOW_DAYS = 30
+
+
+class FakeClients:
+    """Stands in for config.SupabaseClients."""
+
+    def __init__(self, fake: FakeSupabase):
+        self.anon = self.admin = fake
+
+    def session_client(self) -> FakeSupabase:
+        return self.admin
+
+    def close(self) -> None:
+        pass
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def reset_state() -> None:
+    """Drop per-process caches so every size starts cold."""
+    import middleware.auth
+    import services.analytics_cache
+    import services.blocking
+    import services.user_dimensions
+
+    middleware.auth._token_cache = middleware.auth.TokenCache(
+        max_entries=config.get_settings().auth_token_cache_max_entries
+    )
+    services.analytics_cache._analytics_cache = None
+    # Bound to the previous size's event loop
+    services.blocking._limiter = None
+    services.user_dimensions._user_dimensions = services.user_dimensions.UserDimensionCache()
+
+
+def configure(fake: FakeSupabase) -> None:
+    settings = config.get_settings()
+    # Verify tokens with (fake) GoTrue; the local JWT path has no network cost
+    settings.auth_local_verification = False
+    settings.analytics_use_rollup = False
+    settings.hot_store_enabled = False
+    settings.postgrest_max_rows = fake.max_rows
+    # The track scenario posts as fast as possible from one user
+    settings.track_rate_limit_per_second = 0
+    settings.track_max_in_flight = 0
+    config._clients = FakeClients(fake)
+
+
+def summarize(latencies: list[float], elapsed: float, errors: int) -> dict:
+    ms = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(float(np.percentile(ms, 50)), 2),
+        "p95_ms": round(float(np.percentile(ms, 95)), 2),
+        "p99_ms": round(float(np.percentile(ms, 99)), 2),
+        "max_ms": round(float(ms.max()), 2),
+    }
+
+
+async def drive(client: httpx.AsyncClient, make_request, total: int, concurrency: int) -> dict:
+    """Run `total` requests from `concurrency` workers; returns the summary."""
+    latencies: list[float] = []
+    errors = 0
+    issued = 0
+
+    async def worker():
+        nonlocal issued, errors
+        while issued < total:
+            n = issued
+            issued += 1
+            method, url, kwargs = make_request(n)
+            started = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, time.perf_counter() - started, errors)
+
+
+async def run_size(events: int, args) -> list[dict]:
+    reset_state()
+    fake = FakeSupabase(latency_ms=args.latency_ms, auth_latency_ms=args.auth_latency_ms)
+
+    started = time.perf_counter()
+    user_ids = seed(fake, USERS, events, days=args.days)
+    print(f"  seeded {events:,} events in {time.perf_counter() - started:.1f}s")
+    configure(fake)
+
+    import main
+    settings = config.get_settings()
+    token = fake.auth.issue_token(user_ids[0])
+    headers = {"Authorization": f"Bearer {token}"}
+    window_start = (datetime.now(timezone.utc) - timedelta(days=WINDOW_DAYS)).isoformat()
+    analytics_params = {"start_date": window_start}
+
+    def track(n):
+        return "POST", "/track", {"json": {"feature_name": FEATURES[n % len(FEATURES)]}, "headers": headers}
+
+    def analytics(n):
+        return "GET", "/analytics", {"params": analytics_params, "headers": headers}
+
+    def fresh_token(n):
+        user_headers = {"Authorization": f"Bearer {fake.auth.issue_token(user_ids[n % USERS])}"}
+        return "GET", "/analytics", {"params": analytics_params, "headers": user_headers}
+
+    scenarios = {
+        "track": (track, {}),
+        "analytics_cached": (analytics, {"analytics_cache_enabled": True}),
+        "analytics_uncached": (analytics, {"analytics_cache_enabled": False}),
+        "analytics_scan": (analytics, {"analytics_cache_enabled": False, "analytics_use_rpc": False}),
+        "auth_miss": (fresh_token, {"analytics_cache_enabled": True}),
+    }
+
+    results = []
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.app.router.lifespan_context(main.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for name in args.scenarios:
+                make_request, overrides = scenarios[name]
+                defaults = {key: getattr(settings, key) for key in overrides}
+                for key, value in overrides.items():
+                    setattr(settings, key, value)
+
+                try:
+                    for concurrency in args.concurrency:
+                        # Warm up: token verified, result cached, code paths loaded
+                        await drive(client, make_request, min(concurrency, 10), concurrency)
+                        gc.collect()
+
+                        calls_before = fake.calls
+                        summary = await drive(client, make_request, args.requests, concurrency)
+                        summary["db_calls_per_request"] = round((fake.calls - calls_before) / args.requests, 2)
+                        results.append({"scenario": name, "events": events, "concurrency": concurrency, **summary})
+                        print(
+                            f"  {name:<19} c={concurrency:<4} {summary['rps']:>9.1f} req/s  "
+                            f"p50 {summary['p50_ms']:>8.2f}  p95 {summary['p95_ms']:>8.2f}  "
+                            f"p99 {summary['p99_ms']:>8.2f} ms  errors {summary['errors']}"
+                        )
+                finally:
+                    for key, value in defaults.items():
+                        setattr(settings, key, value)
+
+    return results
+
+
+def compare(previous_path: str, current: dict) -> None:
+    with open(previous_path) as f:
+        previous = json.load(f)
+
+    def key(result):
+        return result["scenario"], result["events"], result["concurrency"]
+
+    before = {key(r): r for r in previous["results"]}
+    print(f"\nvs {previous.get('commit')} ({previous_path}):")
+    matched = 0
+    for result in current["results"]:
+        old = before.get(key(result))
+        if old is None or not old["rps"]:
+            continue
+        matched += 1
+        scenario, events, concurrency = key(result)
+        print(
+            f"  {scenario:<19} {events:>10,} c={concurrency:<4} "
+            f"rps {(result['rps'] / old['rps'] - 1) * 100:+7.1f}%  "
+            f"p99 {old['p99_ms']:.2f} -> {result['p99_ms']:.2f} ms"
+        )
+
+    if not matched:
+        print("  no runs with the same scenario, events and concurrency")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, nargs="+", default=[1_000, 100_000, 1_000_000])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--requests", type=int, default=1000, help="Requests per scenario and concurrency")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=DEFAULT_SCENARIOS)
+    parser.add_argument("--latency-ms", type=float, default=2.0, help="Per PostgREST round trip")
+    parser.add_argument("--auth-latency-ms", type=float, default=20.0, help="Per GoTrue get_user call")
+    parser.add_argument("--days", type=int, default=90, help="Seeded events span this many days")
+    parser.add_argument("--output", default="bench_api.json")
+    parser.add_argument("--compare", help="Earlier JSON result to diff against")
+    args = parser.parse_args()
+
+    report = {
+        "benchmark": "bench_api",
+        "commit": git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "parameters": {
+            "users": USERS,
+            "window_days": WINDOW_DAYS,
+            "days": args.days,
+            "requests": args.requests,
+            "latency_ms": args.latency_ms,
+            "auth_latency_ms": args.auth_latency_ms,
+        },
+        "results": [],
+    }
+
+    for events in args.events:
+        print(f"{events:,} events")
+        report["results"].extend(asyncio.run(run_size(events, args)))
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"\nWrote {args.output}")
+
+    if args.compare:
+        compare(args.compare, report)
+
+
+if __name__ == "__main__":
+    main()
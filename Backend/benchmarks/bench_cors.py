@@ -0,0 +1,168 @@
+"""
+Benchmark: per-request cost of the CORS layer.
+
+Compares the previous `@app.middleware("http")` CORS handler (kept here
+verbatim as `legacy_cors_handler`) with middleware.cors.OriginCORSMiddleware
+on a FastAPI app with one trivial route, and against no CORS layer at all.
+Requests are plain ASGI calls in one task, with no server or client
+involved, so the timings are framework + middleware overhead only:
+
+    get_allowed     GET from an allowed origin (headers added)
+    get_no_origin   GET without an Origin header (same-origin, curl)
+    preflight       OPTIONS from an allowed origin (answered by the layer)
+
+Before timing, both layers must produce the same status and CORS headers
+for each scenario.
+
+    cd Backend
+    python -m benchmarks.bench_cors [--requests 20000] [--repeat 3]
+"""
+
+import argparse
+import asyncio
+import re
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import Response
+
+from middleware.cors import OriginCORSMiddleware
+
+ALLOWED_ORIGIN_REGEX = re.compile(r"https://.*\.vercel\.app|http://localhost:5173")
+
+SCENARIOS = {
+    "get_allowed": ("GET", [(b"origin", b"https://dashboard.vercel.app"), (b"authorization", b"Bearer x")]),
+    "get_no_origin": ("GET", [(b"authorization", b"Bearer x")]),
+    "preflight": ("OPTIONS", [
+        (b"origin", b"https://dashboard.vercel.app"),
+        (b"access-control-request-method", b"GET"),
+        (b"access-control-request-headers", b"authorization"),
+    ]),
+}
+
+
+async def legacy_cors_handler(request: Request, call_next):
+    origin = request.headers.get("origin", "")
+
+    if request.method == "OPTIONS":
+        if ALLOWED_ORIGIN_REGEX.fullmatch(origin):
+            return Response(
+                status_code=200,
+                headers={
+                    "Access-Control-Allow-Origin": origin,
+                    "Access-Control-Allow-Methods": "GET, POST, PUT, DELETE, OPTIONS, PATCH",
+                    "Access-Control-Allow-Headers": "Content-Type, Authorization, X-Requested-With",
+                    "Access-Control-Allow-Credentials": "true",
+                    "Access-Control-Max-Age": "600",
+                }
+            )
+
+    response = await call_next(request)
+
+    if ALLOWED_ORIGIN_REGEX.fullmatch(origin):
+        response.headers["Access-Control-Allow-Origin"] = origin
+        response.headers["Access-Control-Allow-Credentials"] = "true"
+
+    return response
+
+
+def build_app(variant: str) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"status": "ok"}
+
+    if variant == "legacy":
+        app.middleware("http")(legacy_cors_handler)
+    elif variant == "asgi":
+        app.add_middleware(OriginCORSMiddleware, allow_origin_regex=ALLOWED_ORIGIN_REGEX)
+    return app
+
+
+async def call(app, method: str, headers: list) -> tuple[int, dict]:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": "/ping",
+        "raw_path": b"/ping",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"testserver"), *headers],
+        "client": ("127.0.0.1", 50000),
+        "server": ("testserver", 80),
+    }
+    received = False
+    start = {}
+
+    async def receive():
+        nonlocal received
+        if received:
+            # Only reached once the response is done
+            await asyncio.sleep(3600)
+        received = True
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            start.update(message)
+
+    await app(scope, receive, send)
+    cors = {
+        name.decode(): value.decode() for name, value in start["headers"]
+        if name.startswith(b"access-control-")
+    }
+    return start["status"], cors
+
+
+async def check_equivalent(legacy, asgi) -> None:
+    for scenario, (method, headers) in SCENARIOS.items():
+        expected = await call(legacy, method, headers)
+        actual = await call(asgi, method, headers)
+        assert actual == expected, f"{scenario}: {actual} != {expected}"
+
+
+async def time_scenario(app, method: str, headers: list, requests: int, repeat: int) -> float:
+    """Best-of-`repeat` microseconds per request."""
+    for _ in range(min(requests, 500)):
+        await call(app, method, headers)
+
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(requests):
+            await call(app, method, headers)
+        best = min(best, time.perf_counter() - started)
+    return best / requests * 1e6
+
+
+async def run(args) -> None:
+    apps = {variant: build_app(variant) for variant in ("none", "legacy", "asgi")}
+    await check_equivalent(apps["legacy"], apps["asgi"])
+
+    print(f"{'scenario':>14}  {'no CORS (us)':>13}  {'legacy (us)':>12}  {'ASGI (us)':>10}  "
+          f"{'legacy overhead':>16}  {'ASGI overhead':>14}")
+
+    for scenario, (method, headers) in SCENARIOS.items():
+        timings = {
+            variant: await time_scenario(app, method, headers, args.requests, args.repeat)
+            for variant, app in apps.items()
+        }
+        base = timings["none"]
+        print(f"{scenario:>14}  {base:>13.1f}  {timings['legacy']:>12.1f}  {timings['asgi']:>10.1f}  "
+              f"{timings['legacy'] - base:>16.1f}  {timings['asgi'] - base:>14.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=20_000, help="Requests per scenario and repeat")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
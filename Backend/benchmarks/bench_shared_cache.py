@@ -0,0 +1,203 @@
+"""
+Benchmark: per-process caches vs the shared cache tier under N workers.
+
+Simulates N uvicorn workers behind a round-robin balancer: one fixed
+stream of requests is dealt across N processes. Tokens and /analytics
+filter sets are drawn from fixed populations with a Zipf skew, as
+returning dashboard users produce them. Each process runs the real
+TokenCache and AnalyticsCache, either on their own ("local") or backed
+by a services.shared_cache.SharedCache file that all processes open
+("shared").
+
+Token verification and aggregation are sleeps of --verify-ms and
+--compute-ms, standing in for the Supabase Auth round trip and the
+analytics query. The numbers therefore show how much work the caches
+avoid, not what that work costs.
+
+Reported per (cache, workers, mode):
+    hit ratio    lookups answered without verifying / computing
+    shared       of those, answered from the shared file
+    work         verifications / computations done, across all workers
+    mean/p50/p99 lookup latency in ms, hits and misses together
+    hit p50      latency of a hit (local memory or shared file)
+
+    cd Backend
+    python -m benchmarks.bench_shared_cache [--workers 1 4 16] [--requests 16000]
+        [--tokens 2000] [--filters 300] [--verify-ms 5] [--compute-ms 20]
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import statistics
+import tempfile
+import time
+
+# Settings are read on first import of config
+os.environ.setdefault("SUPABASE_URL", "http://supabase.invalid")
+os.environ.setdefault("SUPABASE_KEY", "benchmark")
+os.environ.setdefault("SUPABASE_SERVICE_KEY", "benchmark")
+
+import numpy as np
+
+from middleware.auth import TokenCache
+from services.analytics_cache import AnalyticsCache
+from services.encoded_response import EncodedPayload
+from services.shared_cache import SharedCache
+
+CACHES = ["token", "analytics"]
+MODES = ["local", "shared"]
+FEATURES = ["date_picker", "filter_age", "filter_gender", "chart_bar", "bar_chart_zoom", "line_chart_hover"]
+
+
+def request_stream(population: int, requests: int, skew: float, seed: int) -> list[int]:
+    """Key ids drawn with P(rank k) proportional to 1 / k^skew."""
+    weights = 1.0 / np.arange(1, population + 1) ** skew
+    rng = np.random.default_rng(seed)
+    return rng.choice(population, size=requests, p=weights / weights.sum()).tolist()
+
+
+def analytics_body(key: int) -> dict:
+    """A /analytics-sized response: 30 daily points and the feature totals."""
+    return {
+        "feature_counts": [{"feature_name": name, "count": key * 7 + i, "unique_users": None} for i, name in enumerate(FEATURES)],
+        "daily_counts": [{"date": f"2026-09-{day:02d}", "count": key + day, "unique_users": None} for day in range(1, 31)],
+        "bucket": "day",
+        "downsampled": False,
+    }
+
+
+async def serve(cache_kind: str, keys: list[int], shared_path: str, verify_s: float, compute_s: float) -> dict:
+    shared = SharedCache(shared_path) if shared_path else None
+    latencies: list[float] = []
+    hit_latencies: list[float] = []
+    work = 0
+
+    if cache_kind == "token":
+        cache = TokenCache(ttl_seconds=300, max_entries=10_000)
+        cache.use_shared(shared)
+
+        async def verify(token: str):
+            nonlocal work
+            work += 1
+            await asyncio.sleep(verify_s)
+            return {"id": token, "email": f"{token}@example.com", "role": "authenticated", "metadata": {}}, None
+
+        async def lookup(key: int):
+            await cache.get_or_verify(f"token-{key}", verify)
+    else:
+        cache = AnalyticsCache(max_entries=512, ttl_seconds=300, stale_seconds=0)
+        cache.use_shared(shared, lambda payload: payload.body, EncodedPayload)
+
+        async def lookup(key: int):
+            async def compute():
+                nonlocal work
+                work += 1
+                await asyncio.sleep(compute_s)
+                return EncodedPayload.from_content(analytics_body(key))
+
+            await cache.get_or_compute((None, None, None, None, None, f"filters-{key}", 0, None), compute)
+
+    for key in keys:
+        work_before = work
+        started = time.perf_counter()
+        await lookup(key)
+        elapsed = (time.perf_counter() - started) * 1000
+        latencies.append(elapsed)
+        if work == work_before:
+            hit_latencies.append(elapsed)
+
+    if shared is not None:
+        shared.close()
+    return {
+        "latencies": latencies,
+        "hit_latencies": hit_latencies,
+        "work": work,
+        "shared_hits": cache.stats()["shared_hits"],
+    }
+
+
+def worker(cache_kind, keys, shared_path, verify_s, compute_s, barrier, results) -> None:
+    barrier.wait()
+    results.put(asyncio.run(serve(cache_kind, keys, shared_path, verify_s, compute_s)))
+
+
+def run(cache_kind: str, workers: int, mode: str, stream: list[int], args) -> dict:
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+
+    with tempfile.TemporaryDirectory() as directory:
+        shared_path = os.path.join(directory, "shared_cache.db") if mode == "shared" else ""
+        if shared_path:
+            # Created once up front, as the first worker's lifespan would
+            SharedCache(shared_path).close()
+
+        # Round-robin: worker i serves requests i, i + N, i + 2N, ...
+        processes = [
+            context.Process(
+                target=worker,
+                args=(cache_kind, stream[i::workers], shared_path, args.verify_ms / 1000, args.compute_ms / 1000,
+                      barrier, results),
+            )
+            for i in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        outcomes = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+
+    latencies = sorted(latency for outcome in outcomes for latency in outcome["latencies"])
+    hit_latencies = sorted(latency for outcome in outcomes for latency in outcome["hit_latencies"])
+    work = sum(outcome["work"] for outcome in outcomes)
+    shared_hits = sum(outcome["shared_hits"] for outcome in outcomes)
+
+    return {
+        "cache": cache_kind,
+        "workers": workers,
+        "mode": mode,
+        "hit_ratio": 1 - work / len(latencies),
+        "shared_hits": shared_hits,
+        "work": work,
+        "mean_ms": statistics.fmean(latencies),
+        "p50_ms": latencies[len(latencies) // 2],
+        "p99_ms": latencies[int(len(latencies) * 0.99)],
+        "hit_p50_ms": hit_latencies[len(hit_latencies) // 2] if hit_latencies else 0.0,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=16_000, help="requests per cache, across all workers")
+    parser.add_argument("--tokens", type=int, default=2_000, help="distinct tokens (sessions)")
+    parser.add_argument("--filters", type=int, default=300, help="distinct /analytics filter sets")
+    parser.add_argument("--skew", type=float, default=1.1)
+    parser.add_argument("--verify-ms", type=float, default=5)
+    parser.add_argument("--compute-ms", type=float, default=20)
+    parser.add_argument("--cache", choices=CACHES, nargs="+", default=CACHES)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    print(f"{'cache':<10} {'workers':>7} {'mode':<7} {'hit ratio':>9} {'shared':>6} {'work':>6} "
+          f"{'mean ms':>8} {'p50 ms':>8} {'p99 ms':>8} {'hit p50 ms':>10}")
+
+    for cache_kind in args.cache:
+        population = args.tokens if cache_kind == "token" else args.filters
+        stream = request_stream(population, args.requests, args.skew, args.seed)
+
+        for workers in args.workers:
+            for mode in MODES:
+                result = run(cache_kind, workers, mode, stream, args)
+                print(
+                    f"{cache_kind:<10} {workers:>7} {mode:<7} {result['hit_ratio']:>9.3f} {result['shared_hits']:>6} {result['work']:>6} "
+                    f"{result['mean_ms']:>8.3f} {result['p50_ms']:>8.3f} {result['p99_ms']:>8.3f} "
+                    f"{result['hit_p50_ms']:>10.4f}",
+                    flush=True,
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,647 @@
+"""
+In-process stand-in for the Supabase client, for benchmarks.
+
+Implements the parts of the PostgREST table API and GoTrue that the app
+uses: select / insert / upsert with eq, neq, gt, gte, lt, lte, in_, or_
+(including the keyset cursor form), order, limit, range and single, the
+analytics_click_counts / analytics_click_buckets functions, and
+auth.get_user. Every execute() and get_user() sleeps for a configurable
+latency, so the app sees something like a network round trip while the
+data work itself stays cheap.
+
+feature_clicks is kept in NumPy columns sorted by (timestamp, id), so
+range scans, keyset pages and aggregations stay fast with 10M rows.
+Other tables are plain lists of dicts.
+"""
+
+import itertools
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import Any, Optional
+
+import numpy as np
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_US_PER_DAY = 86_400_000_000
+
+# col.op.value terms inside or=(...), optionally grouped with and(...)
+_OR_TERM = re.compile(r'(\w+)\.(eq|neq|gt|gte|lt|lte)\.("[^"]*"|[^,()]+)')
+
+
+def _to_us(value) -> int:
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.strip('"').replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    delta = value - _EPOCH
+    return (delta.days * 86_400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+def _iso(us: int) -> str:
+    return (_EPOCH + timedelta(microseconds=int(us))).isoformat()
+
+
+def _literal(text: str) -> Any:
+    """A filter value from PostgREST syntax: int, timestamp or string."""
+    text = text.strip('"')
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(text.replace("Z", "+00:00"))
+    except ValueError:
+        return text
+
+
+def _comparable(value: Any) -> Any:
+    if isinstance(value, str):
+        try:
+            parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return value
+        return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+    return value
+
+
+_COMPARE = {
+    "eq": lambda a, b: a == b,
+    "neq": lambda a, b: a != b,
+    "gt": lambda a, b: a > b,
+    "gte": lambda a, b: a >= b,
+    "lt": lambda a, b: a < b,
+    "lte": lambda a, b: a <= b,
+}
+
+
+def _parse_or(expression: str) -> list[list[tuple[str, str, Any]]]:
+    """or=(...) as a list of alternatives, each a list of ANDed terms."""
+    alternatives = []
+    for part in re.findall(r'and\([^)]*\)|[^,]+', expression):
+        terms = [(col, op, _literal(value)) for col, op, value in _OR_TERM.findall(part)]
+        if not terms:
+            raise NotImplementedError(f"Unsupported or filter: {expression}")
+        alternatives.append(terms)
+    return alternatives
+
+
+class FakeResponse:
+    def __init__(self, data, count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+
+class FakeQuery:
+    """Records a PostgREST request; execute() hands it to the table."""
+
+    def __init__(self, db: "FakeSupabase", table: str):
+        self._db = db
+        self.table = table
+        self.op = "select"
+        self.columns = "*"
+        self.payload: Any = None
+        self.filters: list[tuple[str, str, Any]] = []
+        self.alternatives: list[list[list[tuple[str, str, Any]]]] = []
+        self.orders: list[tuple[str, bool]] = []
+        self.limit_ = None
+        self.offset = 0
+        self.single_ = False
+
+    def select(self, columns: str = "*", **kwargs):
+        self.columns = columns
+        return self
+
+    def insert(self, rows, **kwargs):
+        self.op, self.payload = "insert", rows
+        return self
+
+    def upsert(self, rows, **kwargs):
+        self.op, self.payload = "upsert", rows
+        return self
+
+    def _filter(self, column: str, op: str, value: Any):
+        self.filters.append((column, op, value))
+        return self
+
+    def eq(self, column, value):
+        return self._filter(column, "eq", value)
+
+    def neq(self, column, value):
+        return self._filter(column, "neq", value)
+
+    def gt(self, column, value):
+        return self._filter(column, "gt", value)
+
+    def gte(self, column, value):
+        return self._filter(column, "gte", value)
+
+    def lt(self, column, value):
+        return self._filter(column, "lt", value)
+
+    def lte(self, column, value):
+        return self._filter(column, "lte", value)
+
+    def in_(self, column, values):
+        return self._filter(column, "in", set(values))
+
+    def or_(self, expression: str):
+        self.alternatives.append(_parse_or(expression))
+        return self
+
+    def order(self, column: str, desc: bool = False):
+        self.orders.append((column, desc))
+        return self
+
+    def limit(self, count: int):
+        self.limit_ = count
+        return self
+
+    def range(self, start: int, end: int):
+        self.offset, self.limit_ = start, end - start + 1
+        return self
+
+    def single(self):
+        self.single_ = True
+        return self
+
+    def execute(self) -> FakeResponse:
+        self._db._round_trip()
+        rows = self._db._table(self.table).execute(self)
+
+        if self.single_:
+            if len(rows) != 1:
+                raise Exception("JSON object requested, multiple (or no) rows returned")
+            return FakeResponse(rows[0])
+        return FakeResponse(rows)
+
+    def page_size(self) -> int:
+        cap = self._db.max_rows
+        return min(self.limit_, cap) if self.limit_ is not None else cap
+
+
+class RowTable:
+    """A table as a list of dicts; filters are evaluated row by row."""
+
+    def __init__(self, key: str = "id"):
+        self.rows: list[dict] = []
+        self.version = 0
+        self._key = key
+        self._lock = threading.Lock()
+
+    def _matches(self, row: dict, query: FakeQuery) -> bool:
+        for column, op, value in query.filters:
+            actual = row.get(column)
+            if op == "in":
+                if actual not in value:
+                    return False
+            elif actual is None or not _COMPARE[op](_comparable(actual), _comparable(value)):
+                return False
+
+        for alternatives in query.alternatives:
+            if not any(
+                all(
+                    row.get(c) is not None and _COMPARE[op](_comparable(row[c]), _comparable(v))
+                    for c, op, v in terms
+                )
+                for terms in alternatives
+            ):
+                return False
+        return True
+
+    def execute(self, query: FakeQuery) -> list[dict]:
+        with self._lock:
+            if query.op != "select":
+                return self._write(query)
+            rows = [row for row in self.rows if self._matches(row, query)]
+
+        for column, desc in reversed(query.orders):
+            rows.sort(key=lambda row: _comparable(row[column]), reverse=desc)
+
+        rows = rows[query.offset:query.offset + query.page_size()]
+        if query.columns != "*":
+            columns = [c.strip() for c in query.columns.split(",")]
+            rows = [{c: row.get(c) for c in columns} for row in rows]
+        return rows
+
+    def _write(self, query: FakeQuery) -> list[dict]:
+        payload = query.payload if isinstance(query.payload, list) else [query.payload]
+        written = [dict(row) for row in payload]
+
+        if query.op == "upsert":
+            keys = {row.get(self._key) for row in written}
+            self.rows = [row for row in self.rows if row.get(self._key) not in keys]
+        self.rows.extend(written)
+        self.version += 1
+        return written
+
+
+class ClickTable:
+    """feature_clicks as NumPy columns sorted by (timestamp, id)."""
+
+    COLUMNS = ("id", "user_id", "feature_name", "timestamp")
+
+    def __init__(self):
+        self.ts = np.empty(0, dtype=np.int64)
+        self.id = np.empty(0, dtype=np.int64)
+        self.feature = np.empty(0, dtype=np.int32)
+        self.user = np.empty(0, dtype=np.int32)
+
+        self.feature_names: list[str] = []
+        self.feature_codes: dict[str, int] = {}
+        self.user_ids: list[str] = []
+        self.user_codes: dict[str, int] = {}
+
+        self._pending: list[tuple[int, int, int, int]] = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.ts) + len(self._pending)
+
+    def code_of_feature(self, name: str) -> int:
+        code = self.feature_codes.get(name)
+        if code is None:
+            code = self.feature_codes[name] = len(self.feature_names)
+            self.feature_names.append(name)
+        return code
+
+    def code_of_user(self, user_id: str) -> int:
+        code = self.user_codes.get(user_id)
+        if code is None:
+            code = self.user_codes[user_id] = len(self.user_ids)
+            self.user_ids.append(user_id)
+        return code
+
+    def load(self, ts: np.ndarray, feature: np.ndarray, user: np.ndarray) -> None:
+        """Bulk-load columns (codes must already be registered); ids follow time order."""
+        order = np.argsort(ts, kind="stable")
+        with self._lock:
+            self.ts = ts[order].astype(np.int64)
+            self.feature = feature[order].astype(np.int32)
+            self.user = user[order].astype(np.int32)
+            self.id = np.arange(1, len(ts) + 1, dtype=np.int64)
+            self._ids = itertools.count(len(ts) + 1)
+            self._pending.clear()
+
+    def _compact(self) -> None:
+        """Merge inserted rows into the sorted columns (call with the lock held)."""
+        if not self._pending:
+            return
+
+        ts, ids, feature, user = (np.array(c, dtype=np.int64) for c in zip(*self._pending))
+        self._pending.clear()
+        in_order = (not len(self.ts) or ts.min() >= self.ts[-1]) and np.all(np.diff(ts) >= 0)
+
+        self.ts = np.concatenate([self.ts, ts])
+        self.id = np.concatenate([self.id, ids])
+        self.feature = np.concatenate([self.feature, feature.astype(np.int32)])
+        self.user = np.concatenate([self.user, user.astype(np.int32)])
+
+        if not in_order:
+            order = np.lexsort((self.id, self.ts))
+            self.ts, self.id = self.ts[order], self.id[order]
+            self.feature, self.user = self.feature[order], self.user[order]
+
+    def columns(self) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Consistent (ts, id, feature, user) arrays including recent inserts."""
+        with self._lock:
+            self._compact()
+            return self.ts, self.id, self.feature, self.user
+
+    def execute(self, query: FakeQuery) -> list[dict]:
+        if query.op == "insert":
+            return self._insert(query.payload)
+        if query.op != "select":
+            raise NotImplementedError(f"feature_clicks: {query.op}")
+
+        ts, ids, feature, user = self.columns()
+        lo, hi = 0, len(ts)
+        row_filters = []
+
+        for column, op, value in query.filters:
+            if column == "timestamp" and op in ("gt", "gte", "lt", "lte"):
+                side = "right" if op in ("gt", "lte") else "left"
+                position = int(np.searchsorted(ts, _to_us(value), side=side))
+                if op in ("gt", "gte"):
+                    lo = max(lo, position)
+                else:
+                    hi = min(hi, position)
+            else:
+                row_filters.append((column, op, value))
+
+        for alternatives in query.alternatives:
+            lo = max(lo, self._cursor_position(ts, ids, alternatives))
+
+        orders = [(column, desc) for column, desc in query.orders]
+        limit = query.page_size() + query.offset
+
+        if orders and orders[0][0] == "id":
+            # Not the physical order: filter everything, then sort by id
+            index = np.arange(lo, hi)[self._mask(row_filters, slice(lo, hi), ts, ids, feature, user)]
+            index = index[np.argsort(ids[index], kind="stable")]
+            if orders[0][1]:
+                index = index[::-1]
+            index = index[:limit]
+        else:
+            reverse = bool(orders) and orders[0][1]
+            index = self._scan(row_filters, lo, hi, limit, reverse, ts, ids, feature, user)
+
+        index = index[query.offset:]
+        return self._rows(query.columns, index, ts, ids, feature, user)
+
+    def _cursor_position(self, ts, ids, alternatives) -> int:
+        """First index after a `ts.gt.X,and(ts.eq.X,id.gt.Y)` keyset cursor."""
+        cursor_ts = cursor_id = None
+        for terms in alternatives:
+            for column, op, value in terms:
+                if column == "timestamp" and op in ("gt", "eq"):
+                    cursor_ts = _to_us(value)
+                elif column == "id" and op == "gt":
+                    cursor_id = int(value)
+        if cursor_ts is None or cursor_id is None:
+            raise NotImplementedError("feature_clicks: only keyset cursors are supported in or_")
+
+        start = int(np.searchsorted(ts, cursor_ts, side="left"))
+        end = int(np.searchsorted(ts, cursor_ts, side="right"))
+        return start + int(np.searchsorted(ids[start:end], cursor_id, side="right"))
+
+    def _mask(self, row_filters, rows: slice, ts, ids, feature, user) -> np.ndarray:
+        mask = np.ones(rows.stop - rows.start, dtype=bool)
+
+        for column, op, value in row_filters:
+            if column == "feature_name":
+                codes, values = feature[rows], (
+                    {self.feature_codes.get(v, -1) for v in value} if op == "in"
+                    else self.feature_codes.get(value, -1)
+                )
+            elif column == "user_id":
+                codes, values = user[rows], (
+                    {self.user_codes.get(v, -1) for v in value} if op == "in"
+                    else self.user_codes.get(value, -1)
+                )
+            elif column == "id":
+                codes, values = ids[rows], value
+            else:
+                raise NotImplementedError(f"feature_clicks: filter on {column}")
+
+            if op == "in":
+                mask &= np.isin(codes, list(values))
+            else:
+                mask &= _COMPARE[op](codes, values)
+        return mask
+
+    def _scan(self, row_filters, lo, hi, limit, reverse, ts, ids, feature, user) -> np.ndarray:
+        """Up to `limit` matching indexes from one end of [lo, hi), in growing windows."""
+        found: list[np.ndarray] = []
+        count = 0
+        window = max(limit * 2, 4096)
+
+        while lo < hi and count < limit:
+            if reverse:
+                rows = slice(max(lo, hi - window), hi)
+                hi = rows.start
+            else:
+                rows = slice(lo, min(hi, lo + window))
+                lo = rows.stop
+
+            index = np.arange(rows.start, rows.stop)
+            if row_filters:
+                index = index[self._mask(row_filters, rows, ts, ids, feature, user)]
+            if reverse:
+                index = index[::-1]
+
+            found.append(index[:limit - count])
+            count += len(found[-1])
+            window *= 2
+
+        return np.concatenate(found) if found else np.empty(0, dtype=np.int64)
+
+    def _rows(self, columns: str, index: np.ndarray, ts, ids, feature, user) -> list[dict]:
+        selected = self.COLUMNS if columns == "*" else [c.strip() for c in columns.split(",")]
+        values = {
+            "id": lambda i: int(ids[i]),
+            "user_id": lambda i: self.user_ids[user[i]],
+            "feature_name": lambda i: self.feature_names[feature[i]],
+            "timestamp": lambda i: _iso(ts[i]),
+        }
+        getters = [(column, values[column]) for column in selected]
+        return [{column: get(i) for column, get in getters} for i in index.tolist()]
+
+    def _insert(self, payload) -> list[dict]:
+        rows = payload if isinstance(payload, list) else [payload]
+        now = _to_us(datetime.now(timezone.utc))
+        written = []
+
+        with self._lock:
+            for row in rows:
+                ts = _to_us(row["timestamp"]) if row.get("timestamp") else now
+                click_id = next(self._ids)
+                self._pending.append((
+                    ts, click_id,
+                    self.code_of_feature(row["feature_name"]),
+                    self.code_of_user(row["user_id"]),
+                ))
+                written.append({
+                    "id": click_id,
+                    "user_id": row["user_id"],
+                    "feature_name": row["feature_name"],
+                    "timestamp": _iso(ts),
+                })
+        return written
+
+
+class FakeRPC:
+    def __init__(self, db: "FakeSupabase", name: str, params: dict):
+        self._db = db
+        self._name = name
+        self._params = params
+        self._offset, self._limit = 0, None
+
+    def range(self, start: int, end: int):
+        self._offset, self._limit = start, end - start + 1
+        return self
+
+    def execute(self) -> FakeResponse:
+        self._db._round_trip()
+        function = self._db.functions.get(self._name)
+        if function is None:
+            raise Exception(f"PGRST202: Could not find the function public.{self._name}")
+
+        rows = function(**self._params)
+        if isinstance(rows, list):
+            limit = min(self._limit or self._db.max_rows, self._db.max_rows)
+            rows = rows[self._offset:self._offset + limit]
+        return FakeResponse(rows)
+
+
+class FakeAuth:
+    """GoTrue stand-in: opaque tokens mapped to user ids."""
+
+    def __init__(self, db: "FakeSupabase"):
+        self._db = db
+        self._tokens: dict[str, str] = {}
+        self._serial = itertools.count()
+
+    def issue_token(self, user_id: str) -> str:
+        token = f"fake-token-{next(self._serial)}"
+        self._tokens[token] = user_id
+        return token
+
+    def get_user(self, token: str):
+        self._db.auth_calls += 1
+        if self._db.auth_latency:
+            time.sleep(self._db.auth_latency)
+
+        user_id = self._tokens.get(token)
+        if user_id is None:
+            raise Exception("invalid JWT")
+        return SimpleNamespace(user=SimpleNamespace(
+            id=user_id, email=f"{user_id}@example.com", role="authenticated", user_metadata={}
+        ))
+
+
+class FakeSupabase:
+    """Drop-in for supabase.Client in the code paths the API uses."""
+
+    def __init__(self, latency_ms: float = 0, auth_latency_ms: Optional[float] = None, max_rows: int = 1000):
+        self.latency = latency_ms / 1000
+        self.auth_latency = (latency_ms if auth_latency_ms is None else auth_latency_ms) / 1000
+        self.max_rows = max_rows
+
+        self.clicks = ClickTable()
+        self.tables: dict[str, Any] = {"feature_clicks": self.clicks}
+        self.functions = {
+            "analytics_click_counts": self._analytics_click_counts,
+            "analytics_click_buckets": self._analytics_click_buckets,
+        }
+        self.auth = FakeAuth(self)
+
+        # Counters
+        self.calls = 0
+        self.auth_calls = 0
+
+        self._profile_arrays: Optional[tuple[int, int, np.ndarray, np.ndarray]] = None
+
+    def _round_trip(self) -> None:
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _table(self, name: str):
+        table = self.tables.get(name)
+        if table is None:
+            table = self.tables[name] = RowTable()
+        return table
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
+
+    def rpc(self, name: str, params: Optional[dict] = None) -> FakeRPC:
+        return FakeRPC(self, name, params or {})
+
+    # -- analytics functions (see setup.sql) ---------------------------------
+
+    def _profiles_by_user_code(self) -> tuple[np.ndarray, np.ndarray]:
+        """Age and gender code per click user code (-1 without a profile)."""
+        profiles = self._table("profiles")
+        cached = self._profile_arrays
+        users = len(self.clicks.user_ids)
+        if cached is not None and cached[:2] == (profiles.version, users):
+            return cached[2], cached[3]
+
+        by_id = {row["id"]: row for row in profiles.rows}
+        ages = np.full(users, -1, dtype=np.int16)
+        genders = np.full(users, -1, dtype=np.int8)
+        for code, user_id in enumerate(self.clicks.user_ids):
+            row = by_id.get(user_id)
+            if row is not None:
+                ages[code] = row["age"]
+                genders[code] = ("Male", "Female", "Other").index(row["gender"])
+
+        self._profile_arrays = (profiles.version, users, ages, genders)
+        return ages, genders
+
+    def _grouped(
+        self, bucket_us: int, offset_us: int = 0, p_start=None, p_end=None,
+        p_min_age=None, p_max_age=None, p_gender=None, p_max_id=None,
+    ):
+        ts, ids, feature, user = self.clicks.columns()
+        ages, genders = self._profiles_by_user_code()
+
+        lo = int(np.searchsorted(ts, _to_us(p_start), side="left")) if p_start else 0
+        hi = int(np.searchsorted(ts, _to_us(p_end), side="right")) if p_end else len(ts)
+        rows = slice(lo, hi)
+
+        user_age = ages[user[rows]]
+        mask = user_age >= 0
+        if p_min_age is not None:
+            mask &= user_age >= p_min_age
+        if p_max_age is not None:
+            mask &= user_age <= p_max_age
+        if p_gender:
+            mask &= genders[user[rows]] == ("Male", "Female", "Other").index(p_gender)
+        if p_max_id is not None:
+            mask &= ids[rows] <= p_max_id
+
+        buckets = (ts[rows][mask] + offset_us) // bucket_us
+        features = feature[rows][mask].astype(np.int64)
+        width = max(len(self.clicks.feature_names), 1)
+        keys, counts = np.unique(buckets * width + features, return_counts=True)
+        return [
+            (self.clicks.feature_names[key % width], key // width, count)
+            for key, count in zip(keys.tolist(), counts.tolist())
+        ]
+
+    def _analytics_click_counts(self, **params) -> list[dict]:
+        return [
+            {"feature_name": name, "day": (_EPOCH + timedelta(days=day)).date().isoformat(), "count": count}
+            for name, day, count in self._grouped(_US_PER_DAY, **params)
+        ]
+
+    def _analytics_click_buckets(self, p_bucket_seconds: int, p_bucket_offset: int = 0, **params) -> list[dict]:
+        return [
+            {"feature_name": name, "bucket": bucket * p_bucket_seconds - p_bucket_offset, "count": count}
+            for name, bucket, count in self._grouped(p_bucket_seconds * 1_000_000, p_bucket_offset * 1_000_000, **params)
+        ]
+
+
+FEATURES = ["date_picker", "filter_age", "filter_gender", "chart_bar", "bar_chart_zoom", "line_chart_hover"]
+GENDERS = ["Male", "Female", "Other"]
+
+
+def seed(fake: FakeSupabase, users: int, events: int, days: int = 90, random_seed: int = 0) -> list[str]:
+    """Fill profiles and feature_clicks with random data; returns the user ids."""
+    rng = np.random.default_rng(random_seed)
+    now = datetime.now(timezone.utc)
+    user_ids = [f"00000000-0000-4000-8000-{i:012x}" for i in range(users)]
+
+    ages = rng.integers(13, 71, users).tolist()
+    genders = rng.integers(0, len(GENDERS), users).tolist()
+    profiles = fake._table("profiles")
+    profiles.rows = [
+        {
+            "id": user_id,
+            "username": f"user_{i}",
+            "age": ages[i],
+            "gender": GENDERS[genders[i]],
+            "created_at": (now - timedelta(days=days, seconds=users - i)).isoformat(),
+        }
+        for i, user_id in enumerate(user_ids)
+    ]
+    profiles.version += 1
+
+    clicks = fake.clicks
+    for name in FEATURES:
+        clicks.code_of_feature(name)
+    codes = np.array([clicks.code_of_user(user_id) for user_id in user_ids], dtype=np.int32)
+
+    now_us = _to_us(now)
+    clicks.load(
+        ts=now_us - rng.integers(1, days * _US_PER_DAY, events, dtype=np.int64),
+        feature=rng.integers(0, len(FEATURES), events, dtype=np.int32),
+        user=codes[rng.integers(0, users, events)],
+    )
+    return user_ids
@@ -1,8 +1,12 @@
 import os
+import threading
 from functools import lru_cache
+from typing import Literal, Optional
+import httpx
 from pydantic_settings import BaseSettings
-from supabase import create_client, Client
+from supabase import create_client, Client, ClientOptions
 from dotenv import load_dotenv
+from services.metrics import record_supabase_response
 
 load_dotenv()
 
@@ -13,6 +17,127 @@ class Settings(BaseSettings):
     supabase_service_key: str
     frontend_url: str = "http://localhost:5173"
 
+    # Where clicks and profiles live: "supabase", or "sqlite" for an embedded
+    # single-node database at sqlite_path (auth still uses Supabase)
+    storage_backend: Literal["supabase", "sqlite"] = "supabase"
+    sqlite_path: str = "analytics.db"
+
+    # Shared HTTP connection pool for all Supabase clients
+    supabase_http2: bool = True
+    supabase_max_connections: int = 100
+    supabase_max_keepalive_connections: int = 20
+    supabase_keepalive_expiry_seconds: float = 30
+    supabase_timeout_seconds: float = 10
+
+    # Threads for blocking Supabase calls; keep <= supabase_max_connections
+    db_threadpool_size: int = 32
+
+    # JWT verification: checked in-process when a key is available (project
+    # JWT secret for HS256, JWKS for asymmetric keys), else via Supabase Auth
+    supabase_jwt_secret: Optional[str] = None
+    auth_local_verification: bool = True
+    auth_remote_fallback: bool = True
+    auth_jwks_url: Optional[str] = None
+    auth_jwks_refresh_seconds: int = 600
+    auth_jwt_audience: str = "authenticated"
+    auth_token_cache_max_entries: int = 10000
+    auth_token_cache_sweep_seconds: float = 60
+
+    # Token and /analytics caches shared by every worker process on the
+    # host through one SQLite file (behind each worker's own caches)
+    shared_cache_enabled: bool = False
+    shared_cache_path: str = "shared_cache.db"
+    shared_cache_max_entries: int = 100_000
+    shared_cache_sweep_seconds: float = 60
+
+    # Write-behind buffering for /track (disabled by default)
+    track_write_behind: bool = False
+    track_buffer_max_size: int = 10000
+    track_buffer_batch_size: int = 500
+    track_buffer_flush_ms: int = 200
+    track_buffer_enqueue_timeout_ms: int = 50
+    # Failed flushes are retried with exponential backoff, then dropped
+    track_buffer_max_retries: int = 5
+    track_buffer_retry_base_ms: int = 200
+
+    # /track admission control: a token bucket per user (rate 0 turns it
+    # off) and a cap on requests in flight (0 turns it off); requests over
+    # either limit get 429 + Retry-After
+    track_rate_limit_per_second: float = 10
+    track_rate_limit_burst: int = 50
+    track_rate_limit_max_users: int = 100_000
+    track_max_in_flight: int = 128
+
+    # Aggregate analytics in Postgres (analytics_click_counts function)
+    analytics_use_rpc: bool = True
+
+    # Maintain feature_clicks_daily on ingest and answer whole days from it.
+    # Run `python -m services.rollup rebuild` once after enabling.
+    analytics_use_rollup: bool = False
+
+    # In-memory /analytics result cache
+    analytics_cache_enabled: bool = True
+    analytics_cache_max_entries: int = 512
+    analytics_cache_ttl_seconds: float = 30
+    analytics_cache_stale_seconds: float = 300
+    analytics_cache_granularity_seconds: int = 60
+
+    # /analytics?cursor= deltas: a cursor chain expires this long after the
+    # full response that started it; deltas over max_rows clicks fall back
+    # to a full response
+    analytics_cursor_enabled: bool = True
+    analytics_cursor_max_age_seconds: float = 900
+    analytics_cursor_max_rows: int = 50_000
+
+    # Prometheus /metrics (request timings, stage spans, DB round trips);
+    # off by default, since without metrics_token anyone can scrape it.
+    # With metrics_token set, scrapes must send it as a bearer token
+    metrics_enabled: bool = False
+    metrics_token: Optional[str] = None
+
+    # JSON responses at least this large are sent gzip/brotli-compressed
+    response_compression_min_bytes: int = 1024
+    response_gzip_level: int = 6
+    response_brotli_quality: int = 5
+
+    # Cap on sub-day buckets (minute/hour, or days at a non-UTC offset)
+    # an /analytics window may produce before downsampling
+    analytics_max_buckets: int = 100_000
+
+    # In-memory user_id -> (age group, gender) for filtering raw clicks
+    user_dims_refresh_seconds: float = 60
+    user_dims_full_reload_seconds: float = 3600
+
+    # Columnar in-process store answering /analytics for recent windows
+    hot_store_enabled: bool = False
+    hot_store_window_days: int = 90
+    hot_store_chunk_size: int = 65536
+    hot_store_sync_seconds: float = 2
+
+    # Approximate distinct users in /analytics: a HyperLogLog sketch per
+    # (day, feature, age group, gender) cell, 2^precision bytes each
+    # (precision 12: 4 KiB, ~1.6% error). Memory grows with the days kept:
+    # up to 36 KiB per feature per day; window 0 keeps every day (unbounded)
+    unique_users_enabled: bool = False
+    unique_users_precision: int = 12
+    unique_users_window_days: int = 90
+    unique_users_sync_seconds: float = 5
+
+    # Live per-second click counts per feature pushed over SSE
+    # (/analytics/live); per worker process
+    live_enabled: bool = True
+    live_window_seconds: int = 900
+    live_tick_seconds: float = 1.0
+    live_max_subscribers: int = 1000
+    live_subscriber_queue_size: int = 30
+
+    # Rows per row group in /analytics/export Parquet files
+    export_parquet_row_group_size: int = 100_000
+
+    # Page size for scans; must not exceed PostgREST's db-max-rows
+    postgrest_max_rows: int = 1000
+    analytics_scan_parallelism: int = 4
+
     class Config:
         env_file = ".env"
         extra = "ignore"
@@ -23,13 +148,94 @@ def get_settings() -> Settings:
     return Settings()
 
 
+class SupabaseClients:
+    """
+    Long-lived Supabase clients sharing one keep-alive HTTP connection pool.
+
+    The anon and service-role clients are built once and reused by every
+    request. Operations that sign a user in (login, register, password
+    reset) change the client's auth state, so they get a fresh client from
+    `session_client()` that keeps its session to itself but still sends
+    its requests through the shared pool.
+    """
+
+    def __init__(self, settings: Settings):
+        self._settings = settings
+        self.http = self._create_http_client()
+        self.anon = create_client(settings.supabase_url, settings.supabase_key, self._options())
+        self.admin = create_client(settings.supabase_url, settings.supabase_service_key, self._options())
+
+    def _create_http_client(self) -> httpx.Client:
+        settings = self._settings
+        limits = httpx.Limits(
+            max_connections=settings.supabase_max_connections,
+            max_keepalive_connections=settings.supabase_max_keepalive_connections,
+            keepalive_expiry=settings.supabase_keepalive_expiry_seconds,
+        )
+        kwargs = dict(
+            limits=limits,
+            timeout=settings.supabase_timeout_seconds,
+            follow_redirects=True,
+        )
+        if settings.metrics_enabled:
+            # Counts round trips and rows (from Content-Range) per response
+            kwargs["event_hooks"] = {"response": [record_supabase_response]}
+
+        if settings.supabase_http2:
+            try:
+                return httpx.Client(http2=True, **kwargs)
+            except ImportError:
+                print("[Supabase] HTTP/2 needs the 'h2' package (pip install 'httpx[http2]'); using HTTP/1.1")
+        return httpx.Client(**kwargs)
+
+    def _options(self) -> ClientOptions:
+        # Requests carry their own auth headers, so one pool serves every client
+        return ClientOptions(
+            httpx_client=self.http,
+            auto_refresh_token=False,
+            persist_session=False,
+        )
+
+    def session_client(self) -> Client:
+        """Anon client with its own auth state, on the shared connection pool."""
+        return create_client(self._settings.supabase_url, self._settings.supabase_key, self._options())
+
+    def close(self) -> None:
+        self.http.close()
+
+
+_clients: Optional[SupabaseClients] = None
+_clients_lock = threading.Lock()
+
+
+def start_supabase_clients() -> SupabaseClients:
+    """Create the shared clients (called at startup; later calls reuse them)."""
+    global _clients
+    with _clients_lock:
+        if _clients is None:
+            _clients = SupabaseClients(get_settings())
+        return _clients
+
+
+def close_supabase_clients() -> None:
+    """Close the shared connection pool (called at shutdown)."""
+    global _clients
+    with _clients_lock:
+        if _clients is not None:
+            _clients.close()
+            _clients = None
+
+
 def get_supabase_client() -> Client:
     """Get Supabase client for authenticated user operations."""
-    settings = get_settings()
-    return create_client(settings.supabase_url, settings.supabase_key)
+    return (_clients or start_supabase_clients()).anon
 
 
 def get_supabase_admin_client() -> Client:
     """Get Supabase admin client for service operations (seeding, etc)."""
-    settings = get_settings()
-    return create_client(settings.supabase_url, settings.supabase_service_key)
+    return (_clients or start_supabase_clients()).admin
+
+
+def get_supabase_session_client() -> Client:
+    """Get a Supabase client for operations that sign a user in."""
+    return (_clients or start_supabase_clients()).session_client()
@@ -1,43 +1,79 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
-from fastapi.responses import Response
-from config import get_settings
+from fastapi.responses import PlainTextResponse, Response
+from config import get_settings, start_supabase_clients, close_supabase_clients, get_supabase_admin_client
 from routes import auth, tracking, analytics
+from middleware.auth import get_token_cache, start_token_cache_sweeper, stop_token_cache_sweeper
+from middleware.cors import OriginCORSMiddleware
+from middleware.metrics import MetricsMiddleware
+from services.metrics import render_metrics
+from services.write_buffer import start_write_buffer, stop_write_buffer
+from services.user_dimensions import start_user_dimensions, stop_user_dimensions
+from services.hot_store import start_hot_store, stop_hot_store
+from services.unique_users import start_unique_users, stop_unique_users
+from services.live import start_live, stop_live
+from services.storage import start_storage, stop_storage
+from services.admission import start_track_admission, stop_track_admission
+from services.analytics_cache import use_shared_analytics_cache
+from services.shared_cache import start_shared_cache, stop_shared_cache
 import re
 
 settings = get_settings()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build the Supabase clients and their connection pool once per worker
+    start_supabase_clients()
+    storage = start_storage()
+    await start_write_buffer()
+    start_track_admission()
+    start_token_cache_sweeper()
+    # Token and analytics caches shared by the workers on this host
+    shared_cache = start_shared_cache()
+    if shared_cache is not None:
+        get_token_cache().use_shared(shared_cache)
+        use_shared_analytics_cache(shared_cache)
+    if storage.name == "supabase":
+        # Caches in front of Supabase; the embedded backends query locally
+        await start_user_dimensions(get_supabase_admin_client())
+        # Needs the user dimensions to encode age group and gender
+        await start_hot_store(get_supabase_admin_client())
+    await start_unique_users(storage)
+    await start_live()
+    yield
+    # Ends open live streams so shutdown doesn't wait on them
+    await stop_live()
+    await stop_unique_users()
+    await stop_hot_store()
+    await stop_user_dimensions()
+    await stop_token_cache_sweeper()
+    get_token_cache().use_shared(None)
+    use_shared_analytics_cache(None)
+    await stop_shared_cache()
+    # Flush queued /track events before the worker exits
+    await stop_write_buffer()
+    stop_track_admission()
+    stop_storage()
+    close_supabase_clients()
+
+
 app = FastAPI(
     title="Self Action Analytics Dashboard API",
     description="Backend API for product analytics dashboard",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 ALLOWED_ORIGIN_REGEX = re.compile(r"https://.*\.vercel\.app|http://localhost:5173")
 
-@app.middleware("http")
-async def cors_handler(request: Request, call_next):
-    origin = request.headers.get("origin", "")
-
-    if request.method == "OPTIONS":
-        if ALLOWED_ORIGIN_REGEX.fullmatch(origin):
-            return Response(
-                status_code=200,
-                headers={
-                    "Access-Control-Allow-Origin": origin,
-                    "Access-Control-Allow-Methods": "GET, POST, PUT, DELETE, OPTIONS, PATCH",
-                    "Access-Control-Allow-Headers": "Content-Type, Authorization, X-Requested-With",
-                    "Access-Control-Allow-Credentials": "true",
-                    "Access-Control-Max-Age": "600",
-                }
-            )
-
-    response = await call_next(request)
+app.add_middleware(OriginCORSMiddleware, allow_origin_regex=ALLOWED_ORIGIN_REGEX)
 
-    if ALLOWED_ORIGIN_REGEX.fullmatch(origin):
-        response.headers["Access-Control-Allow-Origin"] = origin
-        response.headers["Access-Control-Allow-Credentials"] = "true"
-
-    return response
+# Outermost, so the timing covers CORS handling too
+if settings.metrics_enabled:
+    app.add_middleware(MetricsMiddleware)
+    if not settings.metrics_token:
+        print("[Metrics] METRICS_TOKEN is not set; /metrics is readable by anyone who can reach the API")
 
 app.include_router(auth.router)
 app.include_router(tracking.router)
@@ -54,6 +90,18 @@ async def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    """Prometheus scrape endpoint."""
+    if not settings.metrics_enabled:
+        return Response(status_code=404)
+
+    if settings.metrics_token and request.headers.get("authorization") != f"Bearer {settings.metrics_token}":
+        return Response(status_code=401, headers={"WWW-Authenticate": "Bearer"})
+
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
@@ -7,10 +7,18 @@ Based on best practices from:
 
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from config import get_supabase_client
-from typing import Optional
+from config import get_settings, get_supabase_client
+from middleware.token_verifier import JWKSCache, LocalTokenVerifier, get_token_expiry
+from services.blocking import run_blocking
+from services.metrics import span
+from services.shared_cache import SharedCache
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+import asyncio
 import time
 import hashlib
+import jwt
+import orjson
 
 security = HTTPBearer(auto_error=True)
 
@@ -20,58 +28,302 @@ security = HTTPBearer(auto_error=True)
 # ============================================================================
 
 class TokenCache:
-    """Thread-safe token cache with automatic expiration."""
+    """
+    Size-bounded LRU token cache with per-entry expiry.
+
+    Lookups, inserts and evictions are O(1); expired entries are dropped
+    lazily on lookup and in bulk by a periodic sweep off the request path.
+    Concurrent misses for the same token share one verification.
+    With a shared cache attached (use_shared), local misses are looked up
+    there and verified tokens stored there, so a token verified by one
+    worker process is a hit in the others.
+    """
+
+    # Namespace of verified tokens in the shared cache
+    SHARED_NAMESPACE = "token"
     
-    def __init__(self, ttl_seconds: int = 300):
-        self._cache: dict[str, tuple[dict, float]] = {}
+    def __init__(self, ttl_seconds: int = 300, max_entries: int = 10000):
+        # token hash -> (user data, expires_at epoch seconds), oldest first
+        self._cache: OrderedDict[str, tuple[dict, float]] = OrderedDict()
         self._ttl = ttl_seconds
+        self._max_entries = max_entries
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._shared: Optional[SharedCache] = None
+
+        # Counters
+        self._hits = 0
+        self._shared_hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._coalesced = 0
     
     def _get_token_hash(self, token: str) -> str:
         """Hash token for secure storage in cache."""
         return hashlib.sha256(token.encode()).hexdigest()[:16]
     
+    def _lookup(self, token_hash: str) -> Optional[dict]:
+        entry = self._cache.get(token_hash)
+        if entry is None:
+            return None
+
+        user_data, expires_at = entry
+        if time.time() >= expires_at:
+            # Expired - remove from cache
+            del self._cache[token_hash]
+            self._expirations += 1
+            return None
+
+        self._cache.move_to_end(token_hash)
+        return user_data
+
+    def _lookup_shared(self, token_hash: str) -> Optional[dict]:
+        """User data another worker verified, copied into this cache."""
+        if self._shared is None:
+            return None
+
+        entry = self._shared.get(self.SHARED_NAMESPACE, token_hash)
+        if entry is None:
+            return None
+
+        value, _, expires_at = entry
+        user_data = orjson.loads(value)
+        self._store(token_hash, user_data, expires_at)
+        self._shared_hits += 1
+        return user_data
+
+    def _shared_entry(self, token_hash: str, user_data: dict) -> tuple:
+        """Arguments for SharedCache.set with the expiry just stored locally."""
+        _, expires_at = self._cache[token_hash]
+        return self.SHARED_NAMESPACE, token_hash, orjson.dumps(user_data), expires_at
+
+    def use_shared(self, shared: Optional[SharedCache]) -> None:
+        """Attach (or with None, detach) the cross-worker cache tier."""
+        self._shared = shared
+
+    def _store(self, token_hash: str, user_data: dict, expires_at: Optional[float]) -> None:
+        if expires_at is None:
+            expires_at = time.time() + self._ttl
+        self._cache[token_hash] = (user_data, expires_at)
+        self._cache.move_to_end(token_hash)
+
+        # Evict least recently used entries beyond the size bound
+        while len(self._cache) > self._max_entries:
+            self._cache.popitem(last=False)
+            self._evictions += 1
+
     def get(self, token: str) -> Optional[dict]:
         """Get cached user data if not expired."""
         token_hash = self._get_token_hash(token)
-        
-        if token_hash in self._cache:
-            user_data, cached_at = self._cache[token_hash]
-            if time.time() - cached_at < self._ttl:
-                return user_data
-            else:
-                # Expired - remove from cache
-                del self._cache[token_hash]
-        
-        return None
+        user_data = self._lookup(token_hash) or self._lookup_shared(token_hash)
+        if user_data is None:
+            self._misses += 1
+        else:
+            self._hits += 1
+        return user_data
     
-    def set(self, token: str, user_data: dict) -> None:
-        """Cache user data for a token."""
+    def set(self, token: str, user_data: dict, expires_at: Optional[float] = None) -> None:
+        """
+        Cache user data for a token until expires_at (the token's own `exp`),
+        or for the default TTL when the expiry is unknown.
+        """
         token_hash = self._get_token_hash(token)
-        self._cache[token_hash] = (user_data, time.time())
-        
-        # Clean expired entries if cache grows too large
-        if len(self._cache) > 500:
-            self._cleanup()
+        self._store(token_hash, user_data, expires_at)
+        if self._shared is not None:
+            self._shared.set(*self._shared_entry(token_hash, user_data))
     
+    async def get_or_verify(
+        self,
+        token: str,
+        verify: Callable[[str], Awaitable[tuple[dict, Optional[float]]]],
+    ) -> dict:
+        """
+        Return cached user data, or verify the token and cache the result.
+        N concurrent requests with the same unverified token await a single
+        `verify` call. Failures are not cached.
+        """
+        token_hash = self._get_token_hash(token)
+
+        user_data = self._lookup(token_hash) or self._lookup_shared(token_hash)
+        if user_data is not None:
+            self._hits += 1
+            return user_data
+        self._misses += 1
+
+        inflight = self._inflight.get(token_hash)
+        while inflight is not None:
+            self._coalesced += 1
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                # Only the verifying request was cancelled: verify again
+                # (one waiter takes over, the rest coalesce onto it)
+                if not inflight.cancelled():
+                    raise
+            inflight = self._inflight.get(token_hash)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[token_hash] = future
+
+        try:
+            user_data, expires_at = await verify(token)
+        except Exception as e:
+            future.set_exception(e)
+            # Nobody else may be waiting; mark the exception as retrieved
+            future.exception()
+            raise
+        else:
+            self._store(token_hash, user_data, expires_at)
+            future.set_result(user_data)
+            if self._shared is not None:
+                # Off the event loop: a write may wait on another worker's
+                await run_blocking(self._shared.set, *self._shared_entry(token_hash, user_data))
+            return user_data
+        finally:
+            del self._inflight[token_hash]
+            if not future.done():
+                # The verifying request was cancelled
+                future.cancel()
+
     def invalidate(self, token: str) -> None:
-        """Remove a token from cache."""
+        """Remove a token from cache (and from the shared cache)."""
         token_hash = self._get_token_hash(token)
-        if token_hash in self._cache:
-            del self._cache[token_hash]
+        self._cache.pop(token_hash, None)
+        if self._shared is not None:
+            self._shared.delete(self.SHARED_NAMESPACE, token_hash)
     
-    def _cleanup(self) -> None:
-        """Remove expired entries from cache."""
+    def sweep(self) -> int:
+        """Remove expired entries from cache; returns how many were removed."""
         current_time = time.time()
         expired = [
-            th for th, (_, cached_at) in self._cache.items()
-            if current_time - cached_at >= self._ttl
+            th for th, (_, expires_at) in self._cache.items()
+            if current_time >= expires_at
         ]
         for th in expired:
             del self._cache[th]
+        self._expirations += len(expired)
+        return len(expired)
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def stats(self) -> dict:
+        lookups = self._hits + self._misses
+        return {
+            "entries": len(self._cache),
+            "max_entries": self._max_entries,
+            "hits": self._hits,
+            "shared_hits": self._shared_hits,
+            "misses": self._misses,
+            "hit_ratio": round(self._hits / lookups, 4) if lookups else 0.0,
+            "evictions": self._evictions,
+            "expirations": self._expirations,
+            "coalesced": self._coalesced,
+            "inflight": len(self._inflight),
+        }
+
+
+# Global token cache instance (5 minute TTL when a token has no `exp`)
+_token_cache = TokenCache(
+    ttl_seconds=300,
+    max_entries=get_settings().auth_token_cache_max_entries
+)
+
 
+def get_token_cache() -> TokenCache:
+    """Global token cache (for stats and invalidation)."""
+    return _token_cache
 
-# Global token cache instance (5 minute TTL)
-_token_cache = TokenCache(ttl_seconds=300)
+
+_sweeper_task: Optional[asyncio.Task] = None
+
+
+async def _sweep_token_cache(interval_seconds: float) -> None:
+    while True:
+        await asyncio.sleep(interval_seconds)
+        _token_cache.sweep()
+
+
+def start_token_cache_sweeper() -> None:
+    """Start the periodic expired-entry sweep (called from the app lifespan)."""
+    global _sweeper_task
+    if _sweeper_task is None:
+        interval = get_settings().auth_token_cache_sweep_seconds
+        _sweeper_task = asyncio.create_task(_sweep_token_cache(interval))
+
+
+async def stop_token_cache_sweeper() -> None:
+    global _sweeper_task
+    if _sweeper_task is not None:
+        _sweeper_task.cancel()
+        try:
+            await _sweeper_task
+        except asyncio.CancelledError:
+            pass
+        _sweeper_task = None
+
+
+# ============================================================================
+# BEST PRACTICE: Verify JWTs locally, keep the network check as a fallback
+# Avoids an auth-server round trip for every new session
+# ============================================================================
+
+_local_verifier: Optional[LocalTokenVerifier] = None
+
+
+def get_local_verifier() -> Optional[LocalTokenVerifier]:
+    """Build the local verifier from settings (None if disabled)."""
+    global _local_verifier
+    settings = get_settings()
+
+    if not settings.auth_local_verification:
+        return None
+
+    if _local_verifier is None:
+        jwks_url = settings.auth_jwks_url or f"{settings.supabase_url}/auth/v1/.well-known/jwks.json"
+        _local_verifier = LocalTokenVerifier(
+            jwt_secret=settings.supabase_jwt_secret,
+            jwks=JWKSCache(jwks_url, refresh_seconds=settings.auth_jwks_refresh_seconds),
+            audience=settings.auth_jwt_audience,
+        )
+    return _local_verifier
+
+
+def _unauthorized() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid or expired token",
+        headers={"WWW-Authenticate": "Bearer"}
+    )
+
+
+async def verify_token(token: str) -> tuple[dict, Optional[float]]:
+    """
+    Verify a token, locally when possible, else with Supabase Auth.
+
+    Returns (user_data, expires_at). Raises HTTPException on failure.
+    """
+    settings = get_settings()
+    verifier = get_local_verifier()
+
+    if verifier is not None:
+        try:
+            with span("auth.verify_local"):
+                result = await verifier.verify(token)
+        except jwt.InvalidTokenError:
+            # Bad signature, expired, wrong audience/role: the auth
+            # server would reject it too, so don't ask it
+            raise _unauthorized()
+
+        if result is not None:
+            return result
+
+        if not settings.auth_remote_fallback:
+            raise _unauthorized()
+
+    with span("auth.verify_remote"):
+        user_data = await verify_token_with_supabase(token)
+    return user_data, get_token_expiry(token)
 
 
 # ============================================================================
@@ -90,7 +342,7 @@ async def verify_token_with_supabase(token: str) -> dict:
     
     try:
         # Use Supabase's built-in token verification
-        user_response = supabase.auth.get_user(token)
+        user_response = await run_blocking(supabase.auth.get_user, token)
         
         if not user_response or not user_response.user:
             raise HTTPException(
@@ -146,7 +398,7 @@ async def get_current_user(
     """
     FastAPI dependency to get the current authenticated user.
     
-    Uses caching to minimize Supabase API calls.
+    Uses caching to minimize verification work and Supabase API calls.
     
     Usage:
         @router.get("/protected")
@@ -155,16 +407,10 @@ async def get_current_user(
     """
     token = credentials.credentials
     
-    # Check cache first
-    cached_user = _token_cache.get(token)
-    if cached_user:
-        return {**cached_user, "token": token}
-    
-    # Verify with Supabase
-    user_data = await verify_token_with_supabase(token)
-    
-    # Cache the result
-    _token_cache.set(token, user_data)
+    # Check cache first; on a miss verify locally (falling back to
+    # Supabase) and cache the result until the token expires
+    with span("auth.authenticate"):
+        user_data = await _token_cache.get_or_verify(token, verify_token)
     
     return {**user_data, "token": token}
 
@@ -188,14 +434,8 @@ async def get_optional_user(
     token = auth_header.replace("Bearer ", "")
     
     try:
-        # Check cache first
-        cached_user = _token_cache.get(token)
-        if cached_user:
-            return {**cached_user, "token": token}
-        
-        # Verify with Supabase
-        user_data = await verify_token_with_supabase(token)
-        _token_cache.set(token, user_data)
+        # Check cache first, verifying on a miss
+        user_data = await _token_cache.get_or_verify(token, verify_token)
         
         return {**user_data, "token": token}
         
@@ -0,0 +1,85 @@
+"""
+Pure-ASGI CORS middleware for the dashboard's origins.
+
+Allowed origins get `Access-Control-Allow-Origin: <origin>` plus
+credentials on every response, and their preflight (OPTIONS) requests
+are answered here with a prebuilt header list. Other origins pass
+through untouched.
+
+Unlike an `@app.middleware("http")` handler this does not run each
+request through BaseHTTPMiddleware's task and stream machinery: it only
+rewrites the headers of the `http.response.start` message, so bodies
+(including StreamingResponse) flow through as they are. Origin checks
+are memoized, so the regex runs once per distinct origin.
+"""
+
+import re
+from functools import lru_cache
+from typing import Pattern, Union
+
+_ALLOW_ORIGIN = b"access-control-allow-origin"
+_ALLOW_CREDENTIALS = b"access-control-allow-credentials"
+
+
+class OriginCORSMiddleware:
+    """Reflect allowed origins (a full-match regex) into CORS response headers."""
+
+    def __init__(
+        self,
+        app,
+        allow_origin_regex: Union[str, Pattern[str]],
+        allow_methods: str = "GET, POST, PUT, DELETE, OPTIONS, PATCH",
+        allow_headers: str = "Content-Type, Authorization, X-Requested-With",
+        max_age: int = 600,
+        memo_size: int = 1024,
+    ):
+        self.app = app
+        pattern = re.compile(allow_origin_regex) if isinstance(allow_origin_regex, str) else allow_origin_regex
+
+        # Bounded: Origin is client-controlled, so don't remember every value
+        self._is_allowed = lru_cache(maxsize=memo_size)(lambda origin: pattern.fullmatch(origin) is not None)
+
+        self._preflight_headers = [
+            (b"access-control-allow-methods", allow_methods.encode()),
+            (b"access-control-allow-headers", allow_headers.encode()),
+            (_ALLOW_CREDENTIALS, b"true"),
+            (b"access-control-max-age", str(max_age).encode()),
+            (b"content-length", b"0"),
+        ]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        origin = None
+        for name, value in scope["headers"]:
+            if name == b"origin":
+                origin = value
+                break
+
+        if origin is None or not self._is_allowed(origin.decode("latin-1")):
+            await self.app(scope, receive, send)
+            return
+
+        if scope["method"] == "OPTIONS":
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [(_ALLOW_ORIGIN, origin), *self._preflight_headers],
+            })
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        async def send_with_cors(message):
+            if message["type"] == "http.response.start":
+                headers = [
+                    (name, value) for name, value in message.get("headers", ())
+                    if name.lower() not in (_ALLOW_ORIGIN, _ALLOW_CREDENTIALS)
+                ]
+                headers.append((_ALLOW_ORIGIN, origin))
+                headers.append((_ALLOW_CREDENTIALS, b"true"))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        await self.app(scope, receive, send_with_cors)
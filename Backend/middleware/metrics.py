@@ -0,0 +1,146 @@
+"""
+Request timing middleware and the /metrics collectors.
+
+MetricsMiddleware is plain ASGI: it wraps `send` to read the status
+code and observes the duration once the response body is finished,
+labelled with the matched route template (e.g. /analytics/export)
+rather than the raw path, so the label set stays small.
+
+The collectors expose counters the caches and buffers already keep
+(their /stats endpoints) without touching the request path.
+"""
+
+import time
+from typing import Iterable
+
+from middleware.auth import get_token_cache
+from services.admission import get_track_admission
+from services.analytics_cache import get_analytics_cache
+from services.hot_store import get_hot_store
+from services.metrics import HTTP_REQUEST_SECONDS, HTTP_REQUESTS, Family, register_collector
+from services.unique_users import get_unique_users
+from services.live import get_live
+from services.shared_cache import get_shared_cache
+from services.user_dimensions import get_user_dimensions
+from services.write_buffer import get_write_buffer
+
+
+class MetricsMiddleware:
+    """Observe per-route request duration and status."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # Set by the router once a route matched
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            method = scope["method"]
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, method, route)
+            HTTP_REQUESTS.inc(method, route, str(status_code))
+
+
+def _families(prefix: str, stats: dict, counters: Iterable[str], help: str) -> list[Family]:
+    """Numeric stats entries as metric families: listed keys as counters, the rest as gauges."""
+    counters = set(counters)
+    families = []
+    for key, value in stats.items():
+        if isinstance(value, bool):
+            value = int(value)
+        if not isinstance(value, (int, float)):
+            continue
+        if key in counters:
+            families.append((f"{prefix}_{key}_total", "counter", f"{help} ({key})", [({}, value)]))
+        else:
+            families.append((f"{prefix}_{key}", "gauge", f"{help} ({key})", [({}, value)]))
+    return families
+
+
+def _collect_caches() -> list[Family]:
+    families = _families(
+        "token_cache", get_token_cache().stats(),
+        ("hits", "shared_hits", "misses", "evictions", "expirations", "coalesced"),
+        "Verified-token cache",
+    )
+
+    families += _families(
+        "user_dimensions", get_user_dimensions().stats(),
+        ("full_loads", "delta_loads", "resolved"),
+        "User dimension cache",
+    )
+
+    analytics_cache = get_analytics_cache()
+    if analytics_cache is not None:
+        families += _families(
+            "analytics_cache", analytics_cache.stats(),
+            ("hits", "stale_hits", "shared_hits", "misses", "evictions", "refreshes", "refresh_errors"),
+            "/analytics result cache",
+        )
+
+    shared_cache = get_shared_cache()
+    if shared_cache is not None:
+        families += _families(
+            "shared_cache", shared_cache.stats(),
+            ("hits", "misses", "writes", "errors", "swept"),
+            "Cross-worker shared cache",
+        )
+
+    write_buffer = get_write_buffer()
+    if write_buffer is not None:
+        families += _families(
+            "track_buffer", write_buffer.stats(),
+            ("enqueued", "rejected", "flushes", "flushed_events", "retries", "failed_flushes", "dropped_events"),
+            "/track write-behind buffer",
+        )
+
+    admission = get_track_admission()
+    if admission is not None:
+        families += _families(
+            "track_admission", admission.stats(),
+            ("admitted", "rate_limited", "overloaded", "evictions"),
+            "/track admission control",
+        )
+
+    hot_store = get_hot_store()
+    if hot_store is not None:
+        families += _families(
+            "hot_store", hot_store.stats(),
+            ("appended", "evicted_chunks"),
+            "Columnar hot store",
+        )
+
+    unique_users = get_unique_users()
+    if unique_users is not None:
+        families += _families(
+            "unique_users", unique_users.stats(),
+            ("added", "evicted_cells"),
+            "Unique-user sketches",
+        )
+
+    live = get_live()
+    if live is not None:
+        families += _families(
+            "live", live.stats(),
+            ("ticks", "snapshots", "dropped_subscribers", "recorded", "outside_window"),
+            "Live SSE counters",
+        )
+
+    return families
+
+
+register_collector(_collect_caches)
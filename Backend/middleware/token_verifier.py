@@ -0,0 +1,147 @@
+"""
+Local (in-process) verification of Supabase access tokens.
+
+Checks the signature, `exp`, `aud` and `role` claims without calling the
+Supabase Auth server. Symmetric tokens (HS256) are checked against the
+project JWT secret; asymmetric tokens (RS256/ES256) against the project's
+JWKS, which is cached and refreshed periodically.
+
+Trade-off: a locally verified token stays valid until its own `exp`,
+even if the session is revoked earlier on the auth server.
+"""
+
+import asyncio
+import time
+from typing import Optional
+
+import httpx
+import jwt
+
+# Algorithms we accept, by key source
+_SECRET_ALGORITHMS = {"HS256"}
+_JWKS_ALGORITHMS = {"RS256", "ES256"}
+
+# Don't hammer the JWKS endpoint when tokens carry an unknown `kid`
+_MIN_FORCED_REFRESH_SECONDS = 30
+
+
+class JWKSCache:
+    """Signing keys from a JWKS endpoint, cached and refreshed on a timer."""
+
+    def __init__(self, url: str, refresh_seconds: int = 600):
+        self._url = url
+        self._refresh_seconds = refresh_seconds
+        self._keys: dict[str, jwt.PyJWK] = {}
+        self._next_refresh_at = 0.0
+        self._last_attempt_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    def _since_last_attempt(self) -> float:
+        if self._last_attempt_at is None:
+            return float("inf")
+        return time.monotonic() - self._last_attempt_at
+
+    async def get_key(self, kid: Optional[str]) -> Optional[jwt.PyJWK]:
+        """Return the key for `kid`, refreshing the key set if needed."""
+        due = time.monotonic() >= self._next_refresh_at
+        # An unknown kid may be a freshly rotated key
+        unknown = kid not in self._keys and not (kid is None and len(self._keys) == 1)
+
+        if due or (unknown and self._since_last_attempt() >= _MIN_FORCED_REFRESH_SECONDS):
+            await self._refresh()
+
+        if kid is None and len(self._keys) == 1:
+            return next(iter(self._keys.values()))
+        return self._keys.get(kid)
+
+    async def _refresh(self) -> None:
+        async with self._lock:
+            # Another request may have refreshed while we waited
+            if self._since_last_attempt() < _MIN_FORCED_REFRESH_SECONDS:
+                return
+            self._last_attempt_at = time.monotonic()
+
+            try:
+                async with httpx.AsyncClient(timeout=5) as client:
+                    response = await client.get(self._url)
+                    response.raise_for_status()
+                    jwk_set = jwt.PyJWKSet.from_dict(response.json())
+            except Exception as e:
+                # Keep serving the previous keys and retry after the back-off
+                print(f"[Auth] Failed to refresh JWKS: {type(e).__name__}: {str(e)}")
+                self._next_refresh_at = time.monotonic() + _MIN_FORCED_REFRESH_SECONDS
+                return
+
+            self._keys = {key.key_id: key for key in jwk_set.keys if key.key_id}
+            self._next_refresh_at = time.monotonic() + self._refresh_seconds
+
+
+class LocalTokenVerifier:
+    """Verifies Supabase JWTs in-process."""
+
+    def __init__(
+        self,
+        jwt_secret: Optional[str] = None,
+        jwks: Optional[JWKSCache] = None,
+        audience: str = "authenticated",
+        allowed_roles: tuple[str, ...] = ("authenticated",),
+    ):
+        self._jwt_secret = jwt_secret
+        self._jwks = jwks
+        self._audience = audience
+        self._allowed_roles = allowed_roles
+
+    async def verify(self, token: str) -> Optional[tuple[dict, float]]:
+        """
+        Verify a token locally.
+
+        Returns (user_data, expires_at) on success, or None when no local
+        key can check this token (the caller may fall back to the remote
+        check). Raises jwt.InvalidTokenError if the token is invalid.
+        """
+        header = jwt.get_unverified_header(token)
+        algorithm = header.get("alg")
+
+        if algorithm in _SECRET_ALGORITHMS:
+            if not self._jwt_secret:
+                return None
+            key = self._jwt_secret
+        elif algorithm in _JWKS_ALGORITHMS:
+            if self._jwks is None:
+                return None
+            signing_key = await self._jwks.get_key(header.get("kid"))
+            if signing_key is None:
+                return None
+            key = signing_key.key
+        else:
+            raise jwt.InvalidAlgorithmError(f"Unsupported token algorithm: {algorithm}")
+
+        claims = jwt.decode(
+            token,
+            key,
+            algorithms=[algorithm],
+            audience=self._audience,
+            options={"require": ["exp", "sub"]},
+        )
+
+        if claims.get("role") not in self._allowed_roles:
+            raise jwt.InvalidTokenError("Token role is not allowed")
+
+        user_data = {
+            "id": claims["sub"],
+            "email": claims.get("email"),
+            "role": claims.get("role"),
+            "metadata": claims.get("user_metadata") or {}
+        }
+        return user_data, float(claims["exp"])
+
+
+def get_token_expiry(token: str) -> Optional[float]:
+    """Read `exp` from a token without verifying it (for cache expiry only)."""
+    try:
+        claims = jwt.decode(token, options={"verify_signature": False})
+    except jwt.InvalidTokenError:
+        return None
+
+    exp = claims.get("exp")
+    return float(exp) if exp is not None else None
@@ -1,6 +1,9 @@
-from datetime import datetime
-from typing import Optional, Literal
-from pydantic import BaseModel, Field, EmailStr
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional, Literal
+from pydantic import BaseModel, Field, EmailStr, field_validator
+
+# Client clocks drift; tolerate timestamps slightly ahead of the server
+MAX_CLIENT_CLOCK_SKEW = timedelta(minutes=5)
 
 
 class UserRegister(BaseModel):
@@ -44,6 +47,43 @@ class TrackResponse(BaseModel):
     message: str
 
 
+class BatchTrackEvent(TrackEvent):
+    timestamp: Optional[datetime] = Field(
+        default=None,
+        description="Client-side event time; defaults to server time"
+    )
+
+    @field_validator("timestamp")
+    @classmethod
+    def timestamp_not_in_future(cls, value: Optional[datetime]) -> Optional[datetime]:
+        if value is None:
+            return value
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        if value > datetime.now(timezone.utc) + MAX_CLIENT_CLOCK_SKEW:
+            raise ValueError("timestamp is in the future")
+        return value
+
+
+class TrackBatch(BaseModel):
+    # Items are validated one by one in the route so that a single bad
+    # event is rejected on its own instead of failing the whole batch.
+    events: list[Any] = Field(min_length=1, max_length=500)
+
+
+class TrackBatchResult(BaseModel):
+    index: int
+    accepted: bool
+    error: Optional[str] = None
+
+
+class TrackBatchResponse(BaseModel):
+    success: bool
+    accepted: int
+    rejected: int
+    results: list[TrackBatchResult]
+
+
 class AnalyticsQuery(BaseModel):
     start_date: Optional[datetime] = None
     end_date: Optional[datetime] = None
@@ -54,16 +94,26 @@ class AnalyticsQuery(BaseModel):
 class FeatureCount(BaseModel):
     feature_name: str
     count: int
+    # Approximate distinct users (HyperLogLog); None when not available
+    unique_users: Optional[int] = None
 
 
 class DailyCount(BaseModel):
     date: str
     count: int
+    unique_users: Optional[int] = None
 
 
 class AnalyticsResponse(BaseModel):
     feature_counts: list[FeatureCount]
+    # One point per time bucket; `date` is the bucket's local label
     daily_counts: list[DailyCount]
+    bucket: Literal["minute", "hour", "day", "week", "month"] = "day"
+    downsampled: bool = False
+    # Pass back as ?cursor= for the counts stored since this response
+    cursor: Optional[str] = None
+    # True when the counts are increments to add to the previous response
+    delta: bool = False
 
 
 class UserProfile(BaseModel):
@@ -1,111 +1,289 @@
-from datetime import datetime
+import time
+from datetime import datetime, timezone
 from typing import Optional
-from fastapi import APIRouter, Depends, HTTPException, Query
-from models import AnalyticsResponse, FeatureCount, DailyCount
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from models import AnalyticsResponse
 from middleware.auth import get_current_user
-from config import get_supabase_admin_client
+from config import get_settings
+from services.analytics import build_analytics_response
+from services.analytics_cache import get_analytics_cache, round_filter_window, make_cache_key
+from services.analytics_cursor import InvalidCursor, encode_cursor, fetch_click_deltas, read_cursor
+from services.blocking import run_blocking
+from services.buckets import SECONDS_PER_DAY, Bucket, BucketSpec, epoch_seconds
+from services.encoded_response import EncodedPayload
+from services.export import MEDIA_TYPES, ExportFormat, parquet_available, stream_export
+from services.hot_store import get_hot_store
+from services.live import get_live
+from services.metrics import span
+from services.storage import get_storage
+from services.unique_users import get_unique_users
 
 router = APIRouter(prefix="/analytics", tags=["Analytics"])
 
 
-def get_age_range(age_group: str) -> tuple[int, int]:
-    """Convert age group string to min/max range."""
-    if age_group == "<18":
-        return (0, 17)
-    elif age_group == "18-40":
-        return (18, 40)
-    elif age_group == ">40":
-        return (41, 150)
-    return (0, 150)
-
-
 @router.get("", response_model=AnalyticsResponse)
 async def get_analytics(
+    request: Request,
     start_date: Optional[datetime] = Query(None, description="Filter start date"),
     end_date: Optional[datetime] = Query(None, description="Filter end date"),
     age_group: Optional[str] = Query(None, description="Age group: <18, 18-40, >40"),
     gender: Optional[str] = Query(None, description="Gender: Male, Female, Other"),
     feature_name: Optional[str] = Query(None, description="Specific feature for daily counts"),
+    bucket: Bucket = Query("day", description="Time bucket: minute, hour, day, week, month"),
+    tz_offset_minutes: int = Query(0, ge=-14 * 60, le=14 * 60, description="Bucket boundaries' UTC offset, minutes east of UTC"),
+    max_points: Optional[int] = Query(None, ge=3, le=10000, description="Downsample the series to at most this many points"),
+    cursor: Optional[str] = Query(None, description="Cursor from a previous response: return only counts stored since"),
     current_user: dict = Depends(get_current_user)
 ):
     """
     Retrieve aggregated analytics data with optional filters.
     Returns:
     - feature_counts: Total clicks per feature
-    - daily_counts: Daily click counts (for selected feature or all)
+    - daily_counts: Click counts per time bucket (for selected feature or all)
+    With unique_users_enabled, both also carry approximate distinct users
+    (null for sub-day or non-UTC buckets).
+    The body is compressed for clients that accept gzip/br and carries an
+    ETag; a matching If-None-Match gets an empty 304.
+    Responses carry a `cursor`; passed back with the same filters, it
+    returns only the counts of clicks stored since (`delta: true`) for
+    the client to add to what it has. An expired cursor or one issued for
+    other filters gets a full response (`delta: false`) instead.
+    Deltas are not downsampled, so a downsampled series (max_points)
+    carries no cursor, and cursor cannot be combined with max_points.
     """
-    # Use admin client to bypass RLS and see all data
-    supabase = get_supabase_admin_client()
+    settings = get_settings()
+    buckets = BucketSpec(bucket, tz_offset_minutes)
 
-    try:
-        # Build base query joining feature_clicks with profiles
-        # We need to use RPC or raw SQL for complex joins
-        # For simplicity, we'll do two queries
+    if cursor and max_points:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="cursor cannot be combined with max_points; deltas are not downsampled"
+        )
 
-        # Get all relevant user IDs based on age/gender filters
-        profile_query = supabase.table("profiles").select("id")
+    # Minute/hour buckets grow with the window; refuse unbounded series
+    if buckets.base_seconds < SECONDS_PER_DAY:
+        end_seconds = epoch_seconds(end_date or datetime.now(timezone.utc))
+        estimate = buckets.estimate_base_buckets(epoch_seconds(start_date) if start_date else None, end_seconds)
+        if estimate is None or estimate > settings.analytics_max_buckets:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"'{bucket}' buckets need a start_date and at most "
+                       f"{settings.analytics_max_buckets} buckets; narrow the date range"
+            )
 
-        if age_group:
-            min_age, max_age = get_age_range(age_group)
-            profile_query = profile_query.gte("age", min_age).lte("age", max_age)
+    storage = get_storage()
+    cache = get_analytics_cache()
 
-        if gender:
-            profile_query = profile_query.eq("gender", gender)
+    if cache is not None:
+        # Round the window so near-identical requests share an entry;
+        # the rounded window is also what gets computed
+        start_date, end_date = round_filter_window(
+            start_date, end_date, settings.analytics_cache_granularity_seconds
+        )
 
-        profile_response = profile_query.execute()
-        user_ids = [p["id"] for p in profile_response.data] if profile_response.data else []
+    # What a cursor is bound to; max_points only shapes the full series
+    cursor_filters = make_cache_key(
+        start_date, end_date, age_group, gender, feature_name, bucket, tz_offset_minutes
+    )
 
-        if not user_ids:
-            return AnalyticsResponse(feature_counts=[], daily_counts=[])
+    position = None
+    if cursor and settings.analytics_cursor_enabled:
+        try:
+            position = read_cursor(cursor, cursor_filters, settings.analytics_cursor_max_age_seconds)
+        except InvalidCursor as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
-        clicks_query = supabase.table("feature_clicks").select("*").in_("user_id", user_ids)
+    async def compute() -> EncodedPayload:
+        # Grouped (feature, bucket, count) tuples from the storage backend
+        # (for Supabase: the hot store, the rollup, the aggregation RPC or a
+        # raw scan, depending on what is available)
+        high_id = None
+        with span("analytics.aggregate"):
+            if settings.analytics_cursor_enabled and not max_points:
+                # Counts stop at high_id, so the next delta starts right after them
+                issued_at = time.time()
+                groups, high_id = await storage.aggregate_clicks_snapshot(
+                    start_date, end_date, age_group, gender, buckets.base_seconds, buckets.base_offset_seconds
+                )
+            else:
+                groups = await storage.aggregate_clicks(
+                    start_date, end_date, age_group, gender, buckets.base_seconds, buckets.base_offset_seconds
+                )
+        unique_users = None
+        sketches = get_unique_users()
+        if sketches is not None:
+            with span("analytics.unique_users"):
+                unique_users = await run_blocking(
+                    sketches.query, start_date, end_date, age_group, gender, feature_name, buckets
+                )
+        with span("analytics.build"):
+            content = build_analytics_response(groups, feature_name, buckets, max_points, unique_users)
+            if high_id is not None:
+                content["cursor"] = encode_cursor(high_id, issued_at, cursor_filters)
+        # Serialized once; cache hits reuse the bytes and the ETag
+        with span("analytics.serialize"):
+            return EncodedPayload.from_content(content)
 
-        if start_date:
-            clicks_query = clicks_query.gte("timestamp", start_date.isoformat())
+    async def compute_delta(high_id: int, issued_at: int) -> Optional[EncodedPayload]:
+        with span("analytics.delta"):
+            deltas = await run_blocking(
+                fetch_click_deltas, storage, high_id, start_date, end_date, age_group, gender,
+                buckets.base_seconds, buckets.base_offset_seconds,
+                settings.analytics_cursor_max_rows, settings.postgrest_max_rows
+            )
+        if deltas is None:
+            return None
 
-        if end_date:
-            clicks_query = clicks_query.lte("timestamp", end_date.isoformat())
+        groups, high_id = deltas
+        content = build_analytics_response(groups, feature_name, buckets)
+        # The chain keeps the first issue time, so it ends in a full refresh
+        content["cursor"] = encode_cursor(high_id, issued_at, cursor_filters)
+        content["delta"] = True
+        return EncodedPayload.from_content(content)
 
-        clicks_response = clicks_query.execute()
-        clicks = clicks_response.data if clicks_response.data else []
+    try:
+        if position is not None:
+            payload = await compute_delta(*position)
+            if payload is not None:
+                with span("analytics.respond"):
+                    return payload.to_response(request)
 
-        feature_count_map: dict[str, int] = {}
-        for click in clicks:
-            fname = click["feature_name"]
-            feature_count_map[fname] = feature_count_map.get(fname, 0) + 1
+        if cache is None:
+            payload = await compute()
+            with span("analytics.respond"):
+                return payload.to_response(request)
 
-        feature_counts = [
-            FeatureCount(feature_name=k, count=v)
-            for k, v in sorted(feature_count_map.items(), key=lambda x: -x[1])
-        ]
+        key = make_cache_key(
+            start_date, end_date, age_group, gender, feature_name,
+            bucket, tz_offset_minutes, max_points
+        )
 
-        # Aggregate daily counts
-        # If feature_name specified, filter for that feature only
-        filtered_clicks = clicks
-        if feature_name:
-            filtered_clicks = [c for c in clicks if c["feature_name"] == feature_name]
+        with span("analytics.cache"):
+            payload = await cache.get_or_compute(key, compute)
+        with span("analytics.respond"):
+            return payload.to_response(request)
 
-        daily_count_map: dict[str, int] = {}
-        for click in filtered_clicks:
-            ts = click["timestamp"]
-            if isinstance(ts, str):
-                date_str = ts[:10]  # YYYY-MM-DD
-            else:
-                date_str = ts.strftime("%Y-%m-%d")
-            daily_count_map[date_str] = daily_count_map.get(date_str, 0) + 1
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to fetch analytics: {str(e)}"
+        )
 
-        daily_counts = [
-            DailyCount(date=k, count=v)
-            for k, v in sorted(daily_count_map.items())
-        ]
 
-        return AnalyticsResponse(
-            feature_counts=feature_counts,
-            daily_counts=daily_counts
+@router.get("/export")
+async def export_clicks(
+    format: ExportFormat = Query("ndjson", description="ndjson, csv or parquet"),
+    start_date: Optional[datetime] = Query(None, description="Filter start date"),
+    end_date: Optional[datetime] = Query(None, description="Filter end date"),
+    age_group: Optional[str] = Query(None, description="Age group: <18, 18-40, >40"),
+    gender: Optional[str] = Query(None, description="Gender: Male, Female, Other"),
+    feature_name: Optional[str] = Query(None, description="Only clicks on this feature"),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Stream raw click events matching the /analytics filters.
+    Rows are read with keyset pagination and written as they arrive, so
+    exports of any size run in constant memory.
+    Requires authentication.
+    """
+    if format == "parquet" and not parquet_available():
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Parquet export needs the pyarrow package on the server"
         )
 
-    except Exception as e:
+    pages = get_storage().export_pages(start_date, end_date, age_group, gender, feature_name)
+
+    # The generator is synchronous, so Starlette iterates it in a worker thread
+    body = stream_export(pages, format)
+
+    return StreamingResponse(
+        body,
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="feature_clicks.{format}"'}
+    )
+
+
+@router.get("/live")
+async def live_counts(current_user: dict = Depends(get_current_user)):
+    """
+    Server-Sent Events stream of per-second click counts per feature over
+    the last live_window_seconds: a snapshot, then one delta per tick.
+    Replaces polling /analytics for "last 15 minutes" views without any
+    database reads. Counts come from this worker's /track traffic.
+    Requires authentication; EventSource cannot set headers, so read it
+    with fetch() and a streaming body reader.
+    """
+    live = get_live()
+    if live is None:
         raise HTTPException(
-            status_code=500,
-            detail=f"Failed to fetch analytics: {str(e)}"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Live counters are disabled"
+        )
+
+    if live.full():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many live subscribers, retry shortly",
+            headers={"Retry-After": "5"}
         )
+
+    return StreamingResponse(
+        live.stream(),
+        media_type="text/event-stream",
+        # Keep proxies from caching or buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/live/stats")
+async def live_stats(current_user: dict = Depends(get_current_user)):
+    """
+    Live stream subscribers, tick timing and recorded events.
+    Requires authentication.
+    """
+    live = get_live()
+    if live is None:
+        return {"enabled": False}
+
+    return {"enabled": True, **live.stats()}
+
+
+@router.get("/cache/stats")
+async def analytics_cache_stats(current_user: dict = Depends(get_current_user)):
+    """
+    Result cache counters (hits, misses, evictions).
+    Requires authentication.
+    """
+    cache = get_analytics_cache()
+    if cache is None:
+        return {"enabled": False}
+
+    return {"enabled": True, **cache.stats()}
+
+
+@router.get("/hot-store/stats")
+async def hot_store_stats(current_user: dict = Depends(get_current_user)):
+    """
+    Columnar hot store size and coverage.
+    Requires authentication.
+    """
+    hot_store = get_hot_store()
+    if hot_store is None:
+        return {"enabled": False}
+
+    return {"enabled": True, **hot_store.stats()}
+
+
+@router.get("/unique-users/stats")
+async def unique_users_stats(current_user: dict = Depends(get_current_user)):
+    """
+    HyperLogLog sketch cells, memory and error bound.
+    Requires authentication.
+    """
+    sketches = get_unique_users()
+    if sketches is None:
+        return {"enabled": False}
+
+    return {"enabled": True, **sketches.stats()}
@@ -1,7 +1,10 @@
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status
 from models import UserRegister, UserLogin, AuthResponse, PasswordResetRequest, PasswordUpdate
-from config import get_supabase_client, get_supabase_admin_client, get_settings
-from supabase import create_client
+from config import get_supabase_session_client, get_settings
+from middleware.auth import get_current_user, get_token_cache
+from services.blocking import run_blocking
+from services.storage import get_storage
+from services.user_dimensions import get_user_dimensions
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
@@ -11,11 +14,12 @@ async def register(user_data: UserRegister):
     """
     Register a new user with Supabase Auth and create profile.
     """
-    supabase = get_supabase_client()
+    # sign_up stores the new session on the client, so don't use the shared one
+    supabase = get_supabase_session_client()
 
     try:
         # Create auth user in Supabase
-        auth_response = supabase.auth.sign_up({
+        auth_response = await run_blocking(supabase.auth.sign_up, {
             "email": user_data.email,
             "password": user_data.password
         })
@@ -28,8 +32,7 @@ async def register(user_data: UserRegister):
 
         user_id = auth_response.user.id
 
-        # Create profile in profiles table (use admin client to bypass RLS)
-        admin_supabase = get_supabase_admin_client()
+        # Create profile in the storage backend (Supabase: admin client, bypassing RLS)
         profile_data = {
             "id": user_id,
             "username": user_data.username,
@@ -37,9 +40,9 @@ async def register(user_data: UserRegister):
             "gender": user_data.gender
         }
 
-        profile_response = admin_supabase.table("profiles").upsert(profile_data, on_conflict="id").execute()
+        profile = await run_blocking(get_storage().upsert_profile, profile_data)
 
-        if not profile_response.data:
+        if not profile:
             # Rollback: delete auth user if profile creation fails
             # Note: This requires service role key for admin operations
             raise HTTPException(
@@ -47,6 +50,9 @@ async def register(user_data: UserRegister):
                 detail="Failed to create user profile"
             )
 
+        # Analytics filters this user's clicks without re-reading profiles
+        get_user_dimensions().upsert(user_id, user_data.age, user_data.gender)
+
         return AuthResponse(
             access_token=auth_response.session.access_token,
             user={
@@ -78,10 +84,10 @@ async def login(credentials: UserLogin):
     """
     Authenticate user and return JWT token.
     """
-    supabase = get_supabase_client()
+    supabase = get_supabase_session_client()
 
     try:
-        auth_response = supabase.auth.sign_in_with_password({
+        auth_response = await run_blocking(supabase.auth.sign_in_with_password, {
             "email": credentials.email,
             "password": credentials.password
         })
@@ -95,9 +101,7 @@ async def login(credentials: UserLogin):
         user_id = auth_response.user.id
 
         # Fetch user profile
-        profile_response = supabase.table("profiles").select("*").eq("id", user_id).single().execute()
-
-        profile = profile_response.data if profile_response.data else {}
+        profile = await run_blocking(get_storage().get_profile, user_id) or {}
 
         return AuthResponse(
             access_token=auth_response.session.access_token,
@@ -124,12 +128,13 @@ async def forgot_password(request: PasswordResetRequest):
     """
     Send password reset email via Supabase Auth.
     """
-    supabase = get_supabase_client()
+    supabase = get_supabase_session_client()
     settings = get_settings()
 
     try:
         # Supabase sends reset email with link to redirect_to URL
-        supabase.auth.reset_password_email(
+        await run_blocking(
+            supabase.auth.reset_password_email,
             request.email,
             options={
                 "redirect_to": f"{settings.frontend_url}/reset-password"
@@ -149,17 +154,18 @@ async def reset_password(data: PasswordUpdate):
     """
     Update user password using recovery token from Supabase.
     """
-    settings = get_settings()
-
     try:
-        # Create a new client with the recovery access token
-        supabase = create_client(settings.supabase_url, settings.supabase_key)
+        # Isolated client for the recovery session (shares the connection pool)
+        supabase = get_supabase_session_client()
+
+        def update_password():
+            # Set the session with the recovery token
+            supabase.auth.set_session(data.access_token, "")
 
-        # Set the session with the recovery token
-        supabase.auth.set_session(data.access_token, "")
+            # Update the user's password
+            supabase.auth.update_user({"password": data.new_password})
 
-        # Update the user's password
-        supabase.auth.update_user({"password": data.new_password})
+        await run_blocking(update_password)
 
         return {"message": "Password updated successfully"}
 
@@ -168,3 +174,12 @@ async def reset_password(data: PasswordUpdate):
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Failed to reset password. The link may have expired."
         )
+
+
+@router.get("/token-cache/stats")
+async def token_cache_stats(current_user: dict = Depends(get_current_user)):
+    """
+    Token cache counters (hits, misses, evictions, coalesced verifications).
+    Requires authentication.
+    """
+    return get_token_cache().stats()
@@ -1,39 +1,113 @@
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
 from fastapi import APIRouter, Depends, HTTPException, status
-from models import TrackEvent, TrackResponse
+from pydantic import ValidationError
+from models import (
+    TrackEvent, TrackResponse, BatchTrackEvent, TrackBatch,
+    TrackBatchResult, TrackBatchResponse
+)
 from middleware.auth import get_current_user
-from config import get_supabase_admin_client
+from services.admission import AdmissionRejected, get_track_admission, retry_after_header
+from services.blocking import run_blocking
+from services.live import record_live_clicks
+from services.metrics import span
+from services.storage import get_storage
+from services.write_buffer import get_write_buffer, BufferFullError
 
 router = APIRouter(prefix="/track", tags=["Tracking"])
 
 
+def _buffer_full_error() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Tracking is temporarily overloaded, retry shortly",
+        headers={"Retry-After": "1"}
+    )
+
+
+@asynccontextmanager
+async def _admitted(user_id: str, events: int) -> AsyncIterator[None]:
+    """Hold an admission slot for a request of `events` events; 429 if shed."""
+    admission = get_track_admission()
+    if admission is None:
+        yield
+        return
+
+    try:
+        admission.acquire(user_id, events)
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e),
+            headers={"Retry-After": retry_after_header(e.retry_after)}
+        )
+
+    try:
+        yield
+    finally:
+        admission.release()
+
+
+async def admit_tracking(current_user: dict = Depends(get_current_user)) -> AsyncIterator[dict]:
+    """
+    The authenticated user, once admitted by the /track rate and load limits.
+    Shed requests get 429 with Retry-After.
+    """
+    async with _admitted(current_user["id"], 1):
+        yield current_user
+
+
+async def admit_tracking_batch(
+    batch: TrackBatch,
+    current_user: dict = Depends(get_current_user)
+) -> AsyncIterator[dict]:
+    """As admit_tracking, charging the user's rate limit once per event in the batch."""
+    async with _admitted(current_user["id"], len(batch.events)):
+        yield current_user
+
+
 @router.post("", response_model=TrackResponse)
 async def track_event(
     event: TrackEvent,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(admit_tracking)
 ):
     """
     Record a user interaction (feature click).
     Requires authentication.
     """
-    # Use admin client to bypass RLS for tracking
-    supabase = get_supabase_admin_client()
+    click_data = {
+        "user_id": current_user["id"],
+        "feature_name": event.feature_name
+        # timestamp defaults to NOW() in database
+    }
 
-    try:
-        # Insert click event
-        click_data = {
-            "user_id": current_user["id"],
-            "feature_name": event.feature_name
-            # timestamp defaults to NOW() in database
-        }
+    # Write-behind mode: queue the event and return without waiting on the DB
+    write_buffer = get_write_buffer()
+    if write_buffer is not None:
+        try:
+            with span("track.enqueue"):
+                await write_buffer.put(click_data)
+        except BufferFullError:
+            raise _buffer_full_error()
 
-        response = supabase.table("feature_clicks").insert(click_data).execute()
+        record_live_clicks([click_data])
+        return TrackResponse(
+            success=True,
+            message=f"Event '{event.feature_name}' queued for tracking"
+        )
 
-        if not response.data:
+    try:
+        with span("track.insert"):
+            inserted = await run_blocking(get_storage().insert_clicks, [click_data])
+
+        if not inserted:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to record event"
             )
 
+        record_live_clicks([click_data])
         return TrackResponse(
             success=True,
             message=f"Event '{event.feature_name}' tracked successfully"
@@ -46,3 +120,91 @@ async def track_event(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to track event: {str(e)}"
         )
+
+
+@router.post("/batch", response_model=TrackBatchResponse)
+async def track_batch(
+    batch: TrackBatch,
+    current_user: dict = Depends(admit_tracking_batch)
+):
+    """
+    Record several user interactions with a single bulk insert.
+    Invalid events are rejected individually; the rest are stored.
+    Requires authentication.
+    """
+    results: list[TrackBatchResult] = []
+    click_rows: list[dict] = []
+
+    for index, raw_event in enumerate(batch.events):
+        try:
+            event = BatchTrackEvent.model_validate(raw_event)
+        except ValidationError as e:
+            error = e.errors()[0]
+            location = ".".join(str(part) for part in error["loc"]) or "event"
+            results.append(TrackBatchResult(
+                index=index,
+                accepted=False,
+                error=f"{location}: {error['msg']}"
+            ))
+            continue
+
+        click_data = {
+            "user_id": current_user["id"],
+            "feature_name": event.feature_name
+        }
+        if event.timestamp:
+            click_data["timestamp"] = event.timestamp.isoformat()
+
+        click_rows.append(click_data)
+        results.append(TrackBatchResult(index=index, accepted=True))
+
+    accepted = len(click_rows)
+
+    write_buffer = get_write_buffer()
+    if click_rows and write_buffer is not None:
+        try:
+            await write_buffer.put_many(click_rows)
+        except BufferFullError:
+            raise _buffer_full_error()
+
+    elif click_rows:
+        try:
+            inserted = await run_blocking(get_storage().insert_clicks, click_rows)
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Failed to track events: {str(e)}"
+            )
+
+        if len(inserted) != accepted:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Failed to record events"
+            )
+
+    if click_rows:
+        record_live_clicks(click_rows)
+
+    return TrackBatchResponse(
+        success=accepted > 0,
+        accepted=accepted,
+        rejected=len(results) - accepted,
+        results=results
+    )
+
+
+@router.get("/stats")
+async def tracking_stats(current_user: dict = Depends(get_current_user)):
+    """
+    Write-behind buffer counters (queue depth, flush latency) and
+    admission control counters (rate-limited and shed requests).
+    Requires authentication.
+    """
+    admission = get_track_admission()
+    admission_stats = {"admission": admission.stats() if admission is not None else None}
+
+    write_buffer = get_write_buffer()
+    if write_buffer is None:
+        return {"write_behind": False, **admission_stats}
+
+    return {"write_behind": True, **write_buffer.stats(), **admission_stats}
@@ -1,7 +1,45 @@
+"""
+Seed data and synthetic load generator.
 
-import random
-from datetime import datetime, timedelta
-from config import get_supabase_admin_client
+    cd Backend
+    python seed.py                         # 55 users, 500 clicks over 30 days into Supabase
+    python seed.py --users 100000 --events 10000000 --days 365 \\
+        --user-skew 1.1 --feature-skew 0.8 --target sqlite --output load.db
+    python seed.py ... --target csv --output clicks.csv   # + clicks.profiles.csv
+    python seed.py ... --resume            # continue an interrupted run
+
+Generation is deterministic for a given --seed and --end: the users and
+every chunk of events come from their own RNG streams, so chunks can be
+generated in any order, in parallel, and regenerated on resume. Clicks
+pick users and features from bounded Zipf distributions (exponent 0 is
+uniform; with 1.1 the top 1% of users produce roughly half the clicks).
+
+Chunks are bulk-written with at most --concurrency in flight. Finished
+chunks are checkpointed to <output>.progress.json (seed.progress.json for
+Supabase) and skipped by --resume. File outputs resume exactly; with
+Supabase or SQLite a hard kill can repeat the chunks finished in the
+last second before it.
+
+The sqlite target writes the schema used by STORAGE_BACKEND=sqlite; its
+click indexes are dropped during the load and rebuilt at the end, so
+don't point a running API at the same file. The csv/ndjson targets write
+files that can be bulk-loaded (COPY) into the feature_clicks and profiles
+tables. Local targets need no Supabase credentials; user ids are derived
+from usernames.
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from typing import Callable, Iterable, Iterator, Optional
+
+import numpy as np
 
 # Feature names that will be tracked
 FEATURE_NAMES = [
@@ -26,133 +64,454 @@ FIRST_NAMES = [
 
 GENDERS = ["Male", "Female", "Other"]
 
+# Young, middle, older: pick a bracket, then an age within it
+AGE_BRACKETS = [(13, 17), (18, 40), (41, 65)]
 
-def generate_dummy_users(count=55):
-    """Generate dummy user data with varied ages and genders."""
-    users = []
-    for name in FIRST_NAMES[:count]:
-        # Randomly pick an age bracket, then random age within it
-        age_bracket = random.choice(["young", "middle", "older"])
-        if age_bracket == "young":
-            age = random.randint(13, 17)
-        elif age_bracket == "middle":
-            age = random.randint(18, 40)
-        else:
-            age = random.randint(41, 65)
+# Namespace for deterministic user ids in local targets
+USER_ID_NAMESPACE = uuid.UUID("6f1c1a52-4c1e-4a8e-9a43-3c0f5d0b7e21")
+
+CHECKPOINT_INTERVAL_SECONDS = 1.0
+INSERT_ATTEMPTS = 3
+
+
+def generate_users(count: int, seed: int) -> list[dict]:
+    """Dummy users with varied ages and genders; the first 55 keep the classic names."""
+    # One stream per attribute, so user i is the same whatever the count
+    brackets = np.random.default_rng([seed, 0, 0]).integers(0, len(AGE_BRACKETS), count)
+    low = np.array([bracket[0] for bracket in AGE_BRACKETS])[brackets]
+    high = np.array([bracket[1] for bracket in AGE_BRACKETS])[brackets]
+    ages = np.random.default_rng([seed, 0, 1]).integers(low, high + 1)
+    genders = np.random.default_rng([seed, 0, 2]).integers(0, len(GENDERS), count)
 
+    users = []
+    for i in range(count):
+        name = FIRST_NAMES[i % len(FIRST_NAMES)].lower()
+        username = name if i < len(FIRST_NAMES) else f"{name}{i}"
         users.append({
-            "email": f"{name.lower()}@test.com",
+            "email": f"{username}@test.com",
             "password": "test123",
-            "username": name.lower(),
-            "age": age,
-            "gender": random.choice(GENDERS)
+            "username": username,
+            "age": int(ages[i]),
+            "gender": GENDERS[genders[i]]
         })
     return users
 
 
-DUMMY_USERS = generate_dummy_users(55)
+def zipf_cdf(n: int, exponent: float) -> np.ndarray:
+    """Cumulative probabilities of ranks 1..n with P(k) proportional to k^-exponent."""
+    weights = 1.0 / np.arange(1, n + 1, dtype=np.float64) ** exponent
+    cdf = np.cumsum(weights)
+    return cdf / cdf[-1]
 
 
-def create_seed_users(supabase):
-    """Create seed users and return their IDs."""
-    user_ids = []
+def sample_zipf(cdf: np.ndarray, rng: np.random.Generator, size: int) -> np.ndarray:
+    """Zero-based ranks drawn from `cdf`."""
+    ranks = np.searchsorted(cdf, rng.random(size), side="right")
+    return np.minimum(ranks, len(cdf) - 1)
 
-    for user in DUMMY_USERS:
-        user_id = None
 
-        # First, check if profile already exists
-        try:
-            existing = supabase.table("profiles").select("id").eq("username", user["username"]).single().execute()
-            if existing.data:
-                user_id = existing.data["id"]
-                user_ids.append(user_id)
-                print(f"Using existing user: {user['username']}")
-                continue
-        except:
-            pass  # Profile doesn't exist, continue to create
-
-        # Try to create auth user
+class EventPlan:
+    """The synthetic click stream, split into independently generated chunks."""
+
+    def __init__(self, events: int, users: int, days: int, end: datetime,
+                 user_skew: float, feature_skew: float, seed: int, chunk_size: int):
+        self.events = events
+        self.chunk_size = chunk_size
+        self.chunks = (events + chunk_size - 1) // chunk_size
+        self._seed = seed
+        self._end_us = int(end.timestamp()) * 1_000_000
+        self._span_us = days * 86_400_000_000
+        self._user_cdf = zipf_cdf(users, user_skew)
+        # Ranks in FEATURE_NAMES order: date_picker is the most clicked
+        self._feature_cdf = zipf_cdf(len(FEATURE_NAMES), feature_skew)
+
+    def chunk_length(self, index: int) -> int:
+        return min(self.chunk_size, self.events - index * self.chunk_size)
+
+    def chunk(self, index: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(user index, feature index, epoch microseconds) of the events in chunk `index`, in time order."""
+        size = self.chunk_length(index)
+        rng = np.random.default_rng([self._seed, 1, index])
+
+        users = sample_zipf(self._user_cdf, rng, size)
+        features = sample_zipf(self._feature_cdf, rng, size)
+        timestamps = self._end_us - rng.integers(0, self._span_us, size)
+
+        order = np.argsort(timestamps, kind="stable")
+        return users[order], features[order], timestamps[order]
+
+
+def iso_timestamps(timestamps_us: np.ndarray) -> list[str]:
+    return [value + "+00:00" for value in np.datetime_as_string(timestamps_us.astype("datetime64[us]"), unit="us")]
+
+
+def local_user_id(username: str) -> str:
+    return str(uuid.uuid5(USER_ID_NAMESPACE, username))
+
+
+class SupabaseTarget:
+    """Auth users, profiles and clicks through the Supabase admin client."""
+
+    parallel_writes = True
+
+    def __init__(self, concurrency: int):
+        from config import get_settings, get_supabase_admin_client
+        from postgrest import ReturnMethod
+
+        self._supabase = get_supabase_admin_client()
+        self._page_size = get_settings().postgrest_max_rows
+        self._minimal = ReturnMethod.minimal
+        self._concurrency = concurrency
+        self.position = 0
+
+    def _existing_profiles(self) -> dict[str, str]:
+        """username -> id of every profile, keyset-paged."""
+        found, last_id = {}, None
+        while True:
+            query = self._supabase.table("profiles").select("id, username").order("id").limit(self._page_size)
+            if last_id is not None:
+                query = query.gt("id", last_id)
+            rows = query.execute().data
+            for row in rows:
+                found[row["username"]] = row["id"]
+            if len(rows) < self._page_size:
+                return found
+            last_id = rows[-1]["id"]
+
+    def _create_auth_user(self, user: dict) -> Optional[str]:
         try:
-            auth_response = supabase.auth.admin.create_user({
+            response = self._supabase.auth.admin.create_user({
                 "email": user["email"],
                 "password": user["password"],
                 "email_confirm": True
             })
+            return response.user.id if response.user else None
+        except Exception:
+            # Most likely the account exists already; looked up below
+            return None
 
-            if auth_response.user:
-                user_id = auth_response.user.id
-        except Exception as e:
-            # Auth user might already exist, try to get by email
-            try:
-                users_response = supabase.auth.admin.list_users()
-                for u in users_response:
-                    if u.email == user["email"]:
-                        user_id = u.id
-                        break
-            except:
-                print(f"Could not find/create auth user {user['username']}: {e}")
-                continue
-
-        if not user_id:
-            print(f"Skipping {user['username']}: no user_id")
-            continue
-
-        # Create/upsert profile
-        try:
-            supabase.table("profiles").upsert({
-                "id": user_id,
-                "username": user["username"],
-                "age": user["age"],
-                "gender": user["gender"]
-            }).execute()
-            user_ids.append(user_id)
-            print(f"Created user: {user['username']} ({user_id})")
-        except Exception as e:
-            print(f"Error creating profile for {user['username']}: {e}")
-
-    return user_ids
-
-
-def create_seed_clicks(supabase, user_ids: list[str], num_clicks: int = 100):
-    """Generate random feature clicks across the last 30 days."""
-    if not user_ids:
-        print("No users available for seeding clicks")
+    def _auth_ids_by_email(self, emails: set[str]) -> dict[str, str]:
+        """One pass over the auth users for accounts that exist without a profile."""
+        found, page = {}, 1
+        while len(found) < len(emails):
+            users = self._supabase.auth.admin.list_users(page=page, per_page=1000)
+            if not users:
+                break
+            for auth_user in users:
+                if auth_user.email in emails:
+                    found[auth_user.email] = auth_user.id
+            page += 1
+        return found
+
+    def prepare_users(self, users: list[dict]) -> list[str]:
+        existing = self._existing_profiles()
+        missing = [user for user in users if user["username"] not in existing]
+        print(f"   {len(users) - len(missing)} users already have profiles, creating {len(missing)}")
+        if not missing:
+            return [existing[user["username"]] for user in users]
+
+        with ThreadPoolExecutor(self._concurrency) as executor:
+            created = list(executor.map(self._create_auth_user, missing))
+
+        unresolved = {user["email"] for user, user_id in zip(missing, created) if user_id is None}
+        by_email = self._auth_ids_by_email(unresolved) if unresolved else {}
+
+        profiles = []
+        for user, user_id in zip(missing, created):
+            user_id = user_id or by_email.get(user["email"])
+            if user_id is None:
+                sys.exit(f"Could not find or create auth user {user['username']}; rerun to retry")
+            existing[user["username"]] = user_id
+            profiles.append({"id": user_id, "username": user["username"], "age": user["age"], "gender": user["gender"]})
+
+        def upsert(start: int) -> None:
+            self._supabase.table("profiles").upsert(
+                profiles[start:start + self._page_size], on_conflict="id", returning=self._minimal
+            ).execute()
+
+        with ThreadPoolExecutor(self._concurrency) as executor:
+            list(executor.map(upsert, range(0, len(profiles), self._page_size)))
+
+        return [existing[user["username"]] for user in users]
+
+    def write(self, user_ids: list[str], chunk: tuple[np.ndarray, np.ndarray, np.ndarray]) -> None:
+        users, features, timestamps = chunk
+        rows = [
+            {"user_id": user_ids[user], "feature_name": FEATURE_NAMES[feature], "timestamp": timestamp}
+            for user, feature, timestamp in zip(users.tolist(), features.tolist(), iso_timestamps(timestamps))
+        ]
+        # Within PostgREST's row limit, so one request per page
+        for start in range(0, len(rows), self._page_size):
+            page = rows[start:start + self._page_size]
+            for attempt in range(1, INSERT_ATTEMPTS + 1):
+                try:
+                    self._supabase.table("feature_clicks").insert(page, returning=self._minimal).execute()
+                    break
+                except Exception:
+                    if attempt == INSERT_ATTEMPTS:
+                        raise
+                    time.sleep(0.5 * 2 ** attempt)
+
+    def close(self) -> None:
+        pass
+
+
+class SQLiteTarget:
+    """The embedded backend's database file (see services/sqlite_storage.py)."""
+
+    parallel_writes = False
+
+    def __init__(self, path: str):
+        from services.sqlite_storage import _SCHEMA, SQLiteStorage
+
+        self._storage = SQLiteStorage(path)
+        self._schema = _SCHEMA
+        self._connection = self._storage._connection()
+        self.position = 0
+
+        # Appending to two B-trees per row is most of the insert cost;
+        # building the indexes once at the end is about 3x faster overall
+        self._connection.execute("DROP INDEX IF EXISTS idx_feature_clicks_ts")
+        self._connection.execute("DROP INDEX IF EXISTS idx_feature_clicks_user")
+
+    def prepare_users(self, users: list[dict]) -> list[str]:
+        profiles = [
+            {"id": local_user_id(user["username"]), "username": user["username"], "age": user["age"], "gender": user["gender"]}
+            for user in users
+        ]
+        with self._connection:
+            self._connection.executemany(
+                """
+                INSERT INTO profiles (id, username, age, gender) VALUES (:id, :username, :age, :gender)
+                ON CONFLICT (id) DO UPDATE SET
+                    username = excluded.username, age = excluded.age, gender = excluded.gender
+                """,
+                profiles,
+            )
+        return [profile["id"] for profile in profiles]
+
+    def write(self, user_ids: list[str], chunk: tuple[np.ndarray, np.ndarray, np.ndarray]) -> None:
+        users, features, timestamps = chunk
+        with self._connection:
+            self._connection.executemany(
+                "INSERT INTO feature_clicks (user_id, feature_name, ts) VALUES (?, ?, ?)",
+                zip([user_ids[user] for user in users.tolist()],
+                    [FEATURE_NAMES[feature] for feature in features.tolist()],
+                    timestamps.tolist()),
+            )
+
+    def close(self) -> None:
+        print("   Rebuilding indexes...")
+        self._connection.executescript(self._schema)
+        self._storage.close()
+
+
+class FileTarget:
+    """Clicks in one CSV or NDJSON file, profiles in <stem>.profiles.<ext> next to it."""
+
+    parallel_writes = False
+
+    def __init__(self, path: str, file_format: str, offset: int):
+        self._format = file_format
+        stem, extension = os.path.splitext(path)
+        self._profiles_path = f"{stem}.profiles{extension or '.' + file_format}"
+
+        # Anything after the checkpointed offset is a partial chunk
+        self._file = open(path, "r+b" if offset else "wb")
+        self._file.truncate(offset)
+        self._file.seek(offset)
+        if not offset and file_format == "csv":
+            self._file.write(b"user_id,feature_name,timestamp\n")
+        self.position = self._file.tell()
+
+    def prepare_users(self, users: list[dict]) -> list[str]:
+        ids = [local_user_id(user["username"]) for user in users]
+        with open(self._profiles_path, "w", newline="") as f:
+            if self._format == "csv":
+                writer = csv.writer(f)
+                writer.writerow(["id", "username", "age", "gender"])
+                for user_id, user in zip(ids, users):
+                    writer.writerow([user_id, user["username"], user["age"], user["gender"]])
+            else:
+                for user_id, user in zip(ids, users):
+                    f.write(json.dumps({"id": user_id, "username": user["username"], "age": user["age"], "gender": user["gender"]}) + "\n")
+        return ids
+
+    def write(self, user_ids: list[str], chunk: tuple[np.ndarray, np.ndarray, np.ndarray]) -> None:
+        users, features, timestamps = chunk
+        rows = zip(users.tolist(), features.tolist(), iso_timestamps(timestamps))
+        if self._format == "csv":
+            lines = [f"{user_ids[user]},{FEATURE_NAMES[feature]},{timestamp}\n" for user, feature, timestamp in rows]
+        else:
+            lines = [
+                f'{{"user_id":"{user_ids[user]}","feature_name":"{FEATURE_NAMES[feature]}","timestamp":"{timestamp}"}}\n'
+                for user, feature, timestamp in rows
+            ]
+        self._file.write("".join(lines).encode())
+        self._file.flush()
+        self.position = self._file.tell()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class Checkpoint:
+    """Finished chunks (and the output file offset), saved at most once a second."""
+
+    def __init__(self, path: str, params: dict):
+        self.path = path
+        self.params = params
+        self.done: set[int] = set()
+        self.offset = 0
+        self._saved_at = 0.0
+
+    @classmethod
+    def load(cls, path: str) -> Optional["Checkpoint"]:
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            data = json.load(f)
+        checkpoint = cls(path, data["params"])
+        checkpoint.done = set(data["done"])
+        checkpoint.offset = data.get("offset", 0)
+        return checkpoint
+
+    def mark(self, index: int, offset: int) -> None:
+        self.done.add(index)
+        self.offset = offset
+        if time.monotonic() - self._saved_at >= CHECKPOINT_INTERVAL_SECONDS:
+            self.save()
+
+    def save(self) -> None:
+        temporary = self.path + ".tmp"
+        with open(temporary, "w") as f:
+            json.dump({"params": self.params, "done": sorted(self.done), "offset": self.offset}, f)
+        os.replace(temporary, self.path)
+        self._saved_at = time.monotonic()
+
+
+def bounded_imap(executor: ThreadPoolExecutor, fn: Callable, items: Iterable, limit: int) -> Iterator[tuple]:
+    """(item, fn(item)) with at most `limit` calls in flight, in completion order."""
+    items = iter(items)
+    running: dict[Future, object] = {}
+    exhausted = object()
+
+    def fill() -> None:
+        while len(running) < limit:
+            item = next(items, exhausted)
+            if item is exhausted:
+                return
+            running[executor.submit(fn, item)] = item
+
+    fill()
+    while running:
+        finished, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in finished:
+            yield running.pop(future), future.result()
+        fill()
+
+
+def write_events(plan: EventPlan, target, user_ids: list[str], checkpoint: Checkpoint, concurrency: int) -> None:
+    pending = [index for index in range(plan.chunks) if index not in checkpoint.done]
+    if not pending:
+        print("   Nothing left to write")
         return
 
-    now = datetime.utcnow()
-    clicks = []
+    if target.parallel_writes:
+        def work(index):
+            target.write(user_ids, plan.chunk(index))
+    else:
+        # Generated in the pool, written one chunk at a time from here
+        work = plan.chunk
 
-    for _ in range(num_clicks):
-        # Random timestamp within last 30 days
-        days_ago = random.randint(0, 30)
-        hours_ago = random.randint(0, 23)
-        minutes_ago = random.randint(0, 59)
-        timestamp = now - timedelta(days=days_ago, hours=hours_ago, minutes=minutes_ago)
+    started = time.perf_counter()
+    reported_at = started
+    already_written = written = plan.events - sum(plan.chunk_length(index) for index in pending)
 
-        clicks.append({
-            "user_id": random.choice(user_ids),
-            "feature_name": random.choice(FEATURE_NAMES),
-            "timestamp": timestamp.isoformat()
-        })
+    with ThreadPoolExecutor(concurrency) as executor:
+        for index, chunk in bounded_imap(executor, work, pending, concurrency):
+            if not target.parallel_writes:
+                target.write(user_ids, chunk)
+            checkpoint.mark(index, target.position)
+            written += plan.chunk_length(index)
 
-    # Batch insert
-    try:
-        response = supabase.table("feature_clicks").insert(clicks).execute()
-        print(f"Created {len(response.data)} click events")
-    except Exception as e:
-        print(f"Error creating clicks: {e}")
+            now = time.perf_counter()
+            if now - reported_at >= 5 or written == plan.events:
+                rate = (written - already_written) / max(now - started, 1e-9)
+                print(f"   {written:,}/{plan.events:,} events ({rate:,.0f}/s)")
+                reported_at = now
+
+
+def parse_args(argv: Optional[list[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--users", type=int, default=55)
+    parser.add_argument("--events", type=int, default=500)
+    parser.add_argument("--days", type=int, default=30, help="Events span this many days before --end")
+    parser.add_argument("--end", help="ISO timestamp of the newest possible event (default: now)")
+    parser.add_argument("--user-skew", type=float, default=0.0, help="Zipf exponent over users (0 = uniform)")
+    parser.add_argument("--feature-skew", type=float, default=0.0, help="Zipf exponent over features (0 = uniform)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--target", choices=["supabase", "sqlite", "csv", "ndjson"], default="supabase")
+    parser.add_argument("--output", help="Database or file path for local targets")
+    parser.add_argument("--chunk-size", type=int, help="Events per chunk (default 1000 for Supabase, 100000 locally)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Chunks in flight")
+    parser.add_argument("--resume", action="store_true", help="Skip chunks finished by an earlier run")
+    args = parser.parse_args(argv)
+
+    if args.users < 1 or args.events < 0 or args.days < 1 or args.concurrency < 1:
+        parser.error("--users, --days and --concurrency must be positive and --events non-negative")
+    if args.target != "supabase" and not args.output:
+        parser.error(f"--target {args.target} needs --output")
+    if args.chunk_size is None:
+        args.chunk_size = 1000 if args.target == "supabase" else 100_000
+    return args
 
 
-def main():
+def main(argv: Optional[list[str]] = None):
+    args = parse_args(argv)
+    checkpoint_path = f"{args.output}.progress.json" if args.output else "seed.progress.json"
+
+    previous = Checkpoint.load(checkpoint_path) if args.resume else None
+    if args.end is None:
+        # A resumed run must regenerate the same timestamps
+        args.end = previous.params["end"] if previous else datetime.now(timezone.utc).replace(microsecond=0).isoformat()
+    end = datetime.fromisoformat(args.end.replace("Z", "+00:00"))
+    if end.tzinfo is None:
+        end = end.replace(tzinfo=timezone.utc)
+
+    params = {
+        "users": args.users, "events": args.events, "days": args.days, "end": end.isoformat(),
+        "user_skew": args.user_skew, "feature_skew": args.feature_skew, "seed": args.seed,
+        "target": args.target, "output": args.output, "chunk_size": args.chunk_size,
+    }
+    if previous is not None and previous.params != params:
+        sys.exit(f"{checkpoint_path} was written with different parameters: {previous.params}")
+    checkpoint = previous or Checkpoint(checkpoint_path, params)
+
     print("Starting seed process...")
-    supabase = get_supabase_admin_client()
+    if args.target == "supabase":
+        target = SupabaseTarget(args.concurrency)
+    elif args.target == "sqlite":
+        target = SQLiteTarget(args.output)
+    else:
+        target = FileTarget(args.output, args.target, checkpoint.offset)
 
-    print("\n1. Creating seed users...")
-    user_ids = create_seed_users(supabase)
-    print(f"   Total users: {len(user_ids)}")
+    try:
+        print(f"\n1. Creating {args.users:,} seed users...")
+        user_ids = target.prepare_users(generate_users(args.users, args.seed))
+        print(f"   Total users: {len(user_ids):,}")
 
-    print("\n2. Creating seed clicks...")
-    create_seed_clicks(supabase, user_ids, num_clicks=500)
+        plan = EventPlan(args.events, len(user_ids), args.days, end, args.user_skew,
+                         args.feature_skew, args.seed, args.chunk_size)
+        print(f"\n2. Creating {args.events:,} click events in {plan.chunks:,} chunks "
+              f"({len(checkpoint.done):,} already done)...")
+        write_events(plan, target, user_ids, checkpoint, args.concurrency)
+    except KeyboardInterrupt:
+        print("\nInterrupted; rerun with --resume to continue")
+        raise SystemExit(130)
+    finally:
+        checkpoint.save()
+        target.close()
 
     print("\nSeeding complete!")
 
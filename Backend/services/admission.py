@@ -0,0 +1,153 @@
+"""
+Admission control for /track.
+
+Two limits, checked after authentication and before any write:
+
+- A token bucket per user (`rate` events per second, bursts of up to
+  `burst`), so one runaway tab or tracking loop cannot flood the table.
+  Requests are charged per event, so a /track/batch of 500 events costs
+  500 tokens. A request larger than the burst needs a full bucket and
+  leaves it in debt, so the user's average rate still holds.
+  Each bucket is kept in its GCRA form, a single float per user: the time
+  at which the bucket would be full again. Users are held in an LRU map
+  capped at `max_users`; an evicted user has been idle longest and
+  usually has a full bucket anyway.
+- A global cap on /track requests in flight. When inserts slow down,
+  requests pile up waiting for the database; past `max_in_flight` new
+  ones are shed immediately instead of queueing behind them.
+
+Rejected requests get 429 with Retry-After. Everything runs on the event
+loop, so no locking is needed.
+"""
+
+import math
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from config import get_settings
+
+
+class AdmissionRejected(Exception):
+    """Raised when a /track request is shed; `retry_after` is in seconds."""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TrackAdmission:
+    """Per-user token buckets plus a global in-flight limit."""
+
+    def __init__(
+        self,
+        rate: float = 10,
+        burst: int = 50,
+        max_users: int = 100_000,
+        max_in_flight: int = 128,
+    ):
+        # rate <= 0 turns the per-user limit off, max_in_flight <= 0 the global one
+        self._interval = 1 / rate if rate > 0 else 0.0
+        self._burst = max(burst, 1)
+        self._capacity = self._interval * self._burst
+        self._max_users = max_users
+        self._max_in_flight = max_in_flight
+        # user_id -> time at which the user's bucket is full again
+        self._full_at: OrderedDict[str, float] = OrderedDict()
+        self._in_flight = 0
+
+        # Counters
+        self._admitted = 0
+        self._rate_limited = 0
+        self._overloaded = 0
+        self._evictions = 0
+        self._peak_in_flight = 0
+
+    def _take_tokens(self, user_id: str, now: float, cost: int) -> Optional[float]:
+        """Spend `cost` of the user's tokens; returns seconds until enough are available if short."""
+        full_at = max(self._full_at.get(user_id, now), now)
+        # More than a burst's worth needs a full bucket, and the rest is owed
+        needed = full_at + min(cost, self._burst) * self._interval
+        # The slack absorbs rounding from the repeated float additions
+        if needed - now > self._capacity + 1e-9:
+            return needed - now - self._capacity
+
+        self._full_at[user_id] = full_at + cost * self._interval
+        self._full_at.move_to_end(user_id)
+        if len(self._full_at) > self._max_users:
+            self._full_at.popitem(last=False)
+            self._evictions += 1
+        return None
+
+    def acquire(self, user_id: str, cost: int = 1) -> None:
+        """
+        Admit one request of `cost` events from `user_id`; pair with release().
+        Raises AdmissionRejected when the server or the user is over its limit.
+        """
+        if 0 < self._max_in_flight <= self._in_flight:
+            self._overloaded += 1
+            raise AdmissionRejected("Tracking is overloaded, retry shortly", 1)
+
+        if self._interval:
+            wait = self._take_tokens(user_id, time.monotonic(), cost)
+            if wait is not None:
+                self._rate_limited += 1
+                raise AdmissionRejected("Too many tracking requests", wait)
+
+        self._admitted += 1
+        self._in_flight += 1
+        self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
+
+    def release(self) -> None:
+        self._in_flight -= 1
+
+    def stats(self) -> dict:
+        """Limits, shed counters and current load."""
+        return {
+            "rate_per_second": round(1 / self._interval, 3) if self._interval else 0,
+            "burst": self._burst if self._interval else 0,
+            "max_in_flight": self._max_in_flight,
+            "in_flight": self._in_flight,
+            "peak_in_flight": self._peak_in_flight,
+            "tracked_users": len(self._full_at),
+            "admitted": self._admitted,
+            "rate_limited": self._rate_limited,
+            "overloaded": self._overloaded,
+            "evictions": self._evictions,
+        }
+
+
+def retry_after_header(retry_after: float) -> str:
+    """Retry-After value: whole seconds, at least 1."""
+    return str(max(1, math.ceil(retry_after)))
+
+
+# Global instance, created by the app lifespan when a limit is enabled
+_track_admission: Optional[TrackAdmission] = None
+
+
+def get_track_admission() -> Optional[TrackAdmission]:
+    """Return the /track admission controller, or None when both limits are off."""
+    return _track_admission
+
+
+def start_track_admission() -> None:
+    """Create the global controller from settings."""
+    global _track_admission
+    settings = get_settings()
+
+    if settings.track_rate_limit_per_second <= 0 and settings.track_max_in_flight <= 0:
+        return
+
+    _track_admission = TrackAdmission(
+        rate=settings.track_rate_limit_per_second,
+        burst=settings.track_rate_limit_burst,
+        max_users=settings.track_rate_limit_max_users,
+        max_in_flight=settings.track_max_in_flight,
+    )
+
+
+def stop_track_admission() -> None:
+    global _track_admission
+    _track_admission = None
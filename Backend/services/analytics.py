@@ -0,0 +1,451 @@
+"""
+Click aggregation for the analytics dashboard.
+
+Counts are produced as (feature_name, bucket, count) groups, where bucket
+is the epoch second a base time bucket starts at (a UTC day unless the
+request asks for finer buckets or another UTC offset, see
+services/buckets.py). The preferred
+path asks Postgres to do the profile join and GROUP BY through the
+`analytics_click_counts` / `analytics_click_buckets` functions (see
+setup.sql), so the response size scales with the number of groups rather
+than the number of events. If the function is unavailable the rows are
+fetched and counted in Python.
+"""
+
+import asyncio
+import functools
+from datetime import datetime
+from typing import Optional
+
+from config import get_settings
+from services.downsample import lttb_indices
+from services.blocking import run_blocking
+from services.buckets import SECONDS_PER_DAY, BucketSpec, base_bucket, day_to_epoch, epoch_microseconds, epoch_seconds
+from services.click_scan import latest_click_id, scan_click_shards
+from services.hot_store import get_hot_store
+from services.metrics import span
+from services.rollup import split_day_aligned, fetch_rollup_counts
+from services.unique_users import UniqueUserCounts
+from services.user_dimensions import AGE_GROUPS, UserDimension, get_user_dimensions
+
+# (feature_name, bucket start in epoch seconds, count)
+ClickGroup = tuple[str, int, int]
+
+# Functions PostgREST reported as missing, so we stop paying for a
+# failing round trip on every request
+_missing_functions: set[str] = set()
+
+
+def get_age_range(age_group: str) -> tuple[int, int]:
+    """Convert age group string to min/max range."""
+    if age_group == "<18":
+        return (0, 17)
+    elif age_group == "18-40":
+        return (18, 40)
+    elif age_group == ">40":
+        return (41, 150)
+    return (0, 150)
+
+
+def _is_missing_function_error(error: Exception) -> bool:
+    message = str(error)
+    return "PGRST202" in message or "Could not find the function" in message
+
+
+def _utc_days(base_seconds: int, base_offset_seconds: int) -> bool:
+    return base_seconds == SECONDS_PER_DAY and base_offset_seconds == 0
+
+
+def _rpc_function(base_seconds: int, base_offset_seconds: int = 0) -> str:
+    return "analytics_click_counts" if _utc_days(base_seconds, base_offset_seconds) else "analytics_click_buckets"
+
+
+def fetch_grouped_counts_rpc(
+    supabase,
+    start_date: Optional[datetime],
+    end_date: Optional[datetime],
+    age_group: Optional[str],
+    gender: Optional[str],
+    base_seconds: int = SECONDS_PER_DAY,
+    base_offset_seconds: int = 0,
+    max_id: Optional[int] = None,
+) -> list[ClickGroup]:
+    """
+    Aggregate clicks in the database: per UTC day via analytics_click_counts,
+    or per (shifted) base_seconds bucket via analytics_click_buckets.
+    """
+    min_age, max_age = get_age_range(age_group) if age_group else (None, None)
+    params = {
+        "p_start": start_date.isoformat() if start_date else None,
+        "p_end": end_date.isoformat() if end_date else None,
+        "p_min_age": min_age,
+        "p_max_age": max_age,
+        "p_gender": gender,
+    }
+    if max_id is not None:
+        params["p_max_id"] = max_id
+
+    utc_days = _utc_days(base_seconds, base_offset_seconds)
+    function = _rpc_function(base_seconds, base_offset_seconds)
+    if not utc_days:
+        params["p_bucket_seconds"] = base_seconds
+        params["p_bucket_offset"] = base_offset_seconds
+
+    # Groups are capped by max-rows too (days x features grows past 1000
+    # over a few months), so page through the ordered result. Each page
+    # re-runs the aggregation, so stop on the first short page.
+    page_size = get_settings().postgrest_max_rows
+    groups: list[ClickGroup] = []
+    offset = 0
+
+    while True:
+        rows = supabase.rpc(function, params) \
+            .range(offset, offset + page_size - 1).execute().data or []
+
+        if utc_days:
+            groups.extend(
+                (row["feature_name"], day_to_epoch(str(row["day"])), int(row["count"]))
+                for row in rows
+            )
+        else:
+            groups.extend(
+                (row["feature_name"], int(row["bucket"]), int(row["count"]))
+                for row in rows
+            )
+
+        if len(rows) < page_size:
+            return groups
+
+        offset += page_size
+
+
+def _count_click_pages(
+    pages,
+    age_group: Optional[str],
+    gender: Optional[str],
+    base_seconds: int = SECONDS_PER_DAY,
+    base_offset_seconds: int = 0,
+) -> tuple[dict[tuple[str, int], int], dict[str, dict[tuple[str, int], int]]]:
+    """
+    Count one shard of click pages into {(feature, bucket): count}.
+    Clicks by users missing from the dimension cache are counted per user
+    in a second map, so they can be resolved once the scan is done.
+    """
+    dims = get_user_dimensions()
+    group_map: dict[tuple[str, int], int] = {}
+    pending: dict[str, dict[tuple[str, int], int]] = {}
+
+    for page in pages:
+        for click in page:
+            user_id = click["user_id"]
+
+            if user_id in dims:
+                if not _matches(dims.get(user_id), age_group, gender):
+                    continue
+                counts = group_map
+            else:
+                counts = pending.setdefault(user_id, {})
+
+            bucket = base_bucket(epoch_seconds(click["timestamp"]), base_seconds, base_offset_seconds)
+            key = (click["feature_name"], bucket)
+            counts[key] = counts.get(key, 0) + 1
+
+    return group_map, pending
+
+
+def _matches(dimension: Optional[UserDimension], age_group: Optional[str], gender: Optional[str]) -> bool:
+    """Whether a user's profile passes the filters (like the SQL join: no profile, no match)."""
+    if dimension is None:
+        return False
+
+    user_age_group, user_gender = dimension
+    # Unknown age groups span every age, as in get_age_range()
+    if age_group in AGE_GROUPS and user_age_group != age_group:
+        return False
+    return not gender or user_gender == gender
+
+
+def group_click_rows(
+    rows: list[dict],
+    start_date: Optional[datetime],
+    end_date: Optional[datetime],
+    age_group: Optional[str],
+    gender: Optional[str],
+    base_seconds: int = SECONDS_PER_DAY,
+    base_offset_seconds: int = 0,
+) -> list[ClickGroup]:
+    """
+    Grouped counts of click rows that carry the user's age_group and
+    gender (as returned by StorageBackend.clicks_after), for the rows in
+    the inclusive [start_date, end_date] window that pass the filters.
+    """
+    start_us = epoch_microseconds(start_date) if start_date else None
+    end_us = epoch_microseconds(end_date) if end_date else None
+    group_map: dict[tuple[str, int], int] = {}
+
+    for click in rows:
+        dimension = (click["age_group"], click["gender"]) if click["age_group"] is not None else None
+        if not _matches(dimension, age_group, gender):
+            continue
+
+        timestamp_us = epoch_microseconds(click["timestamp"])
+        if (start_us is not None and timestamp_us < start_us) or (end_us is not None and timestamp_us > end_us):
+            continue
+
+        bucket = base_bucket(timestamp_us // 1_000_000, base_seconds, base_offset_seconds)
+        key = (click["feature_name"], bucket)
+        group_map[key] = group_map.get(key, 0) + 1
+
+    return [(fname, bucket, count) for (fname, bucket), count in group_map.items()]
+
+
+def fetch_grouped_counts_python(
+    supabase,
+    start_date: Optional[datetime],
+    end_date: Optional[datetime],
+    age_group: Optional[str],
+    gender: Optional[str],
+    base_seconds: int = SECONDS_PER_DAY,
+    base_offset_seconds: int = 0,
+    max_id: Optional[int] = None,
+) -> list[ClickGroup]:
+    """
+    Fallback: stream matching click rows and count them in Python.
+    Rows are read page by page, so memory stays flat however large the window.
+    Age/gender filters are applied in memory from the user dimension
+    cache, so no profile query or user id list is sent per request.
+    """
+    dims = get_user_dimensions()
+    if not dims.loaded:
+        with span("analytics.profiles_query"):
+            dims.load(supabase)
+
+    # Pages are counted as they arrive, so this covers query and counting
+    with span("analytics.clicks_query"):
+        partials = scan_click_shards(
+            supabase,
+            "feature_name,user_id",
+            functools.partial(
+                _count_click_pages, age_group=age_group, gender=gender,
+                base_seconds=base_seconds, base_offset_seconds=base_offset_seconds,
+            ),
+            start=start_date,
+            end=end_date,
+            max_id=max_id,
+        )
+
+    group_map: dict[tuple[str, int], int] = {}
+    pending: dict[str, dict[tuple[str, int], int]] = {}
+
+    for partial, partial_pending in partials:
+        for key, count in partial.items():
+            group_map[key] = group_map.get(key, 0) + count
+        for user_id, counts in partial_pending.items():
+            user_counts = pending.setdefault(user_id, {})
+            for key, count in counts.items():
+                user_counts[key] = user_counts.get(key, 0) + count
+
+    # Users who signed up since the last refresh (e.g. on another worker)
+    if pending:
+        with span("analytics.profiles_query"):
+            dims.resolve(supabase, pending)
+        for user_id, counts in pending.items():
+            if _matches(dims.get(user_id), age_group, gender):
+                for key, count in counts.items():
+                    group_map[key] = group_map.get(key, 0) + count
+
+    return [(fname, bucket, count) for (fname, bucket), count in group_map.items()]
+
+
+def fetch_grouped_counts(
+    supabase,
+    start_date: Optional[datetime],
+    end_date: Optional[datetime],
+    age_group: Optional[str],
+    gender: Optional[str],
+    base_seconds: int = SECONDS_PER_DAY,
+    base_offset_seconds: int = 0,
+    max_id: Optional[int] = None,
+) -> list[ClickGroup]:
+    """
+    Aggregate in the database when possible, otherwise in Python.
+    With max_id, only clicks with ids up to it are counted.
+    """
+    settings = get_settings()
+    function = _rpc_function(base_seconds, base_offset_seconds)
+
+    if settings.analytics_use_rpc and function not in _missing_functions:
+        try:
+            with span("analytics.rpc"):
+                return fetch_grouped_counts_rpc(
+                    supabase, start_date, end_date, age_group, gender, base_seconds, base_offset_seconds, max_id
+                )
+        except Exception as e:
+            if _is_missing_function_error(e):
+                _missing_functions.add(function)
+            print(f"[Analytics] RPC aggregation failed, falling back to Python: {type(e).__name__}: {str(e)}")
+
+    return fetch_grouped_counts_python(
+        supabase, start_date, end_date, age_group, gender, base_seconds, base_offset_seconds, max_id
+    )
+
+
+async def aggregate_clicks(
+    supabase,
+    start_date: Optional[datetime],
+    end_date: Optional[datetime],
+    age_group: Optional[str],
+    gender: Optional[str],
+    base_seconds: int = SECONDS_PER_DAY,
+    base_offset_seconds: int = 0,
+) -> list[ClickGroup]:
+    """
+    Grouped counts for a filter set, per base_seconds bucket (shifted back
+    by base_offset_seconds).
+    With the daily rollup enabled and day buckets, whole UTC days are read
+    from feature_clicks_daily and only partial-day edges touch raw events.
+    The queries run in the database threadpool, concurrently when they
+    are independent of each other. Windows inside the columnar hot store
+    are answered in-process.
+    """
+    groups, _ = await _aggregate(
+        supabase, start_date, end_date, age_group, gender, base_seconds, base_offset_seconds, snapshot=False
+    )
+    return groups
+
+
+async def aggregate_clicks_snapshot(
+    supabase,
+    start_date: Optional[datetime],
+    end_date: Optional[datetime],
+    age_group: Optional[str],
+    gender: Optional[str],
+    base_seconds: int = SECONDS_PER_DAY,
+    base_offset_seconds: int = 0,
+) -> tuple[list[ClickGroup], Optional[int]]:
+    """
+    aggregate_clicks, plus the click id the counts stop at: clicks with
+    ids up to it are counted and later ones are not, so a cursor can
+    continue from it. The id is None when the rollup answered, since its
+    counts cannot be cut off at an id.
+    """
+    return await _aggregate(
+        supabase, start_date, end_date, age_group, gender, base_seconds, base_offset_seconds, snapshot=True
+    )
+
+
+async def _aggregate(
+    supabase,
+    start_date: Optional[datetime],
+    end_date: Optional[datetime],
+    age_group: Optional[str],
+    gender: Optional[str],
+    base_seconds: int,
+    base_offset_seconds: int,
+    snapshot: bool,
+) -> tuple[list[ClickGroup], Optional[int]]:
+    settings = get_settings()
+
+    hot_store = get_hot_store()
+    if hot_store is not None and hot_store.covers(start_date):
+        # The store's own mark: clicks up to it are all in memory, even
+        # while the table is already further ahead
+        max_id = hot_store.high_id if snapshot else None
+        with span("analytics.hot_store"):
+            groups = await run_blocking(
+                hot_store.query, start_date, end_date, age_group, gender, base_seconds, base_offset_seconds, max_id
+            )
+        return groups, max_id
+
+    # The rollup is keyed on UTC days and the canonical age groups only
+    use_rollup = _utc_days(base_seconds, base_offset_seconds) and (age_group is None or age_group in AGE_GROUPS)
+    if settings.analytics_use_rollup and use_rollup:
+        full_days, edges = split_day_aligned(start_date, end_date)
+        queries = []
+
+        if full_days:
+            first_day, last_day = full_days
+            queries.append(run_blocking(
+                fetch_rollup_counts, supabase, first_day, last_day, age_group, gender
+            ))
+
+        for edge_start, edge_end in edges:
+            queries.append(run_blocking(
+                fetch_grouped_counts, supabase, edge_start, edge_end, age_group, gender
+            ))
+
+        with span("analytics.rollup"):
+            parts = await asyncio.gather(*queries)
+        return [group for part in parts for group in part], None
+
+    # Read the mark first: clicks stored while aggregating are above it
+    max_id = None
+    if snapshot:
+        with span("analytics.cursor"):
+            max_id = await run_blocking(latest_click_id, supabase)
+
+    groups = await run_blocking(
+        fetch_grouped_counts, supabase, start_date, end_date, age_group, gender,
+        base_seconds, base_offset_seconds, max_id
+    )
+    return groups, max_id
+
+
+def _downsample(series: list[tuple[int, int]], max_points: Optional[int]) -> list[tuple[int, int]]:
+    if not max_points or len(series) <= max_points:
+        return series
+
+    xs = [float(start) for start, _ in series]
+    ys = [float(count) for _, count in series]
+    return [series[i] for i in lttb_indices(xs, ys, max_points)]
+
+
+def build_analytics_response(
+    groups: list[ClickGroup],
+    feature_name: Optional[str] = None,
+    buckets: Optional[BucketSpec] = None,
+    max_points: Optional[int] = None,
+    unique_users: Optional[UniqueUserCounts] = None,
+) -> dict:
+    """
+    Fold (feature, bucket, count) groups into the dashboard response, as
+    plain dicts shaped like AnalyticsResponse (ready for orjson, without a
+    model object per row).
+    - feature_counts: Total clicks per feature, most clicked first
+    - daily_counts: Clicks per time bucket (for feature_name if given, else
+      all), downsampled with LTTB to at most max_points
+    Both carry unique_users from the sketch counts if given, else None.
+    """
+    buckets = buckets or BucketSpec()
+    feature_count_map: dict[str, int] = {}
+    bucket_count_map: dict[int, int] = {}
+
+    for fname, bucket, count in groups:
+        feature_count_map[fname] = feature_count_map.get(fname, 0) + count
+
+        # If feature_name specified, the series covers that feature only
+        if feature_name and fname != feature_name:
+            continue
+        bucket_count_map[bucket] = bucket_count_map.get(bucket, 0) + count
+
+    feature_users, bucket_users = unique_users or ({}, {})
+
+    feature_counts = [
+        {"feature_name": k, "count": v, "unique_users": feature_users.get(k)}
+        for k, v in sorted(feature_count_map.items(), key=lambda x: (-x[1], x[0]))
+    ]
+
+    series = sorted(buckets.rebucket(bucket_count_map).items())
+    daily_counts = [
+        {"date": buckets.label(start), "count": count, "unique_users": bucket_users.get(start)}
+        for start, count in _downsample(series, max_points)
+    ]
+
+    return {
+        "feature_counts": feature_counts,
+        "daily_counts": daily_counts,
+        "bucket": buckets.bucket,
+        "downsampled": len(daily_counts) < len(series),
+        "cursor": None,
+        "delta": False,
+    }
@@ -0,0 +1,307 @@
+"""
+In-memory result cache for /analytics.
+
+Dashboard users hit the same few filter combinations, so responses are
+cached under the normalized filter tuple. Entries expire after a TTL and
+are evicted least-recently-used beyond `max_entries`. Every successful
+click insert bumps a generation counter; an entry from an older
+generation (or past its TTL) is still served for up to `stale_seconds`
+while a single background task recomputes it (stale-while-revalidate).
+
+With a shared cache attached (see services/shared_cache.py), a local
+miss first looks for an entry another worker computed within the TTL,
+and computed values are stored there for the others. A worker ignores
+shared entries computed before its own latest click insert.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+from config import get_settings
+from services.blocking import run_blocking
+from services.encoded_response import EncodedPayload
+from services.shared_cache import SharedCache
+
+# Cache key: (start_epoch, end_epoch, age_group, gender, feature_name,
+#             bucket, tz_offset_minutes, max_points)
+CacheKey = tuple[Hashable, ...]
+
+
+class AnalyticsCache:
+    """LRU + TTL cache with a generation counter and stale-while-revalidate."""
+
+    def __init__(
+        self,
+        max_entries: int = 512,
+        ttl_seconds: float = 30,
+        stale_seconds: float = 300,
+    ):
+        # key -> (value, generation, stored_at)
+        self._entries: OrderedDict[CacheKey, tuple[Any, int, float]] = OrderedDict()
+        self._max_entries = max_entries
+        self._ttl = ttl_seconds
+        self._stale = stale_seconds
+        self._generation = 0
+        self._inflight: dict[CacheKey, asyncio.Future] = {}
+        self._refresh_tasks: set[asyncio.Task] = set()
+
+        # Cross-worker tier (use_shared) and when the generation last moved
+        self._shared: Optional[SharedCache] = None
+        self._shared_namespace = "analytics"
+        self._encode: Callable[[Any], bytes] = bytes
+        self._decode: Callable[[bytes], Any] = bytes
+        self._bumped_at = 0.0
+
+        # Counters
+        self._hits = 0
+        self._shared_hits = 0
+        self._stale_hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._refreshes = 0
+        self._refresh_errors = 0
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def bump_generation(self) -> None:
+        """Mark every cached entry as stale (new events were ingested)."""
+        self._generation += 1
+        self._bumped_at = time.time()
+
+    def use_shared(
+        self,
+        shared: Optional[SharedCache],
+        encode: Callable[[Any], bytes],
+        decode: Callable[[bytes], Any],
+        namespace: str = "analytics",
+    ) -> None:
+        """Attach (or with None, detach) the cross-worker tier; values cross it as bytes."""
+        self._shared = shared
+        self._encode = encode
+        self._decode = decode
+        self._shared_namespace = namespace
+
+    def _load_shared(self, key: CacheKey) -> Optional[Any]:
+        if self._shared is None:
+            return None
+
+        entry = self._shared.get(self._shared_namespace, repr(key))
+        if entry is None:
+            return None
+
+        value, stored_at, _ = entry
+        if stored_at <= self._bumped_at or time.time() - stored_at >= self._ttl:
+            return None
+        self._shared_hits += 1
+        return self._decode(value)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    async def get_or_compute(
+        self,
+        key: CacheKey,
+        compute: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        """
+        Return the cached value for key, computing it on a miss.
+        Concurrent misses for the same key share one computation.
+        """
+        entry = self._entries.get(key)
+
+        if entry is not None:
+            value, generation, stored_at = entry
+            age = time.monotonic() - stored_at
+            self._entries.move_to_end(key)
+
+            if generation == self._generation and age < self._ttl:
+                self._hits += 1
+                return value
+
+            if age < self._ttl + self._stale:
+                self._stale_hits += 1
+                self._schedule_refresh(key, compute)
+                return value
+
+        self._misses += 1
+        return await self._compute(key, compute)
+
+    async def _compute(self, key: CacheKey, compute: Callable[[], Awaitable[Any]]) -> Any:
+        inflight = self._inflight.get(key)
+        while inflight is not None:
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                # Only the computing request was cancelled: compute again
+                # (one waiter takes over, the rest coalesce onto it)
+                if not inflight.cancelled():
+                    raise
+            inflight = self._inflight.get(key)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        generation = self._generation
+        started_at = time.time()
+
+        try:
+            value = self._load_shared(key)
+            computed = value is None
+            if computed:
+                value = await compute()
+        except Exception as e:
+            future.set_exception(e)
+            # Nobody else may be waiting; mark the exception as retrieved
+            future.exception()
+            raise
+        else:
+            self._store(key, value, generation)
+            future.set_result(value)
+            if computed and self._shared is not None:
+                # Stamped with the start, so inserts during compute invalidate it
+                await run_blocking(
+                    self._shared.set, self._shared_namespace, repr(key), self._encode(value),
+                    started_at + self._ttl, started_at,
+                )
+            return value
+        finally:
+            del self._inflight[key]
+            if not future.done():
+                # The computing request was cancelled
+                future.cancel()
+
+    def _store(self, key: CacheKey, value: Any, generation: int) -> None:
+        self._entries[key] = (value, generation, time.monotonic())
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    def _schedule_refresh(self, key: CacheKey, compute: Callable[[], Awaitable[Any]]) -> None:
+        if key in self._inflight:
+            return
+
+        async def refresh():
+            try:
+                await self._compute(key, compute)
+                self._refreshes += 1
+            except Exception as e:
+                self._refresh_errors += 1
+                print(f"[AnalyticsCache] Background refresh failed: {type(e).__name__}: {str(e)}")
+
+        task = asyncio.create_task(refresh())
+        self._refresh_tasks.add(task)
+        task.add_done_callback(self._refresh_tasks.discard)
+
+    def stats(self) -> dict:
+        lookups = self._hits + self._stale_hits + self._misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self._max_entries,
+            "generation": self._generation,
+            "hits": self._hits,
+            "stale_hits": self._stale_hits,
+            "shared_hits": self._shared_hits,
+            "misses": self._misses,
+            "hit_ratio": round((self._hits + self._stale_hits) / lookups, 4) if lookups else 0.0,
+            "evictions": self._evictions,
+            "refreshes": self._refreshes,
+            "refresh_errors": self._refresh_errors,
+        }
+
+
+def round_filter_window(
+    start_date: Optional[datetime],
+    end_date: Optional[datetime],
+    granularity_seconds: int,
+) -> tuple[Optional[datetime], Optional[datetime]]:
+    """
+    Widen [start_date, end_date] to granularity boundaries: start is
+    floored, end is ceiled to just before the next boundary. Requests
+    within the same bucket then share a cache entry, and day-aligned
+    windows stay day-aligned.
+    """
+    if granularity_seconds <= 0:
+        return start_date, end_date
+
+    def to_epoch(value: datetime) -> float:
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+
+    def from_epoch(seconds: int) -> datetime:
+        return datetime.fromtimestamp(seconds, tz=timezone.utc)
+
+    start = end = None
+
+    if start_date:
+        seconds = int(to_epoch(start_date) // granularity_seconds) * granularity_seconds
+        start = from_epoch(seconds)
+
+    if end_date:
+        buckets = int(to_epoch(end_date) // granularity_seconds) + 1
+        end = from_epoch(buckets * granularity_seconds) - timedelta(microseconds=1)
+
+    return start, end
+
+
+def make_cache_key(
+    start_date: Optional[datetime],
+    end_date: Optional[datetime],
+    age_group: Optional[str],
+    gender: Optional[str],
+    feature_name: Optional[str],
+    bucket: str = "day",
+    tz_offset_minutes: int = 0,
+    max_points: Optional[int] = None,
+) -> CacheKey:
+    """Normalized filter tuple; call with already-rounded dates."""
+    return (
+        start_date.timestamp() if start_date else None,
+        end_date.timestamp() if end_date else None,
+        age_group or None,
+        gender or None,
+        feature_name or None,
+        bucket,
+        tz_offset_minutes,
+        max_points,
+    )
+
+
+_analytics_cache: Optional[AnalyticsCache] = None
+
+
+def get_analytics_cache() -> Optional[AnalyticsCache]:
+    """Global cache instance, or None when caching is disabled."""
+    global _analytics_cache
+    settings = get_settings()
+
+    if not settings.analytics_cache_enabled:
+        return None
+
+    if _analytics_cache is None:
+        _analytics_cache = AnalyticsCache(
+            max_entries=settings.analytics_cache_max_entries,
+            ttl_seconds=settings.analytics_cache_ttl_seconds,
+            stale_seconds=settings.analytics_cache_stale_seconds,
+        )
+    return _analytics_cache
+
+
+def use_shared_analytics_cache(shared: Optional[SharedCache]) -> None:
+    """Attach (or with None, detach) the cross-worker tier (app lifespan)."""
+    cache = get_analytics_cache()
+    if cache is not None:
+        # Cached values are serialized /analytics bodies
+        cache.use_shared(shared, lambda payload: payload.body, EncodedPayload)
+
+
+def bump_analytics_generation() -> None:
+    """Invalidate cached analytics after new clicks are stored."""
+    if _analytics_cache is not None:
+        _analytics_cache.bump_generation()
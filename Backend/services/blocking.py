@@ -0,0 +1,35 @@
+"""
+Run blocking Supabase calls off the event loop.
+
+supabase-py's sync client blocks for a full network round trip on every
+`.execute()` or auth call. Routes are `async def`, so calling it directly
+stalls the whole worker. `run_blocking` moves the call to a worker thread.
+A shared limiter caps how many calls run at once, so a burst of requests
+queues here rather than exhausting the HTTP connection pool.
+"""
+
+import functools
+from typing import Callable, Optional, TypeVar
+
+import anyio
+import anyio.to_thread
+
+from config import get_settings
+
+T = TypeVar("T")
+
+_limiter: Optional[anyio.CapacityLimiter] = None
+
+
+def get_db_limiter() -> anyio.CapacityLimiter:
+    global _limiter
+    if _limiter is None:
+        _limiter = anyio.CapacityLimiter(get_settings().db_threadpool_size)
+    return _limiter
+
+
+async def run_blocking(func: Callable[..., T], *args, **kwargs) -> T:
+    """Run a blocking call in the database threadpool and await its result."""
+    if kwargs:
+        func = functools.partial(func, **kwargs)
+    return await anyio.to_thread.run_sync(func, *args, limiter=get_db_limiter())
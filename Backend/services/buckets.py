@@ -0,0 +1,145 @@
+"""
+Time buckets for the analytics series, in integer epoch arithmetic.
+
+A bucket is minute/hour/day/week/month in a fixed UTC offset (minutes
+east of UTC). Aggregation sources (SQL, rollup, hot store, scans) all
+count clicks per *base* bucket of `base_seconds` (a minute, an hour, or
+a day for day/week/month), on a grid shifted by `base_offset_seconds`
+so that base boundaries fall on local boundaries (see `base_bucket`);
+`BucketSpec.rebucket` then folds base buckets into the requested ones.
+Day buckets at UTC keep the existing daily paths (rollup,
+analytics_click_counts) usable; other offsets are grouped per local day
+directly, so they cost no more buckets than UTC.
+
+Weeks start on Monday. Months follow the proleptic Gregorian calendar.
+"""
+
+from datetime import datetime, timezone
+from typing import Literal, Optional, Union
+
+Bucket = Literal["minute", "hour", "day", "week", "month"]
+
+SECONDS_PER_DAY = 86_400
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+_FIXED_SECONDS = {"minute": 60, "hour": 3_600, "day": SECONDS_PER_DAY, "week": 7 * SECONDS_PER_DAY}
+
+# 1970-01-01 was a Thursday; shift day numbers so weeks start on Monday
+_WEEK_SHIFT_DAYS = 3
+
+
+def civil_from_days(days: int) -> tuple[int, int, int]:
+    """(year, month, day) for a count of days since 1970-01-01."""
+    # Howard Hinnant's days->civil algorithm
+    z = days + 719_468
+    era = z // 146_097
+    doe = z - era * 146_097
+    yoe = (doe - doe // 1_460 + doe // 36_524 - doe // 146_096) // 365
+    y = yoe + era * 400
+    doy = doe - (365 * yoe + yoe // 4 - yoe // 100)
+    mp = (5 * doy + 2) // 153
+    d = doy - (153 * mp + 2) // 5 + 1
+    m = mp + 3 if mp < 10 else mp - 9
+    return (y + 1 if m <= 2 else y), m, d
+
+
+def days_from_civil(year: int, month: int, day: int) -> int:
+    """Days since 1970-01-01 for a calendar date."""
+    y = year - 1 if month <= 2 else year
+    era = y // 400
+    yoe = y - era * 400
+    mp = month - 3 if month > 2 else month + 9
+    doy = (153 * mp + 2) // 5 + day - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    return era * 146_097 + doe - 719_468
+
+
+def epoch_seconds(value: Union[str, datetime]) -> int:
+    """Whole epoch seconds (floored) of an ISO timestamp or datetime; naive means UTC."""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    delta = value - _EPOCH
+    return delta.days * SECONDS_PER_DAY + delta.seconds
+
+
+def epoch_microseconds(value: Union[str, datetime]) -> int:
+    """Epoch microseconds of an ISO timestamp or datetime; naive means UTC."""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    delta = value - _EPOCH
+    return (delta.days * SECONDS_PER_DAY + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+def base_bucket(seconds: int, base_seconds: int, base_offset_seconds: int = 0) -> int:
+    """Start of the base bucket containing `seconds`: k * base_seconds - base_offset_seconds."""
+    return (seconds + base_offset_seconds) // base_seconds * base_seconds - base_offset_seconds
+
+
+def day_to_epoch(day: str) -> int:
+    """Epoch seconds of a 'YYYY-MM-DD' UTC day."""
+    return days_from_civil(int(day[:4]), int(day[5:7]), int(day[8:10])) * SECONDS_PER_DAY
+
+
+class BucketSpec:
+    """A bucket size plus the UTC offset its boundaries are aligned to."""
+
+    def __init__(self, bucket: Bucket = "day", tz_offset_minutes: int = 0):
+        self.bucket = bucket
+        self.offset_seconds = tz_offset_minutes * 60
+
+        self.base_seconds = _FIXED_SECONDS[bucket] if bucket in ("minute", "hour") else SECONDS_PER_DAY
+        # Local boundaries sit this far before the epoch-aligned ones
+        self.base_offset_seconds = self.offset_seconds % self.base_seconds
+
+    def __repr__(self) -> str:
+        return f"BucketSpec({self.bucket!r}, offset={self.offset_seconds}s)"
+
+    def start_of(self, seconds: int) -> int:
+        """Epoch seconds at which the bucket containing `seconds` starts."""
+        local = seconds + self.offset_seconds
+
+        if self.bucket == "month":
+            year, month, _ = civil_from_days(local // SECONDS_PER_DAY)
+            local_start = days_from_civil(year, month, 1) * SECONDS_PER_DAY
+        elif self.bucket == "week":
+            week = (local // SECONDS_PER_DAY + _WEEK_SHIFT_DAYS) // 7
+            local_start = (week * 7 - _WEEK_SHIFT_DAYS) * SECONDS_PER_DAY
+        else:
+            size = _FIXED_SECONDS[self.bucket]
+            local_start = local // size * size
+
+        return local_start - self.offset_seconds
+
+    def label(self, bucket_start: int) -> str:
+        """Local wall-clock label: '2024-05', '2024-05-06' or '2024-05-06T13:00'."""
+        local = bucket_start + self.offset_seconds
+        days, seconds = divmod(local, SECONDS_PER_DAY)
+        year, month, day = civil_from_days(days)
+
+        if self.bucket == "month":
+            return f"{year:04d}-{month:02d}"
+        if self.bucket in ("day", "week"):
+            return f"{year:04d}-{month:02d}-{day:02d}"
+        return f"{year:04d}-{month:02d}-{day:02d}T{seconds // 3_600:02d}:{seconds % 3_600 // 60:02d}"
+
+    def rebucket(self, counts: dict[int, int]) -> dict[int, int]:
+        """Fold {base bucket start: count} into {bucket start: count}."""
+        if self.bucket != "month" and self.base_seconds == _FIXED_SECONDS[self.bucket]:
+            return counts
+
+        folded: dict[int, int] = {}
+        for start, count in counts.items():
+            key = self.start_of(start)
+            folded[key] = folded.get(key, 0) + count
+        return folded
+
+    def estimate_base_buckets(self, start_seconds: Optional[int], end_seconds: int) -> Optional[int]:
+        """Upper bound on base buckets in a window (None if unbounded)."""
+        if start_seconds is None:
+            return None
+        return max(0, end_seconds - start_seconds) // self.base_seconds + 1
@@ -0,0 +1,191 @@
+"""
+Streaming scans over feature_clicks.
+
+PostgREST caps every response at its max-rows setting, so a single
+`.execute()` silently drops everything past the first page. These helpers
+walk the table with keyset pagination on (timestamp, id) instead: each
+page starts strictly after the last row of the previous one, so pages are
+exact under concurrent inserts and cost an index seek regardless of depth.
+
+To keep throughput up, the time window is split into shards that are
+scanned concurrently, each holding only its current page in memory.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Iterator, Optional, TypeVar
+
+from config import get_settings
+
+T = TypeVar("T")
+
+_scan_pool: Optional[ThreadPoolExecutor] = None
+
+
+def _get_scan_pool() -> ThreadPoolExecutor:
+    global _scan_pool
+    if _scan_pool is None:
+        settings = get_settings()
+        _scan_pool = ThreadPoolExecutor(
+            max_workers=settings.analytics_scan_parallelism * 4,
+            thread_name_prefix="click-scan"
+        )
+    return _scan_pool
+
+
+def _parse_timestamp(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def latest_click_id(supabase) -> int:
+    """Highest feature_clicks id (0 if the table is empty)."""
+    rows = supabase.table("feature_clicks").select("id").order("id", desc=True).limit(1).execute().data
+    return rows[0]["id"] if rows else 0
+
+
+def _filtered_query(
+    supabase,
+    columns: str,
+    start: Optional[datetime],
+    end: Optional[datetime],
+    end_inclusive: bool,
+    user_ids: Optional[list[str]],
+    feature_name: Optional[str] = None,
+    max_id: Optional[int] = None,
+):
+    query = supabase.table("feature_clicks").select(columns)
+
+    if max_id is not None:
+        query = query.lte("id", max_id)
+
+    if user_ids is not None:
+        query = query.in_("user_id", user_ids)
+
+    if feature_name:
+        query = query.eq("feature_name", feature_name)
+
+    if start:
+        query = query.gte("timestamp", start.isoformat())
+
+    if end:
+        if end_inclusive:
+            query = query.lte("timestamp", end.isoformat())
+        else:
+            query = query.lt("timestamp", end.isoformat())
+
+    return query
+
+
+def iter_click_pages(
+    supabase,
+    columns: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    end_inclusive: bool = True,
+    user_ids: Optional[list[str]] = None,
+    page_size: Optional[int] = None,
+    feature_name: Optional[str] = None,
+    max_id: Optional[int] = None,
+) -> Iterator[list[dict]]:
+    """
+    Yield pages of feature_clicks rows ordered by (timestamp, id), up to
+    id max_id if given.
+    `timestamp` and `id` are always selected since they form the cursor.
+    """
+    page_size = page_size or get_settings().postgrest_max_rows
+
+    selected = [c.strip() for c in columns.split(",") if c.strip()]
+    for key in ("timestamp", "id"):
+        if key not in selected:
+            selected.append(key)
+    columns = ",".join(selected)
+
+    last: Optional[dict] = None
+
+    while True:
+        query = _filtered_query(supabase, columns, start, end, end_inclusive, user_ids, feature_name, max_id)
+
+        if last is not None:
+            # Quote the timestamp: ':' and '+' are reserved inside or=()
+            ts = last["timestamp"]
+            query = query.or_(f'timestamp.gt."{ts}",and(timestamp.eq."{ts}",id.gt.{last["id"]})')
+
+        rows = query.order("timestamp").order("id").limit(page_size).execute().data or []
+
+        # Stop on an empty page rather than a short one: if the server's
+        # max-rows is below page_size, every page looks short. The extra
+        # round trip is a single index seek.
+        if not rows:
+            return
+
+        yield rows
+        last = rows[-1]
+
+
+def _time_bounds(
+    supabase,
+    start: Optional[datetime],
+    end: Optional[datetime],
+    user_ids: Optional[list[str]],
+    max_id: Optional[int] = None,
+) -> Optional[tuple[datetime, datetime]]:
+    """Earliest and latest matching timestamps, or None if nothing matches."""
+    first = _filtered_query(supabase, "timestamp", start, end, True, user_ids, max_id=max_id) \
+        .order("timestamp").limit(1).execute().data
+    if not first:
+        return None
+
+    last = _filtered_query(supabase, "timestamp", start, end, True, user_ids, max_id=max_id) \
+        .order("timestamp", desc=True).limit(1).execute().data
+
+    return _parse_timestamp(first[0]["timestamp"]), _parse_timestamp(last[0]["timestamp"])
+
+
+def scan_click_shards(
+    supabase,
+    columns: str,
+    consume: Callable[[Iterator[list[dict]]], T],
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    user_ids: Optional[list[str]] = None,
+    parallelism: Optional[int] = None,
+    max_id: Optional[int] = None,
+) -> list[T]:
+    """
+    Scan all matching clicks (up to id max_id if given), split by time
+    into concurrently read shards.
+
+    `consume` receives one shard's page iterator and returns a partial
+    result (e.g. a counter); the caller merges the returned partials.
+    Pages are dropped as soon as `consume` moves past them.
+    """
+    parallelism = parallelism or get_settings().analytics_scan_parallelism
+
+    bounds = _time_bounds(supabase, start, end, user_ids, max_id)
+    if bounds is None:
+        return []
+
+    low, high = bounds
+    shard_count = max(1, parallelism) if high > low else 1
+    step = (high - low) / shard_count
+
+    # Half-open shards [t_i, t_i+1); the last one includes `high` itself
+    edges = [low + step * i for i in range(shard_count)] + [high]
+
+    def run_shard(index: int) -> T:
+        is_last = index == shard_count - 1
+        pages = iter_click_pages(
+            supabase,
+            columns,
+            start=edges[index],
+            end=edges[index + 1],
+            end_inclusive=is_last,
+            user_ids=user_ids,
+            max_id=max_id,
+        )
+        return consume(pages)
+
+    if shard_count == 1:
+        return [run_shard(0)]
+
+    return list(_get_scan_pool().map(run_shard, range(shard_count)))
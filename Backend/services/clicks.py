@@ -0,0 +1,38 @@
+from config import get_settings, get_supabase_admin_client
+from services.analytics_cache import bump_analytics_generation
+from services.hot_store import get_hot_store
+
+
+def insert_clicks(click_rows: list[dict]) -> list[dict]:
+    """
+    Write click rows to feature_clicks with one multi-row insert.
+    Rows without a timestamp fall back to the column default (NOW()).
+    Returns the inserted rows.
+    """
+    # Use admin client to bypass RLS for tracking
+    supabase = get_supabase_admin_client()
+
+    if get_settings().analytics_use_rollup:
+        # Inserts the rows and bumps their daily rollup cells in one transaction
+        response = supabase.rpc("ingest_feature_clicks", {"p_events": click_rows}).execute()
+    else:
+        response = supabase.table("feature_clicks").insert(
+            click_rows,
+            default_to_null=False
+        ).execute()
+
+    inserted = response.data or []
+
+    hot_store = get_hot_store()
+    if hot_store is not None:
+        try:
+            hot_store.ingest(supabase, inserted)
+        except Exception as e:
+            # The store now has a gap; serve from the database until it reloads
+            hot_store.invalidate()
+            print(f"[HotStore] Ingest failed: {type(e).__name__}: {str(e)}")
+
+    # Cached analytics no longer reflect the stored events
+    bump_analytics_generation()
+
+    return inserted
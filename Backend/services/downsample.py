@@ -0,0 +1,51 @@
+"""
+Shape-preserving downsampling for chart series.
+
+Largest-Triangle-Three-Buckets (Steinarsson, 2013): keeps the first and
+last points and, from each of the `threshold - 2` equal slices between
+them, the point forming the largest triangle with the previously kept
+point and the average of the next slice. Peaks and dips survive, unlike
+with plain averaging or striding.
+"""
+
+from typing import Sequence
+
+
+def lttb_indices(xs: Sequence[float], ys: Sequence[float], threshold: int) -> list[int]:
+    """Indices of the points LTTB keeps; all of them if len(xs) <= threshold."""
+    n = len(xs)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+
+    kept = [0]
+    slice_width = (n - 2) / (threshold - 2)
+    previous = 0
+
+    for i in range(threshold - 2):
+        # Current slice [start, end) and the one after it
+        start = int(i * slice_width) + 1
+        end = int((i + 1) * slice_width) + 1
+        next_end = min(int((i + 2) * slice_width) + 1, n)
+
+        if end >= next_end:
+            # Last slice: the "next" slice is the final point
+            avg_x, avg_y = xs[n - 1], ys[n - 1]
+        else:
+            span = next_end - end
+            avg_x = sum(xs[end:next_end]) / span
+            avg_y = sum(ys[end:next_end]) / span
+
+        px, py = xs[previous], ys[previous]
+        best, best_area = start, -1.0
+
+        for j in range(start, end):
+            # Twice the triangle area; the factor doesn't change the argmax
+            area = abs((px - avg_x) * (ys[j] - py) - (px - xs[j]) * (avg_y - py))
+            if area > best_area:
+                best, best_area = j, area
+
+        kept.append(best)
+        previous = best
+
+    kept.append(n - 1)
+    return kept
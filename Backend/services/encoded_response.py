@@ -0,0 +1,134 @@
+"""
+Pre-encoded JSON responses with ETags and compression.
+
+The dashboard polls /analytics every few seconds and mostly gets the
+same answer back. An EncodedPayload serializes a result once with
+orjson, derives a strong ETag from the bytes, and keeps the gzip/brotli
+variants it has produced, so a cached result is never re-serialized or
+re-compressed. A request whose If-None-Match matches gets an empty 304.
+
+Brotli is used when the `brotli` package is installed, gzip otherwise.
+"""
+
+import gzip
+import hashlib
+from typing import Any, Optional
+
+import orjson
+from fastapi import Request
+from fastapi.responses import Response
+
+from config import get_settings
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+# Preferred first
+_ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def _accepted_encodings(accept_encoding: str) -> set[str]:
+    """Codings the client accepts (q > 0) from an Accept-Encoding header."""
+    accepted = set()
+    for item in accept_encoding.split(","):
+        coding, _, params = item.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+
+        if quality > 0:
+            accepted.add(coding)
+
+    if "*" in accepted:
+        accepted.update(_ENCODINGS)
+    return accepted
+
+
+def _compress(body: bytes, encoding: str) -> bytes:
+    settings = get_settings()
+    if encoding == "br":
+        return brotli.compress(body, quality=settings.response_brotli_quality)
+    # mtime=0 keeps the output (and so its ETag) deterministic
+    return gzip.compress(body, compresslevel=settings.response_gzip_level, mtime=0)
+
+
+class EncodedPayload:
+    """A JSON body serialized once, with its ETag and compressed variants."""
+
+    __slots__ = ("body", "digest", "_variants")
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self.digest = hashlib.blake2b(body, digest_size=16).hexdigest()
+        self._variants: dict[str, bytes] = {}
+
+    @classmethod
+    def from_content(cls, content: Any) -> "EncodedPayload":
+        return cls(orjson.dumps(content))
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.digest}"'
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        """Whether an If-None-Match header names this payload (any encoding)."""
+        if not if_none_match:
+            return False
+
+        for tag in if_none_match.split(","):
+            tag = tag.strip()
+            if tag == "*":
+                return True
+            # Proxies may weaken the tag; encoded variants carry a suffix
+            tag = tag.removeprefix("W/").strip('"')
+            if tag.split("-", 1)[0] == self.digest:
+                return True
+        return False
+
+    def variant(self, encoding: str) -> bytes:
+        """The body compressed with `encoding`, compressed once and kept."""
+        body = self._variants.get(encoding)
+        if body is None:
+            body = _compress(self.body, encoding)
+            self._variants[encoding] = body
+        return body
+
+    def to_response(self, request: Request, status_code: int = 200) -> Response:
+        """
+        The body, compressed when it is large enough and the client accepts
+        it, or an empty 304 if the client already has this payload.
+        """
+        headers = {
+            "Cache-Control": "private, no-cache",
+            "Vary": "Accept-Encoding, Authorization",
+        }
+
+        encoding = None
+        if len(self.body) >= get_settings().response_compression_min_bytes:
+            accepted = _accepted_encodings(request.headers.get("accept-encoding", ""))
+            encoding = next((e for e in _ENCODINGS if e in accepted), None)
+
+        # Each representation needs its own strong tag
+        headers["ETag"] = f'"{self.digest}-{encoding}"' if encoding else self.etag
+
+        if self.matches(request.headers.get("if-none-match")):
+            return Response(status_code=304, headers=headers)
+
+        if encoding:
+            headers["Content-Encoding"] = encoding
+            body = self.variant(encoding)
+        else:
+            body = self.body
+
+        return Response(content=body, status_code=status_code, media_type="application/json", headers=headers)
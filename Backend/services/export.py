@@ -0,0 +1,216 @@
+"""
+Streaming export of raw feature_clicks rows.
+
+Rows are read with the keyset scan from services.click_scan (one page in
+memory at a time), filtered by age group / gender through the user
+dimension cache, and encoded page by page as NDJSON, CSV or Parquet row
+groups. Memory stays bounded by the page size (or the Parquet row group
+size), however many rows are exported.
+
+Parquet needs the optional `pyarrow` package.
+"""
+
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Iterator, Literal, Optional
+
+from config import get_settings
+from services.click_scan import iter_click_pages
+from services.user_dimensions import AGE_GROUPS, get_user_dimensions
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export is optional
+    pa = pq = None
+
+ExportFormat = Literal["ndjson", "csv", "parquet"]
+
+EXPORT_COLUMNS = ("id", "user_id", "feature_name", "timestamp", "age_group", "gender")
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def parquet_available() -> bool:
+    return pq is not None
+
+
+def iter_export_pages(
+    supabase,
+    start_date: Optional[datetime],
+    end_date: Optional[datetime],
+    age_group: Optional[str],
+    gender: Optional[str],
+    feature_name: Optional[str],
+) -> Iterator[list[dict]]:
+    """
+    Pages of matching clicks in (timestamp, id) order, with the user's
+    age group and gender attached. Like /analytics, clicks by users
+    without a profile are left out.
+    """
+    dims = get_user_dimensions()
+    if not dims.loaded:
+        dims.load(supabase)
+
+    pages = iter_click_pages(
+        supabase,
+        "user_id,feature_name",
+        start=start_date,
+        end=end_date,
+        feature_name=feature_name,
+    )
+
+    for page in pages:
+        unknown = {row["user_id"] for row in page if row["user_id"] not in dims}
+        if unknown:
+            dims.resolve(supabase, unknown)
+
+        rows = []
+        for row in page:
+            dimension = dims.get(row["user_id"])
+            if dimension is None:
+                continue
+
+            user_age_group, user_gender = dimension
+            # Unknown age groups span every age, as in /analytics
+            if age_group in AGE_GROUPS and user_age_group != age_group:
+                continue
+            if gender and user_gender != gender:
+                continue
+
+            rows.append({
+                "id": row["id"],
+                "user_id": row["user_id"],
+                "feature_name": row["feature_name"],
+                "timestamp": row["timestamp"],
+                "age_group": user_age_group,
+                "gender": user_gender,
+            })
+
+        if rows:
+            yield rows
+
+
+def encode_ndjson(pages: Iterator[list[dict]]) -> Iterator[bytes]:
+    for rows in pages:
+        yield "".join(json.dumps(row, separators=(",", ":")) + "\n" for row in rows).encode()
+
+
+def encode_csv(pages: Iterator[list[dict]]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+
+    for rows in pages:
+        writer.writerows([row[column] for column in EXPORT_COLUMNS] for row in rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+
+    # Header only, for an empty export
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+class _ChunkSink:
+    """Write-only file object that hands out what was written since the last drain."""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        # Parquet metadata records absolute offsets, so count every byte
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def writable(self) -> bool:
+        return True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _parquet_schema():
+    return pa.schema([
+        ("id", pa.int64()),
+        ("user_id", pa.string()),
+        ("feature_name", pa.string()),
+        ("timestamp", pa.timestamp("us", tz="UTC")),
+        ("age_group", pa.dictionary(pa.int8(), pa.string())),
+        ("gender", pa.dictionary(pa.int8(), pa.string())),
+    ])
+
+
+def encode_parquet(pages: Iterator[list[dict]], row_group_size: Optional[int] = None) -> Iterator[bytes]:
+    """Parquet file streamed one row group at a time."""
+    row_group_size = row_group_size or get_settings().export_parquet_row_group_size
+    schema = _parquet_schema()
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+
+    columns: dict[str, list] = {name: [] for name in EXPORT_COLUMNS}
+    pending = 0
+
+    def write_row_group() -> bytes:
+        nonlocal pending
+        columns["timestamp"] = [
+            datetime.fromisoformat(value.replace("Z", "+00:00")) for value in columns["timestamp"]
+        ]
+        writer.write_table(pa.Table.from_pydict(columns, schema=schema), row_group_size=pending)
+        for values in columns.values():
+            values.clear()
+        pending = 0
+        return sink.drain()
+
+    for rows in pages:
+        for row in rows:
+            for name in EXPORT_COLUMNS:
+                columns[name].append(row[name])
+        pending += len(rows)
+
+        if pending >= row_group_size:
+            yield write_row_group()
+
+    if pending:
+        yield write_row_group()
+
+    writer.close()
+    yield sink.drain()
+
+
+def stream_export(pages: Iterator[list[dict]], export_format: ExportFormat) -> Iterator[bytes]:
+    """Encoded export body, produced lazily page by page."""
+    if export_format == "csv":
+        chunks = encode_csv(pages)
+    elif export_format == "parquet":
+        chunks = encode_parquet(pages)
+    else:
+        chunks = encode_ndjson(pages)
+
+    try:
+        yield from chunks
+    except Exception as e:
+        # Headers are already sent; the client sees a truncated body
+        print(f"[Export] Aborted {export_format} export: {e}")
+        raise
@@ -0,0 +1,473 @@
+"""
+In-process columnar store for recent clicks.
+
+Holds a sliding window (e.g. the last 90 days) of events as NumPy columns:
+
+    ts       int64   epoch microseconds (UTC)
+    feature  int32   dictionary-encoded feature_name
+    user     int32   dictionary-encoded user_id
+    age      int8    age group code, -1 if the user has no profile
+    gender   int8    dictionary-encoded gender, -1 if no profile
+    id       int64   feature_clicks.id
+
+Filters become boolean masks and the (feature, time bucket) group-by is a
+single `np.unique` over the matching rows, so /analytics over the window
+never touches the database.
+
+Columns live in fixed-size chunks. Events are appended to the newest
+chunk as /track ingests them, and whole chunks are dropped once all their
+events fall out of the window; feature names and user ids no longer
+referenced by any chunk are then dropped from their dictionaries. Events
+written by other workers are picked up by polling `feature_clicks` for
+ids past the highest one seen. Rows this worker inserted can be ahead of that mark,
+so a query can be cut off at it (`max_id`) to count exactly the clicks
+up to the mark.
+"""
+
+import asyncio
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+import numpy as np
+
+from config import get_settings
+from services.blocking import run_blocking
+from services.click_scan import iter_click_pages
+from services.user_dimensions import AGE_GROUPS, get_user_dimensions
+
+# (feature_name, bucket start in epoch seconds, count), as in services.analytics
+ClickGroup = tuple[str, int, int]
+
+_US_PER_SECOND = 1_000_000
+_US_PER_DAY = 86_400 * _US_PER_SECOND
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_AGE_GROUP_CODES = {name: code for code, name in enumerate(AGE_GROUPS)}
+_MAX_FEATURES = np.iinfo(np.int32).max
+_MAX_GENDERS = np.iinfo(np.int8).max
+
+
+def _to_us(value: datetime) -> int:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    delta = value - _EPOCH
+    return (delta.days * 86_400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+def _parse_us(value) -> int:
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return _to_us(value)
+
+
+class _Chunk:
+    """Fixed-capacity column arrays; rows [0, size) are filled."""
+
+    __slots__ = ("ts", "feature", "user", "age", "gender", "id", "size", "max_ts", "max_id")
+
+    def __init__(self, capacity: int):
+        self.ts = np.empty(capacity, dtype=np.int64)
+        self.feature = np.empty(capacity, dtype=np.int32)
+        self.user = np.empty(capacity, dtype=np.int32)
+        self.age = np.empty(capacity, dtype=np.int8)
+        self.gender = np.empty(capacity, dtype=np.int8)
+        self.id = np.empty(capacity, dtype=np.int64)
+        self.size = 0
+        self.max_ts = np.iinfo(np.int64).min
+        self.max_id = 0
+
+    @property
+    def full(self) -> bool:
+        return self.size == len(self.ts)
+
+    @property
+    def nbytes(self) -> int:
+        return (
+            self.ts.nbytes + self.feature.nbytes + self.user.nbytes
+            + self.age.nbytes + self.gender.nbytes + self.id.nbytes
+        )
+
+
+class ColumnarClickStore:
+    """Sliding window of clicks in NumPy column chunks."""
+
+    def __init__(self, window_days: int = 90, chunk_size: int = 65536):
+        self._window_us = window_days * _US_PER_DAY
+        self._chunk_size = chunk_size
+        self._chunks: list[_Chunk] = []
+        self._lock = threading.Lock()
+
+        # Dictionaries: value -> code, plus code -> feature name
+        self._features: dict[str, int] = {}
+        self._feature_names: list[str] = []
+        self._users: dict[str, int] = {}
+        self._genders: dict[str, int] = {}
+
+        # Complete for events at or after this instant (None until loaded)
+        self._covered_from_us: Optional[int] = None
+        # Highest feature_clicks.id read by load/sync, and ids appended
+        # locally past it (so the next sync doesn't store them twice)
+        self._high_id = 0
+        self._local_ids: set[int] = set()
+
+        # Counters
+        self._appended = 0
+        self._evicted_chunks = 0
+
+    @property
+    def ready(self) -> bool:
+        return self._covered_from_us is not None
+
+    @property
+    def high_id(self) -> int:
+        """Every click with an id up to this one has been read into the store."""
+        return self._high_id
+
+    def covers(self, start_date: Optional[datetime]) -> bool:
+        """Whether a query starting at start_date can be answered here."""
+        covered_from = self._covered_from_us
+        return covered_from is not None and start_date is not None and _to_us(start_date) >= covered_from
+
+    def invalidate(self) -> None:
+        """Stop answering queries (e.g. after a failed ingest left a gap)."""
+        self._covered_from_us = None
+
+    def _code(self, mapping: dict[str, int], value: str, limit: int) -> int:
+        code = mapping.get(value)
+        if code is None:
+            code = len(mapping)
+            if code >= limit:
+                raise OverflowError(f"Too many distinct values for the columnar store ({limit})")
+            mapping[value] = code
+        return code
+
+    def _append_locked(self, rows: list[dict], cutoff_us: int) -> int:
+        dims = get_user_dimensions()
+        added = 0
+
+        for row in rows:
+            ts = _parse_us(row["timestamp"])
+            if ts < cutoff_us:
+                continue
+
+            dimension = dims.get(row["user_id"])
+            if dimension is None:
+                age = gender = -1
+            else:
+                age = _AGE_GROUP_CODES[dimension[0]]
+                gender = self._code(self._genders, dimension[1], _MAX_GENDERS)
+
+            feature = self._features.get(row["feature_name"])
+            if feature is None:
+                feature = self._code(self._features, row["feature_name"], _MAX_FEATURES)
+                self._feature_names.append(row["feature_name"])
+
+            if not self._chunks or self._chunks[-1].full:
+                self._chunks.append(_Chunk(self._chunk_size))
+            chunk = self._chunks[-1]
+
+            i = chunk.size
+            chunk.ts[i] = ts
+            chunk.feature[i] = feature
+            chunk.user[i] = self._code(self._users, row["user_id"], np.iinfo(np.int32).max)
+            chunk.age[i] = age
+            chunk.gender[i] = gender
+            chunk.id[i] = row["id"]
+            # Publish the row only after its columns are written
+            chunk.size = i + 1
+            chunk.max_ts = max(chunk.max_ts, ts)
+            chunk.max_id = max(chunk.max_id, row["id"])
+            added += 1
+
+        self._appended += added
+        return added
+
+    def _resolve_users(self, supabase, rows: list[dict]) -> None:
+        dims = get_user_dimensions()
+        unknown = {row["user_id"] for row in rows if row["user_id"] not in dims}
+        if unknown:
+            dims.resolve(supabase, unknown)
+
+    def ingest(self, supabase, rows: list[dict]) -> int:
+        """Append rows just inserted by this worker (with their ids)."""
+        if not self.ready or not rows:
+            return 0
+
+        self._resolve_users(supabase, rows)
+        cutoff_us = _to_us(datetime.now(timezone.utc)) - self._window_us
+
+        with self._lock:
+            # A sync may already have read these rows
+            fresh = [row for row in rows if row["id"] > self._high_id and row["id"] not in self._local_ids]
+            self._local_ids.update(row["id"] for row in fresh)
+            return self._append_locked(fresh, cutoff_us)
+
+    def _append_polled(self, supabase, rows: list[dict], cutoff_us: int) -> int:
+        self._resolve_users(supabase, rows)
+
+        with self._lock:
+            fresh = [row for row in rows if row["id"] not in self._local_ids]
+            self._local_ids.difference_update(row["id"] for row in rows)
+            self._high_id = max(self._high_id, max(row["id"] for row in rows))
+            return self._append_locked(fresh, cutoff_us)
+
+    def _append_backfilled(self, supabase, rows: list[dict], cutoff_us: int) -> int:
+        self._resolve_users(supabase, rows)
+
+        with self._lock:
+            # The backfill reads in timestamp order, so a row written
+            # meanwhile with a past timestamp can have a lower id than
+            # rows read after it. The mark stays at the id read before the
+            # backfill, and the next sync skips the newer rows already read
+            self._local_ids.update(row["id"] for row in rows if row["id"] > self._high_id)
+            return self._append_locked(rows, cutoff_us)
+
+    def load(self, supabase) -> int:
+        """Backfill the window from feature_clicks; returns events loaded."""
+        self._covered_from_us = None
+        cutoff = datetime.now(timezone.utc) - timedelta(microseconds=self._window_us)
+        cutoff_us = _to_us(cutoff)
+
+        # Later syncs start from the newest id, not from the start of the table
+        newest = supabase.table("feature_clicks").select("id") \
+            .order("id", desc=True).limit(1).execute().data
+
+        with self._lock:
+            self._chunks = []
+            # Start the dictionaries over too, so a reload recovers from overflow
+            self._features = {}
+            self._feature_names = []
+            self._users = {}
+            self._genders = {}
+            self._high_id = newest[0]["id"] if newest else 0
+            self._local_ids.clear()
+
+        loaded = 0
+        for page in iter_click_pages(supabase, "user_id,feature_name", start=cutoff):
+            loaded += self._append_backfilled(supabase, page, cutoff_us)
+
+        # Rows written while the backfill ran are picked up by id
+        self.sync(supabase)
+        self._covered_from_us = cutoff_us
+        return loaded
+
+    def sync(self, supabase) -> int:
+        """Append clicks written (by any worker) since the last read."""
+        page_size = get_settings().postgrest_max_rows
+        cutoff_us = _to_us(datetime.now(timezone.utc)) - self._window_us
+        added = 0
+
+        while True:
+            rows = supabase.table("feature_clicks") \
+                .select("id,user_id,feature_name,timestamp") \
+                .gt("id", self._high_id) \
+                .order("id").limit(page_size).execute().data or []
+            if not rows:
+                return added
+
+            added += self._append_polled(supabase, rows, cutoff_us)
+
+    def _compact_features_locked(self) -> None:
+        """Drop feature names no chunk refers to any more and renumber the rest."""
+        used = np.zeros(len(self._feature_names), dtype=bool)
+        for chunk in self._chunks:
+            used[chunk.feature[:chunk.size]] = True
+        if used.all():
+            return
+
+        remap = np.cumsum(used, dtype=np.int32) - 1
+        for chunk in self._chunks:
+            # New arrays: running queries keep the columns and names they snapshotted
+            feature = np.empty_like(chunk.feature)
+            feature[:chunk.size] = remap[chunk.feature[:chunk.size]]
+            chunk.feature = feature
+
+        self._feature_names = [name for name, keep in zip(self._feature_names, used.tolist()) if keep]
+        self._features = {name: code for code, name in enumerate(self._feature_names)}
+
+    def _compact_users_locked(self) -> None:
+        """Drop user ids no chunk refers to any more and renumber the rest."""
+        used = np.zeros(len(self._users), dtype=bool)
+        for chunk in self._chunks:
+            used[chunk.user[:chunk.size]] = True
+        if used.all():
+            return
+
+        remap = np.cumsum(used, dtype=np.int32) - 1
+        for chunk in self._chunks:
+            user = np.empty_like(chunk.user)
+            user[:chunk.size] = remap[chunk.user[:chunk.size]]
+            chunk.user = user
+
+        # Codes were handed out in insertion order, so the dict is in code order
+        kept = [user_id for user_id, keep in zip(self._users, used.tolist()) if keep]
+        self._users = {user_id: code for code, user_id in enumerate(kept)}
+
+    def evict(self) -> int:
+        """Drop chunks whose events are all older than the window."""
+        cutoff_us = _to_us(datetime.now(timezone.utc)) - self._window_us
+
+        with self._lock:
+            # The chunk being filled is never dropped
+            keep = [c for c in self._chunks[:-1] if c.max_ts >= cutoff_us] + self._chunks[-1:]
+            evicted = len(self._chunks) - len(keep)
+            self._chunks = keep
+            self._evicted_chunks += evicted
+            if evicted:
+                self._compact_features_locked()
+                self._compact_users_locked()
+
+        if self._covered_from_us is not None:
+            self._covered_from_us = max(self._covered_from_us, cutoff_us)
+        return evicted
+
+    def query(
+        self,
+        start_date: Optional[datetime],
+        end_date: Optional[datetime],
+        age_group: Optional[str],
+        gender: Optional[str],
+        bucket_seconds: int = 86_400,
+        bucket_offset_seconds: int = 0,
+        max_id: Optional[int] = None,
+    ) -> list[ClickGroup]:
+        """
+        Grouped (feature, bucket, count) for an inclusive window and filters;
+        buckets start at multiples of bucket_seconds minus bucket_offset_seconds.
+        With max_id, clicks with higher ids are left out.
+        """
+        start_us = _to_us(start_date) if start_date else None
+        end_us = _to_us(end_date) if end_date else None
+        # Unknown age groups span every age, as in get_age_range()
+        age_code = _AGE_GROUP_CODES.get(age_group) if age_group else None
+
+        gender_code = None
+        if gender:
+            gender_code = self._genders.get(gender)
+            if gender_code is None:
+                return []
+
+        with self._lock:
+            chunks = [(chunk, chunk.feature, chunk.size) for chunk in self._chunks]
+            feature_names = list(self._feature_names)
+
+        feature_count = max(len(feature_names), 1)
+        bucket_us = bucket_seconds * _US_PER_SECOND
+        offset_us = bucket_offset_seconds * _US_PER_SECOND
+        keys = []
+
+        for chunk, feature, size in chunks:
+            if size == 0 or (start_us is not None and chunk.max_ts < start_us):
+                continue
+
+            ts = chunk.ts[:size]
+            # Users without a profile never match, like the SQL join
+            mask = chunk.age[:size] >= 0
+            if start_us is not None:
+                mask &= ts >= start_us
+            if end_us is not None:
+                mask &= ts <= end_us
+            if age_code is not None:
+                mask &= chunk.age[:size] == age_code
+            if gender_code is not None:
+                mask &= chunk.gender[:size] == gender_code
+            if max_id is not None and chunk.max_id > max_id:
+                mask &= chunk.id[:size] <= max_id
+
+            buckets = (ts[mask] + offset_us) // bucket_us
+            keys.append(buckets * feature_count + feature[:size][mask])
+
+        if not keys:
+            return []
+
+        # Sorting the keys counts only the (bucket, feature) cells present,
+        # however wide the span of buckets or features
+        keys, counts = np.unique(np.concatenate(keys), return_counts=True)
+        buckets, features = np.divmod(keys, feature_count)
+
+        return [
+            (feature_names[feature], bucket * bucket_seconds - bucket_offset_seconds, count)
+            for bucket, feature, count in zip(buckets.tolist(), features.tolist(), counts.tolist())
+        ]
+
+    def stats(self) -> dict:
+        with self._lock:
+            events = sum(chunk.size for chunk in self._chunks)
+            nbytes = sum(chunk.nbytes for chunk in self._chunks)
+            chunk_count = len(self._chunks)
+
+        covered_from = None
+        if self._covered_from_us is not None:
+            covered_from = (_EPOCH + timedelta(microseconds=self._covered_from_us)).isoformat()
+
+        return {
+            "ready": self.ready,
+            "events": events,
+            "chunks": chunk_count,
+            "bytes": nbytes,
+            "features": len(self._feature_names),
+            "users": len(self._users),
+            "covered_from": covered_from,
+            "high_id": self._high_id,
+            "appended": self._appended,
+            "evicted_chunks": self._evicted_chunks,
+        }
+
+
+_hot_store: Optional[ColumnarClickStore] = None
+_sync_task: Optional[asyncio.Task] = None
+
+
+def get_hot_store() -> Optional[ColumnarClickStore]:
+    """The running store, or None when disabled."""
+    return _hot_store
+
+
+async def _sync_hot_store(supabase, interval_seconds: float) -> None:
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            if not _hot_store.ready:
+                await run_blocking(_hot_store.load, supabase)
+            else:
+                await run_blocking(_hot_store.sync, supabase)
+                _hot_store.evict()
+        except Exception as e:
+            print(f"[HotStore] Sync failed: {type(e).__name__}: {str(e)}")
+
+
+async def start_hot_store(supabase) -> None:
+    """Create, backfill and start syncing the store if enabled (app lifespan)."""
+    global _hot_store, _sync_task
+    settings = get_settings()
+
+    if not settings.hot_store_enabled or _hot_store is not None:
+        return
+
+    _hot_store = ColumnarClickStore(
+        window_days=settings.hot_store_window_days,
+        chunk_size=settings.hot_store_chunk_size,
+    )
+
+    started = time.perf_counter()
+    try:
+        events = await run_blocking(_hot_store.load, supabase)
+        print(f"[HotStore] Loaded {events} events in {time.perf_counter() - started:.1f}s")
+    except Exception as e:
+        # Queries use the database until a later sync loads the store
+        print(f"[HotStore] Initial load failed: {type(e).__name__}: {str(e)}")
+
+    _sync_task = asyncio.create_task(_sync_hot_store(supabase, settings.hot_store_sync_seconds))
+
+
+async def stop_hot_store() -> None:
+    global _hot_store, _sync_task
+    if _sync_task is not None:
+        _sync_task.cancel()
+        try:
+            await _sync_task
+        except asyncio.CancelledError:
+            pass
+        _sync_task = None
+    _hot_store = None
@@ -0,0 +1,120 @@
+"""
+HyperLogLog distinct-count sketches.
+
+A sketch is 2^precision one-byte registers: each value is hashed to 64
+bits, the top `precision` bits pick a register and the register keeps the
+longest run of leading zeros (+1) seen in the remaining bits. Memory is
+fixed whatever the number of distinct values, the relative standard error
+is 1.04 / sqrt(2^precision) (1.6% at precision 12, 0.8% at 14), adding a
+value twice is a no-op, and two sketches merge by taking the register-wise
+maximum, so per-cell sketches can be combined over any range of cells.
+
+Estimates use Ertl's improved raw estimator ("New cardinality estimation
+algorithms for HyperLogLog sketches", 2017), which stays unbiased from
+empty to very large sketches without HLL++'s empirical bias tables.
+"""
+
+import hashlib
+import math
+from typing import Iterable, Optional
+
+import numpy as np
+
+MIN_PRECISION = 4
+MAX_PRECISION = 18
+
+
+def standard_error(precision: int) -> float:
+    return 1.04 / math.sqrt(1 << precision)
+
+
+def register_position(value: str, precision: int) -> tuple[int, int]:
+    """(register index, rank) that `value` updates in a sketch of this precision."""
+    hashed = int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+    width = 64 - precision
+    rest = hashed & ((1 << width) - 1)
+    return hashed >> width, width - rest.bit_length() + 1
+
+
+def _sigma(x: float) -> float:
+    if x == 1.0:
+        return math.inf
+    y, z = 1.0, x
+    while True:
+        x *= x
+        previous = z
+        z += x * y
+        y += y
+        if z == previous:
+            return z
+
+
+def _tau(x: float) -> float:
+    if x == 0.0 or x == 1.0:
+        return 0.0
+    y, z = 1.0, 1.0 - x
+    while True:
+        x = math.sqrt(x)
+        previous = z
+        y *= 0.5
+        z -= (1.0 - x) ** 2 * y
+        if z == previous:
+            return z / 3
+
+
+def estimate_registers(registers: np.ndarray, precision: int) -> float:
+    """Cardinality estimate for a register array."""
+    m = 1 << precision
+    width = 64 - precision
+    histogram = np.bincount(registers, minlength=width + 2).tolist()
+
+    z = m * _tau(1.0 - histogram[width + 1] / m)
+    for k in range(width, 0, -1):
+        z = 0.5 * (z + histogram[k])
+    z += m * _sigma(histogram[0] / m)
+
+    if math.isinf(z):
+        return 0.0
+    return m * m / (2 * math.log(2)) / z
+
+
+class HyperLogLog:
+    """Registers in a bytearray (compact, cheap to update one at a time)."""
+
+    __slots__ = ("precision", "registers")
+
+    def __init__(self, precision: int = 12, registers: Optional[bytearray] = None):
+        if not MIN_PRECISION <= precision <= MAX_PRECISION:
+            raise ValueError(f"HyperLogLog precision must be between {MIN_PRECISION} and {MAX_PRECISION}")
+        self.precision = precision
+        self.registers = registers if registers is not None else bytearray(1 << precision)
+
+    def add(self, value: str) -> None:
+        self.add_position(*register_position(value, self.precision))
+
+    def add_position(self, index: int, rank: int) -> None:
+        if self.registers[index] < rank:
+            self.registers[index] = rank
+
+    def view(self) -> np.ndarray:
+        """The registers as a uint8 array (no copy)."""
+        return np.frombuffer(self.registers, dtype=np.uint8)
+
+    def merge(self, other: "HyperLogLog") -> None:
+        """Fold `other` into this sketch (union of the counted values)."""
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLog sketches of different precision")
+        np.maximum(self.view(), other.view(), out=self.view())
+
+    def estimate(self) -> float:
+        return estimate_registers(self.view(), self.precision)
+
+    def __len__(self) -> int:
+        return round(self.estimate())
+
+    @classmethod
+    def union(cls, sketches: Iterable["HyperLogLog"], precision: int = 12) -> "HyperLogLog":
+        merged = cls(precision)
+        for sketch in sketches:
+            merged.merge(sketch)
+        return merged
@@ -0,0 +1,288 @@
+"""
+Live click counters pushed to dashboards over Server-Sent Events.
+
+/track adds every accepted event to an in-memory ring of per-second
+counts per feature covering the last `window_seconds`. Once per tick a
+single background task drains the increments recorded since the previous
+tick into one delta message, serializes it once, and hands the same bytes
+to every subscriber, so a tick costs the same whether one dashboard or a
+thousand are watching, and none of them touches the database.
+
+Messages (SSE `data:` lines, JSON):
+
+    event: snapshot   {"now": 1760000123, "window_seconds": 900,
+                       "counts": {"chart_bar": [[1760000100, 3], ...], ...}}
+    event: delta      same shape; counts are increments to add (sent
+                      every tick, empty or not, so clients can slide
+                      their window and notice a dead connection)
+
+A new subscriber gets a snapshot built at a tick boundary, then the
+deltas of the following ticks, so snapshot + deltas never double count.
+Clients drop seconds older than now - window_seconds. A subscriber that
+falls `queue_size` ticks behind is disconnected; EventSource-style
+clients reconnect and start over from a fresh snapshot.
+
+Counts are per worker process: each worker sees the /track requests it
+served. Run the live stream on a single worker (or route dashboards and
+/track to the same one) for complete counts.
+"""
+
+import asyncio
+import threading
+import time
+from typing import AsyncIterator, Optional
+
+import orjson
+
+from config import get_settings
+from services.buckets import epoch_seconds
+
+# Ask EventSource clients to reconnect after this many milliseconds
+_RETRY_MS = 2000
+
+
+class LiveCounters:
+    """Ring buffer of per-second click counts per feature."""
+
+    def __init__(self, window_seconds: int = 900):
+        self.window_seconds = window_seconds
+        # Slot per second: {feature_name: count}, holding only features
+        # clicked in that second, so memory follows the window's traffic
+        self._slots: list[dict[str, int]] = [{} for _ in range(window_seconds)]
+        # Epoch second currently held by each slot (-1: empty)
+        self._stamps = [-1] * window_seconds
+        # (second, feature_name) -> increments since the last drain
+        self._pending: dict[tuple[int, str], int] = {}
+        self._lock = threading.Lock()
+
+        # Counters
+        self._recorded = 0
+        self._outside_window = 0
+
+    def record(self, click_rows: list[dict], now: Optional[int] = None) -> None:
+        """Count click rows ({feature_name, timestamp?}); rows without a timestamp count now."""
+        now = now if now is not None else int(time.time())
+        oldest = now - self.window_seconds + 1
+
+        with self._lock:
+            for row in click_rows:
+                second = epoch_seconds(row["timestamp"]) if row.get("timestamp") else now
+                if not oldest <= second <= now:
+                    self._outside_window += 1
+                    continue
+
+                slot = second % self.window_seconds
+                if self._stamps[slot] != second:
+                    # The slot still holds a second that left the window
+                    self._slots[slot] = {}
+                    self._stamps[slot] = second
+
+                feature = row["feature_name"]
+                counts = self._slots[slot]
+                counts[feature] = counts.get(feature, 0) + 1
+                key = (second, feature)
+                self._pending[key] = self._pending.get(key, 0) + 1
+                self._recorded += 1
+
+    @staticmethod
+    def _group(cells) -> dict[str, list[list[int]]]:
+        counts: dict[str, list[list[int]]] = {}
+        for second, feature, count in cells:
+            counts.setdefault(feature, []).append([second, count])
+        for series in counts.values():
+            series.sort()
+        return counts
+
+    def drain(self) -> dict[str, list[list[int]]]:
+        """Increments recorded since the last drain, per feature as [second, count] pairs."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return self._group((second, feature, count) for (second, feature), count in pending.items())
+
+    def _live_slots(self, now: int) -> list[tuple[int, dict[str, int]]]:
+        oldest = now - self.window_seconds
+        return [(second, counts) for second, counts in zip(self._stamps, self._slots) if second > oldest]
+
+    def snapshot(self, now: int) -> dict[str, list[list[int]]]:
+        """Every non-zero count still inside the window, per feature."""
+        with self._lock:
+            cells = [
+                (second, feature, count)
+                for second, counts in self._live_slots(now)
+                for feature, count in counts.items()
+            ]
+        return self._group(cells)
+
+    def stats(self) -> dict:
+        with self._lock:
+            features = {feature for _, counts in self._live_slots(int(time.time())) for feature in counts}
+        return {
+            "window_seconds": self.window_seconds,
+            "features": len(features),
+            "recorded": self._recorded,
+            "outside_window": self._outside_window,
+        }
+
+
+def _event(name: str, payload: dict) -> bytes:
+    return b"event: " + name.encode() + b"\ndata: " + orjson.dumps(payload) + b"\n\n"
+
+
+class LiveBroadcaster:
+    """Ticks LiveCounters and fans the serialized deltas out to subscribers."""
+
+    def __init__(
+        self,
+        counters: LiveCounters,
+        tick_seconds: float = 1.0,
+        max_subscribers: int = 1000,
+        queue_size: int = 30,
+    ):
+        self.counters = counters
+        self._tick_seconds = tick_seconds
+        self._max_subscribers = max_subscribers
+        self._queue_size = queue_size
+        self._subscribers: set[asyncio.Queue] = set()
+        # Connected, waiting for the next tick's snapshot
+        self._joining: list[asyncio.Queue] = []
+        self._task: Optional[asyncio.Task] = None
+
+        # Counters
+        self._ticks = 0
+        self._snapshots = 0
+        self._dropped = 0
+        self._last_tick_ms = 0.0
+
+    def full(self) -> bool:
+        return len(self._subscribers) + len(self._joining) >= self._max_subscribers
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Ends every open stream
+        for queue in [*self._subscribers, *self._joining]:
+            self._close(queue)
+        self._subscribers.clear()
+        self._joining.clear()
+
+    def _close(self, queue: asyncio.Queue) -> None:
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(None)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        while True:
+            next_tick += self._tick_seconds
+            await asyncio.sleep(max(0.0, next_tick - loop.time()))
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"[Live] Tick failed: {type(e).__name__}: {str(e)}")
+
+    def tick(self, now: Optional[int] = None) -> None:
+        """Publish one delta to subscribers and a snapshot to new ones."""
+        started = time.perf_counter()
+        now = now if now is not None else int(time.time())
+        window = self.counters.window_seconds
+
+        # Drained even without subscribers, so increments don't pile up
+        delta = self.counters.drain()
+        if self._subscribers:
+            message = _event("delta", {"now": now, "window_seconds": window, "counts": delta})
+            for queue in list(self._subscribers):
+                if queue.full():
+                    # Too far behind: drop it; it reconnects to a fresh snapshot
+                    self._subscribers.discard(queue)
+                    self._close(queue)
+                    self._dropped += 1
+                else:
+                    queue.put_nowait(message)
+
+        if self._joining:
+            # One snapshot for everyone who connected during this tick
+            message = _event("snapshot", {"now": now, "window_seconds": window, "counts": self.counters.snapshot(now)})
+            for queue in self._joining:
+                queue.put_nowait(message)
+                self._subscribers.add(queue)
+            self._joining.clear()
+            self._snapshots += 1
+
+        self._ticks += 1
+        self._last_tick_ms = (time.perf_counter() - started) * 1000
+
+    async def stream(self) -> AsyncIterator[bytes]:
+        """SSE body for one subscriber, until it disconnects or is dropped."""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self._queue_size)
+        self._joining.append(queue)
+        try:
+            yield f"retry: {_RETRY_MS}\n\n".encode()
+            while True:
+                message = await queue.get()
+                if message is None:
+                    return
+                yield message
+        finally:
+            self._subscribers.discard(queue)
+            if queue in self._joining:
+                self._joining.remove(queue)
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self._subscribers) + len(self._joining),
+            "max_subscribers": self._max_subscribers,
+            "tick_seconds": self._tick_seconds,
+            "ticks": self._ticks,
+            "snapshots": self._snapshots,
+            "dropped_subscribers": self._dropped,
+            "last_tick_ms": round(self._last_tick_ms, 3),
+            **self.counters.stats(),
+        }
+
+
+_live: Optional[LiveBroadcaster] = None
+
+
+def get_live() -> Optional[LiveBroadcaster]:
+    """The running live feed, or None when disabled."""
+    return _live
+
+
+def record_live_clicks(click_rows: list[dict]) -> None:
+    """Count accepted /track events in the live feed, if enabled."""
+    if _live is not None:
+        _live.counters.record(click_rows)
+
+
+async def start_live() -> None:
+    """Create the counters and start ticking if enabled (app lifespan)."""
+    global _live
+    settings = get_settings()
+
+    if not settings.live_enabled or _live is not None:
+        return
+
+    _live = LiveBroadcaster(
+        LiveCounters(settings.live_window_seconds),
+        tick_seconds=settings.live_tick_seconds,
+        max_subscribers=settings.live_max_subscribers,
+        queue_size=settings.live_subscriber_queue_size,
+    )
+    await _live.start()
+
+
+async def stop_live() -> None:
+    global _live
+    if _live is not None:
+        await _live.stop()
+        _live = None
@@ -0,0 +1,216 @@
+"""
+Lightweight in-process metrics in Prometheus text format.
+
+Counters and histograms are plain Python objects updated under a lock
+(about a microsecond per observation), so they stay on in production.
+Values that already live elsewhere (token cache, analytics cache, write
+buffer, hot store counters) are not duplicated: collectors registered
+with `register_collector` read them when /metrics is scraped.
+
+    with span("analytics.aggregate"):
+        groups = await storage.aggregate_clicks(...)
+
+Metrics are per process; with several workers, scrape each one or let
+Prometheus sum them.
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterable, Iterator, Optional
+
+# Seconds; covers cache hits (sub-ms) to slow aggregations
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# (name, type, help, [(labels, value)]) produced by a collector at scrape time
+Family = tuple[str, str, str, list[tuple[dict, float]]]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == int(value):
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            values = list(self._values.items())
+        for label_values, value in values:
+            yield f"{self.name}{_format_labels(self.labels, label_values)} {_format_value(value)}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels."""
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._buckets = buckets
+        # label values -> [count per bucket (+Inf last), sum]
+        self._series: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values) -> None:
+        index = bisect.bisect_left(self._buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self._buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            series = [(key, list(counts), total) for key, (counts, total) in self._series.items()]
+
+        for label_values, counts, total in series:
+            cumulative = 0
+            for bound, count in zip((*self._buckets, float("inf")), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                labels = _format_labels(self.labels, label_values, f'le="{le}"')
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labels, label_values)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "Time from request start to the end of the response body, per route template.",
+    ("method", "route"),
+)
+HTTP_REQUESTS = Counter(
+    "http_requests_total",
+    "Requests handled, per route template and status code.",
+    ("method", "route", "status"),
+)
+STAGE_SECONDS = Histogram(
+    "stage_duration_seconds",
+    "Time spent in one stage of request handling (auth, queries, aggregation, serialization).",
+    ("stage",),
+)
+DB_ROUND_TRIPS = Counter(
+    "db_round_trips_total",
+    "Requests to the storage backend (PostgREST tables, RPCs, Supabase Auth, SQLite statements).",
+    ("backend", "target"),
+)
+DB_ROWS = Counter(
+    "db_rows_fetched_total",
+    "Rows returned by the storage backend.",
+    ("backend", "target"),
+)
+
+_metrics = [HTTP_REQUEST_SECONDS, HTTP_REQUESTS, STAGE_SECONDS, DB_ROUND_TRIPS, DB_ROWS]
+_collectors: list[Callable[[], Iterable[Family]]] = []
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Time the enclosed block as `stage` (also around awaits)."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage)
+
+
+def record_db_call(backend: str, target: str, rows: int = 0) -> None:
+    DB_ROUND_TRIPS.inc(backend, target)
+    if rows:
+        DB_ROWS.inc(backend, target, amount=rows)
+
+
+def _content_range_rows(content_range: Optional[str]) -> int:
+    """Rows in a PostgREST page from its Content-Range ('0-999/*', '*/0')."""
+    if not content_range:
+        return 0
+    span_part = content_range.split("/", 1)[0]
+    if "-" not in span_part:
+        return 0
+    first, _, last = span_part.partition("-")
+    try:
+        return int(last) - int(first) + 1
+    except ValueError:
+        return 0
+
+
+def record_supabase_response(response) -> None:
+    """httpx response hook on the shared Supabase pool: one round trip each."""
+    path = response.request.url.path
+    if "/rest/v1/rpc/" in path:
+        target = "rpc"
+    elif "/rest/v1/" in path:
+        target = "table"
+    elif "/auth/v1/" in path:
+        target = "auth"
+    else:
+        target = "other"
+
+    rows = _content_range_rows(response.headers.get("content-range"))
+    record_db_call("supabase", target, rows)
+
+
+def register_collector(collector: Callable[[], Iterable[Family]]) -> None:
+    """Add a callable producing metric families from existing stats at scrape time."""
+    _collectors.append(collector)
+
+
+def render_metrics() -> str:
+    """Every metric in Prometheus text exposition format 0.0.4."""
+    lines: list[str] = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+
+    for collector in _collectors:
+        try:
+            families = list(collector())
+        except Exception as e:
+            print(f"[Metrics] Collector failed: {type(e).__name__}: {str(e)}")
+            continue
+
+        for name, kind, help, samples in families:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                names = tuple(labels)
+                lines.append(f"{name}{_format_labels(names, tuple(labels.values()))} {_format_value(value)}")
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,147 @@
+"""
+Daily rollup of clicks keyed on (day, feature_name, age_group, gender).
+
+The feature_clicks_daily table (see setup.sql) is kept up to date at
+ingestion time by the ingest_feature_clicks function, which inserts the
+raw rows and bumps their rollup cells in one transaction. Whole UTC days
+can then be answered from the rollup at O(days x features) cost; only
+the partial days at the edges of a query need raw events.
+
+Rebuild from raw events (e.g. after enabling the rollup on an existing
+database):
+
+    python -m services.rollup rebuild [--start YYYY-MM-DD] [--end YYYY-MM-DD]
+"""
+
+import argparse
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Optional
+
+from config import get_settings, get_supabase_admin_client
+from services.buckets import day_to_epoch
+
+# Timestamps are stored with microsecond precision, so an inclusive
+# bound one microsecond before midnight is the same as an exclusive one
+_ONE_MICROSECOND = timedelta(microseconds=1)
+
+
+def _as_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def _midnight(day: date) -> datetime:
+    return datetime.combine(day, time.min, tzinfo=timezone.utc)
+
+
+def split_day_aligned(
+    start_date: Optional[datetime],
+    end_date: Optional[datetime],
+) -> tuple[Optional[tuple[Optional[date], Optional[date]]], list[tuple[Optional[datetime], Optional[datetime]]]]:
+    """
+    Split an inclusive [start_date, end_date] filter into whole UTC days
+    and partial-day edges.
+
+    Returns (full_days, edges): full_days is (first_day, last_day) with
+    None meaning unbounded, or None if no whole day is covered; edges are
+    inclusive (start, end) ranges that must be read from raw events.
+    """
+    start = _as_utc(start_date) if start_date else None
+    end = _as_utc(end_date) if end_date else None
+
+    if start and end and start > end:
+        return None, []
+
+    first_day: Optional[date] = None
+    if start:
+        first_day = start.date()
+        if start != _midnight(first_day):
+            first_day += timedelta(days=1)
+
+    # The day containing `end` is only whole if `end` is its last instant
+    last_day: Optional[date] = None
+    if end:
+        last_day = end.date()
+        if end != _midnight(last_day + timedelta(days=1)) - _ONE_MICROSECOND:
+            last_day -= timedelta(days=1)
+
+    if first_day and last_day and first_day > last_day:
+        return None, [(start, end)]
+
+    edges: list[tuple[Optional[datetime], Optional[datetime]]] = []
+    if start and start < _midnight(first_day):
+        edges.append((start, _midnight(first_day) - _ONE_MICROSECOND))
+    if end and end >= _midnight(last_day + timedelta(days=1)):
+        edges.append((_midnight(last_day + timedelta(days=1)), end))
+
+    return (first_day, last_day), edges
+
+
+def fetch_rollup_counts(
+    supabase,
+    first_day: Optional[date],
+    last_day: Optional[date],
+    age_group: Optional[str],
+    gender: Optional[str],
+) -> list[tuple[str, int, int]]:
+    """Grouped (feature, day start in epoch seconds, count) for whole days from the rollup."""
+    params = {
+        "p_start_day": first_day.isoformat() if first_day else None,
+        "p_end_day": last_day.isoformat() if last_day else None,
+        "p_age_group": age_group,
+        "p_gender": gender,
+    }
+
+    page_size = get_settings().postgrest_max_rows
+    groups: list[tuple[str, int, int]] = []
+    offset = 0
+
+    while True:
+        rows = supabase.rpc("analytics_rollup_counts", params) \
+            .range(offset, offset + page_size - 1).execute().data or []
+
+        groups.extend(
+            (row["feature_name"], day_to_epoch(str(row["day"])), int(row["count"]))
+            for row in rows
+        )
+
+        if len(rows) < page_size:
+            return groups
+
+        offset += page_size
+
+
+def rebuild_rollup(
+    supabase,
+    start_day: Optional[date] = None,
+    end_day: Optional[date] = None,
+) -> int:
+    """Recompute rollup rows for [start_day, end_day] from raw clicks."""
+    response = supabase.rpc("rebuild_feature_clicks_daily", {
+        "p_start_day": start_day.isoformat() if start_day else None,
+        "p_end_day": end_day.isoformat() if end_day else None,
+    }).execute()
+
+    return int(response.data or 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the feature_clicks_daily rollup")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+
+    rebuild = subcommands.add_parser("rebuild", help="Recompute rollup rows from raw clicks")
+    rebuild.add_argument("--start", type=date.fromisoformat, help="First UTC day (default: all)")
+    rebuild.add_argument("--end", type=date.fromisoformat, help="Last UTC day (default: all)")
+
+    args = parser.parse_args()
+    supabase = get_supabase_admin_client()
+
+    if args.command == "rebuild":
+        print("Rebuilding feature_clicks_daily...")
+        rows = rebuild_rollup(supabase, args.start, args.end)
+        print(f"Wrote {rows} rollup rows")
+
+
+if __name__ == "__main__":
+    main()
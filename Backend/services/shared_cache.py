@@ -0,0 +1,216 @@
+"""
+Cache tier shared by every worker process on a host.
+
+The token cache and the /analytics result cache live in each worker's
+memory, so with N uvicorn/gunicorn workers a token is verified, and a
+filter set aggregated, up to N times, and each worker's hit ratio is
+what it alone has seen. This tier sits behind those per-process caches:
+on a local miss they look here before doing the work, and store what
+they computed here for the other workers.
+
+It is one SQLite file in WAL mode on local disk (no external service):
+readers never block each other or the writer, and a point lookup is a
+primary-key probe of a few tens of microseconds, cheap enough to run on
+the event loop. Writes go through the blocking threadpool. Entries are
+(namespace, key) -> bytes with an expiry; expired entries are ignored on
+read and deleted, with the oldest beyond `max_entries`, by a periodic
+sweep. The cached data can always be recomputed, so the file is written
+without fsync and any SQLite error is counted and treated as a miss.
+
+The file holds verified user data keyed by token hash, so it is created
+readable by the server's user only.
+"""
+
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from config import get_settings
+from services.blocking import run_blocking
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache_entries (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value BLOB NOT NULL,
+    stored_at REAL NOT NULL,   -- epoch seconds
+    expires_at REAL NOT NULL,  -- epoch seconds
+    PRIMARY KEY (namespace, key)
+);
+
+CREATE INDEX IF NOT EXISTS idx_cache_entries_expires ON cache_entries (expires_at);
+"""
+
+# (value, stored_at, expires_at)
+SharedEntry = tuple[bytes, float, float]
+
+
+class SharedCache:
+    """Expiring byte values in a SQLite file that every worker opens."""
+
+    def __init__(self, path: str, max_entries: int = 100_000, busy_timeout_ms: int = 100):
+        self._path = path
+        self._max_entries = max_entries
+        self._busy_timeout_ms = busy_timeout_ms
+        self._local = threading.local()
+        self._connections: list[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+        # Counters (this process)
+        self._hits = 0
+        self._misses = 0
+        self._writes = 0
+        self._errors = 0
+        self._swept = 0
+
+        # Create the file private to this user before SQLite opens it
+        os.close(os.open(path, os.O_CREAT | os.O_RDWR, 0o600))
+        connection = self._connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript(_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(
+                self._path, timeout=self._busy_timeout_ms / 1000, check_same_thread=False, isolation_level=None
+            )
+            # Losing the tail of a cache on power loss is harmless
+            connection.execute("PRAGMA synchronous=OFF")
+            self._local.connection = connection
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def close(self) -> None:
+        with self._lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+    def get(self, namespace: str, key: str) -> Optional[SharedEntry]:
+        """The unexpired entry for key, or None."""
+        try:
+            row = self._connection().execute(
+                "SELECT value, stored_at, expires_at FROM cache_entries "
+                "WHERE namespace = ? AND key = ? AND expires_at > ?",
+                (namespace, key, time.time()),
+            ).fetchone()
+        except sqlite3.Error:
+            self._errors += 1
+            return None
+
+        if row is None:
+            self._misses += 1
+            return None
+        self._hits += 1
+        return row
+
+    def set(
+        self,
+        namespace: str,
+        key: str,
+        value: bytes,
+        expires_at: float,
+        stored_at: Optional[float] = None,
+    ) -> None:
+        """Store value until expires_at; stored_at is when it was computed (default now)."""
+        try:
+            self._connection().execute(
+                "INSERT OR REPLACE INTO cache_entries (namespace, key, value, stored_at, expires_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (namespace, key, value, stored_at if stored_at is not None else time.time(), expires_at),
+            )
+        except sqlite3.Error:
+            self._errors += 1
+            return
+        self._writes += 1
+
+    def delete(self, namespace: str, key: str) -> None:
+        try:
+            self._connection().execute(
+                "DELETE FROM cache_entries WHERE namespace = ? AND key = ?", (namespace, key)
+            )
+        except sqlite3.Error:
+            self._errors += 1
+
+    def sweep(self) -> int:
+        """Delete expired entries, then the soonest to expire beyond max_entries."""
+        connection = self._connection()
+        removed = connection.execute(
+            "DELETE FROM cache_entries WHERE expires_at <= ?", (time.time(),)
+        ).rowcount
+
+        (entries,) = connection.execute("SELECT count(*) FROM cache_entries").fetchone()
+        if entries > self._max_entries:
+            removed += connection.execute(
+                "DELETE FROM cache_entries WHERE rowid IN ("
+                "SELECT rowid FROM cache_entries ORDER BY expires_at LIMIT ?)",
+                (entries - self._max_entries,),
+            ).rowcount
+
+        self._swept += removed
+        return removed
+
+    def stats(self) -> dict:
+        lookups = self._hits + self._misses
+        return {
+            "path": self._path,
+            "max_entries": self._max_entries,
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_ratio": round(self._hits / lookups, 4) if lookups else 0.0,
+            "writes": self._writes,
+            "errors": self._errors,
+            "swept": self._swept,
+        }
+
+
+_shared_cache: Optional[SharedCache] = None
+_sweep_task: Optional[asyncio.Task] = None
+
+
+def get_shared_cache() -> Optional[SharedCache]:
+    """The host-wide cache tier, or None when disabled."""
+    return _shared_cache
+
+
+async def _sweep_shared_cache(interval_seconds: float) -> None:
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            await run_blocking(_shared_cache.sweep)
+        except Exception as e:
+            print(f"[SharedCache] Sweep failed: {type(e).__name__}: {str(e)}")
+
+
+def start_shared_cache() -> Optional[SharedCache]:
+    """Open the shared cache file and start sweeping it if enabled (app lifespan)."""
+    global _shared_cache, _sweep_task
+    settings = get_settings()
+
+    if not settings.shared_cache_enabled or _shared_cache is not None:
+        return _shared_cache
+
+    _shared_cache = SharedCache(settings.shared_cache_path, max_entries=settings.shared_cache_max_entries)
+    _sweep_task = asyncio.create_task(_sweep_shared_cache(settings.shared_cache_sweep_seconds))
+    print(f"[SharedCache] Using {settings.shared_cache_path}")
+    return _shared_cache
+
+
+async def stop_shared_cache() -> None:
+    global _shared_cache, _sweep_task
+    if _sweep_task is not None:
+        _sweep_task.cancel()
+        try:
+            await _sweep_task
+        except asyncio.CancelledError:
+            pass
+        _sweep_task = None
+    if _shared_cache is not None:
+        _shared_cache.close()
+        _shared_cache = None
@@ -0,0 +1,304 @@
+"""
+Embedded SQLite storage backend.
+
+One database file in WAL mode: readers never block the writer, so
+/analytics queries run alongside /track inserts. Timestamps are stored
+as integer epoch microseconds, which makes bucketing plain integer
+division. An aggregation is a single statement: the profile join, the
+age/gender filters and the GROUP BY all run inside SQLite, with the
+(timestamp) index narrowing the scan to the requested window.
+
+Each worker thread gets its own connection (sqlite3 connections are not
+shared across threads).
+"""
+
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Iterator, Optional, Union
+
+from config import get_settings
+from services.analytics import get_age_range
+from services.analytics_cache import bump_analytics_generation
+from services.blocking import run_blocking
+from services.buckets import SECONDS_PER_DAY
+from services.metrics import record_db_call, span
+from services.storage import ClickGroup, StorageBackend
+from services.user_dimensions import age_group_of
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS profiles (
+    id TEXT PRIMARY KEY,
+    username TEXT NOT NULL,
+    age INTEGER NOT NULL,
+    gender TEXT NOT NULL,
+    created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+);
+
+CREATE TABLE IF NOT EXISTS feature_clicks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    feature_name TEXT NOT NULL,
+    ts INTEGER NOT NULL  -- epoch microseconds, UTC
+);
+
+CREATE INDEX IF NOT EXISTS idx_feature_clicks_ts ON feature_clicks (ts, id);
+CREATE INDEX IF NOT EXISTS idx_feature_clicks_user ON feature_clicks (user_id);
+"""
+
+
+def _to_us(value: Union[str, datetime]) -> int:
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    delta = value - _EPOCH
+    return (delta.days * SECONDS_PER_DAY + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+def _from_us(us: int) -> str:
+    return (_EPOCH + timedelta(microseconds=us)).isoformat()
+
+
+class SQLiteStorage(StorageBackend):
+    """Clicks and profiles in a local SQLite database."""
+
+    name = "sqlite"
+
+    def __init__(self, path: str):
+        self._path = path
+        self._local = threading.local()
+        self._connections: list[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+        connection = self._connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript(_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self._path, timeout=5, check_same_thread=False)
+            connection.row_factory = sqlite3.Row
+            # WAL makes NORMAL durable against application crashes
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def close(self) -> None:
+        with self._lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+    def insert_clicks(self, click_rows: list[dict]) -> list[dict]:
+        connection = self._connection()
+        now = _to_us(datetime.now(timezone.utc))
+        inserted = []
+
+        with connection:
+            for row in click_rows:
+                ts = _to_us(row["timestamp"]) if row.get("timestamp") else now
+                cursor = connection.execute(
+                    "INSERT INTO feature_clicks (user_id, feature_name, ts) VALUES (?, ?, ?)",
+                    (row["user_id"], row["feature_name"], ts),
+                )
+                inserted.append({
+                    "id": cursor.lastrowid,
+                    "user_id": row["user_id"],
+                    "feature_name": row["feature_name"],
+                    "timestamp": _from_us(ts),
+                })
+
+        record_db_call("sqlite", "insert")
+        # Cached analytics no longer reflect the stored events
+        bump_analytics_generation()
+        return inserted
+
+    def _filters(
+        self,
+        start_date: Optional[datetime],
+        end_date: Optional[datetime],
+        age_group: Optional[str],
+        gender: Optional[str],
+        feature_name: Optional[str] = None,
+        max_id: Optional[int] = None,
+    ) -> tuple[str, list]:
+        """WHERE clause over feature_clicks c JOIN profiles p, and its parameters."""
+        clauses, params = [], []
+
+        if max_id is not None:
+            clauses.append("c.id <= ?")
+            params.append(max_id)
+
+        if start_date:
+            clauses.append("c.ts >= ?")
+            params.append(_to_us(start_date))
+        if end_date:
+            clauses.append("c.ts <= ?")
+            params.append(_to_us(end_date))
+        if feature_name:
+            clauses.append("c.feature_name = ?")
+            params.append(feature_name)
+        if age_group:
+            min_age, max_age = get_age_range(age_group)
+            clauses.append("p.age BETWEEN ? AND ?")
+            params.extend((min_age, max_age))
+        if gender:
+            clauses.append("p.gender = ?")
+            params.append(gender)
+
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def grouped_counts(
+        self,
+        start_date: Optional[datetime],
+        end_date: Optional[datetime],
+        age_group: Optional[str],
+        gender: Optional[str],
+        base_seconds: int = SECONDS_PER_DAY,
+        base_offset_seconds: int = 0,
+        max_id: Optional[int] = None,
+    ) -> list[ClickGroup]:
+        where, params = self._filters(start_date, end_date, age_group, gender, max_id=max_id)
+        bucket_us = base_seconds * 1_000_000
+        offset_us = base_offset_seconds * 1_000_000
+        with span("analytics.sqlite"):
+            # Integer division truncates toward zero; subtracting the
+            # non-negative remainder first floors pre-1970 timestamps too
+            rows = self._connection().execute(
+                f"""
+                SELECT feature_name, (shifted - (shifted % ? + ?) % ?) / ? * ? - ? AS bucket, COUNT(*)
+                FROM (
+                    SELECT c.feature_name, c.ts + ? AS shifted
+                    FROM feature_clicks c
+                    JOIN profiles p ON p.id = c.user_id
+                    {where}
+                )
+                GROUP BY 1, 2
+                """,
+                [bucket_us, bucket_us, bucket_us, bucket_us, base_seconds, base_offset_seconds, offset_us, *params],
+            ).fetchall()
+
+        record_db_call("sqlite", "aggregate", len(rows))
+        return [(feature, bucket, count) for feature, bucket, count in rows]
+
+    async def aggregate_clicks(
+        self, start_date, end_date, age_group, gender, base_seconds=SECONDS_PER_DAY, base_offset_seconds=0
+    ):
+        return await run_blocking(
+            self.grouped_counts, start_date, end_date, age_group, gender, base_seconds, base_offset_seconds
+        )
+
+    def grouped_counts_snapshot(
+        self, start_date, end_date, age_group, gender, base_seconds=SECONDS_PER_DAY, base_offset_seconds=0
+    ) -> tuple[list[ClickGroup], int]:
+        # One writer assigns ids in commit order, so everything up to the
+        # newest id is already visible
+        high_id = self.latest_click_id()
+        return self.grouped_counts(
+            start_date, end_date, age_group, gender, base_seconds, base_offset_seconds, high_id
+        ), high_id
+
+    async def aggregate_clicks_snapshot(
+        self, start_date, end_date, age_group, gender, base_seconds=SECONDS_PER_DAY, base_offset_seconds=0
+    ):
+        return await run_blocking(
+            self.grouped_counts_snapshot, start_date, end_date, age_group, gender, base_seconds, base_offset_seconds
+        )
+
+    def export_pages(self, start_date, end_date, age_group, gender, feature_name) -> Iterator[list[dict]]:
+        where, params = self._filters(start_date, end_date, age_group, gender, feature_name)
+        page_size = get_settings().postgrest_max_rows
+
+        # The response iterates this generator from whichever threadpool
+        # thread is free, so it gets a connection of its own
+        connection = sqlite3.connect(self._path, timeout=5, check_same_thread=False)
+        try:
+            cursor = connection.execute(
+                f"""
+                SELECT c.id, c.user_id, c.feature_name, c.ts, p.age, p.gender
+                FROM feature_clicks c
+                JOIN profiles p ON p.id = c.user_id
+                {where}
+                ORDER BY c.ts, c.id
+                """,
+                params,
+            )
+            yield from self._pages(cursor, page_size)
+        finally:
+            connection.close()
+
+    def latest_click_id(self) -> int:
+        return self._connection().execute("SELECT COALESCE(MAX(id), 0) FROM feature_clicks").fetchone()[0]
+
+    def clicks_after(self, after_id: int, limit: int) -> list[dict]:
+        rows = self._connection().execute(
+            """
+            SELECT c.id, c.user_id, c.feature_name, c.ts, p.age, p.gender
+            FROM feature_clicks c
+            LEFT JOIN profiles p ON p.id = c.user_id
+            WHERE c.id > ?
+            ORDER BY c.id
+            LIMIT ?
+            """,
+            (after_id, limit),
+        ).fetchall()
+        record_db_call("sqlite", "clicks_after", len(rows))
+
+        return [
+            {
+                "id": click_id,
+                "user_id": user_id,
+                "feature_name": feature,
+                "timestamp": _from_us(ts),
+                "age_group": age_group_of(age) if age is not None else None,
+                "gender": user_gender,
+            }
+            for click_id, user_id, feature, ts, age, user_gender in rows
+        ]
+
+    @staticmethod
+    def _pages(cursor: sqlite3.Cursor, page_size: int) -> Iterator[list[dict]]:
+        while True:
+            rows = cursor.fetchmany(page_size)
+            if not rows:
+                return
+
+            record_db_call("sqlite", "export", len(rows))
+            page = []
+            for click_id, user_id, feature, ts, age, user_gender in rows:
+                page.append({
+                    "id": click_id,
+                    "user_id": user_id,
+                    "feature_name": feature,
+                    "timestamp": _from_us(ts),
+                    "age_group": age_group_of(age),
+                    "gender": user_gender,
+                })
+            yield page
+
+    def get_profile(self, user_id: str) -> Optional[dict]:
+        row = self._connection().execute(
+            "SELECT id, username, age, gender, created_at FROM profiles WHERE id = ?", (user_id,)
+        ).fetchone()
+        record_db_call("sqlite", "profile", 1 if row else 0)
+        return dict(row) if row else None
+
+    def upsert_profile(self, profile: dict) -> Optional[dict]:
+        connection = self._connection()
+        with connection:
+            connection.execute(
+                """
+                INSERT INTO profiles (id, username, age, gender) VALUES (:id, :username, :age, :gender)
+                ON CONFLICT (id) DO UPDATE SET
+                    username = excluded.username, age = excluded.age, gender = excluded.gender
+                """,
+                profile,
+            )
+        return self.get_profile(profile["id"])
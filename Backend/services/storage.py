@@ -0,0 +1,187 @@
+"""
+Storage backends for clicks and profiles.
+
+Routes read and write through `get_storage()` instead of calling
+supabase.table(...) directly, so the same API can run against Supabase
+(the default) or an embedded SQLite database (single-node deployments,
+load testing). Select with the `storage_backend` setting.
+
+Authentication always goes through Supabase Auth; only the data lives in
+the selected backend. The user dimension cache, columnar hot store and
+daily rollup are Supabase-side accelerators and are not used with SQLite,
+which answers every aggregation with one local SQL statement.
+"""
+
+from datetime import datetime
+from typing import Iterator, Optional
+
+from config import get_settings, get_supabase_admin_client
+from services.analytics import ClickGroup, aggregate_clicks, aggregate_clicks_snapshot
+from services.buckets import SECONDS_PER_DAY
+from services.click_scan import latest_click_id
+from services.clicks import insert_clicks
+from services.export import iter_export_pages
+from services.user_dimensions import get_user_dimensions
+
+
+class StorageBackend:
+    """Operations the API needs from the database."""
+
+    name = "base"
+
+    def insert_clicks(self, click_rows: list[dict]) -> list[dict]:
+        """Store click rows ({user_id, feature_name, timestamp?}); returns the stored rows."""
+        raise NotImplementedError
+
+    async def aggregate_clicks(
+        self,
+        start_date: Optional[datetime],
+        end_date: Optional[datetime],
+        age_group: Optional[str],
+        gender: Optional[str],
+        base_seconds: int = SECONDS_PER_DAY,
+        base_offset_seconds: int = 0,
+    ) -> list[ClickGroup]:
+        """
+        Click counts per (feature, base bucket) for users matching the
+        filters; buckets start at multiples of base_seconds minus
+        base_offset_seconds (services.buckets.base_bucket).
+        """
+        raise NotImplementedError
+
+    async def aggregate_clicks_snapshot(
+        self,
+        start_date: Optional[datetime],
+        end_date: Optional[datetime],
+        age_group: Optional[str],
+        gender: Optional[str],
+        base_seconds: int = SECONDS_PER_DAY,
+        base_offset_seconds: int = 0,
+    ) -> tuple[list[ClickGroup], Optional[int]]:
+        """
+        aggregate_clicks, plus the highest click id the counts cover: no
+        click with a higher id is counted. None if the counts cannot be
+        cut off at an id.
+        """
+        raise NotImplementedError
+
+    def export_pages(
+        self,
+        start_date: Optional[datetime],
+        end_date: Optional[datetime],
+        age_group: Optional[str],
+        gender: Optional[str],
+        feature_name: Optional[str],
+    ) -> Iterator[list[dict]]:
+        """Pages of matching clicks with the user's age_group and gender, in time order."""
+        raise NotImplementedError
+
+    def latest_click_id(self) -> int:
+        """Highest click id stored (0 if none)."""
+        raise NotImplementedError
+
+    def clicks_after(self, after_id: int, limit: int) -> list[dict]:
+        """
+        Up to `limit` clicks with ids above after_id, in id order, with the
+        user's age_group and gender (None for users without a profile).
+        """
+        raise NotImplementedError
+
+    def get_profile(self, user_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def upsert_profile(self, profile: dict) -> Optional[dict]:
+        """Create or replace a profile ({id, username, age, gender}); returns it."""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class SupabaseStorage(StorageBackend):
+    """PostgREST tables and functions, through the shared admin client."""
+
+    name = "supabase"
+
+    def insert_clicks(self, click_rows: list[dict]) -> list[dict]:
+        return insert_clicks(click_rows)
+
+    async def aggregate_clicks(
+        self, start_date, end_date, age_group, gender, base_seconds=SECONDS_PER_DAY, base_offset_seconds=0
+    ):
+        return await aggregate_clicks(
+            get_supabase_admin_client(), start_date, end_date, age_group, gender, base_seconds, base_offset_seconds
+        )
+
+    async def aggregate_clicks_snapshot(
+        self, start_date, end_date, age_group, gender, base_seconds=SECONDS_PER_DAY, base_offset_seconds=0
+    ):
+        return await aggregate_clicks_snapshot(
+            get_supabase_admin_client(), start_date, end_date, age_group, gender, base_seconds, base_offset_seconds
+        )
+
+    def export_pages(self, start_date, end_date, age_group, gender, feature_name):
+        return iter_export_pages(
+            get_supabase_admin_client(), start_date, end_date, age_group, gender, feature_name
+        )
+
+    def latest_click_id(self) -> int:
+        return latest_click_id(get_supabase_admin_client())
+
+    def clicks_after(self, after_id: int, limit: int) -> list[dict]:
+        supabase = get_supabase_admin_client()
+        rows = supabase.table("feature_clicks") \
+            .select("id,user_id,feature_name,timestamp") \
+            .gt("id", after_id).order("id").limit(limit).execute().data or []
+
+        dims = get_user_dimensions()
+        if not dims.loaded:
+            dims.load(supabase)
+        unknown = {row["user_id"] for row in rows if row["user_id"] not in dims}
+        if unknown:
+            dims.resolve(supabase, unknown)
+
+        for row in rows:
+            row["age_group"], row["gender"] = dims.get(row["user_id"]) or (None, None)
+        return rows
+
+    def get_profile(self, user_id: str) -> Optional[dict]:
+        rows = get_supabase_admin_client().table("profiles").select("*") \
+            .eq("id", user_id).limit(1).execute().data
+        return rows[0] if rows else None
+
+    def upsert_profile(self, profile: dict) -> Optional[dict]:
+        rows = get_supabase_admin_client().table("profiles") \
+            .upsert(profile, on_conflict="id").execute().data
+        return rows[0] if rows else None
+
+
+_storage: Optional[StorageBackend] = None
+
+
+def get_storage() -> StorageBackend:
+    """Global storage backend (created from settings on first use)."""
+    return _storage or start_storage()
+
+
+def start_storage() -> StorageBackend:
+    """Create the configured backend (called from the app lifespan)."""
+    global _storage
+    if _storage is None:
+        settings = get_settings()
+
+        if settings.storage_backend == "sqlite":
+            from services.sqlite_storage import SQLiteStorage
+            _storage = SQLiteStorage(settings.sqlite_path)
+        else:
+            _storage = SupabaseStorage()
+
+        print(f"[Storage] Using {_storage.name} backend")
+    return _storage
+
+
+def stop_storage() -> None:
+    global _storage
+    if _storage is not None:
+        _storage.close()
+        _storage = None
@@ -0,0 +1,286 @@
+"""
+Approximate distinct users per feature and per day.
+
+Counting distinct users exactly means holding every user id of every
+group in the scanned window. Instead each (UTC day, feature, age group,
+gender) cell keeps a HyperLogLog sketch of its user ids (see
+services/hyperloglog.py): a fixed 2^precision bytes per cell and a
+bounded relative error, however many users there are. A query merges the
+cells its filters select: per feature for feature_counts, per series
+bucket for daily_counts (daily active users, or users of one feature).
+
+Sketches answer in whole UTC days, so the series must use day, week or
+month buckets at UTC, and a window's first and last days count every
+user active on those days. Users without a profile are left out, like
+the click counts.
+
+The cells are backfilled from the storage backend at startup and then
+follow new click ids, so events written by any worker (or with past
+timestamps) are picked up. Re-reading an event is harmless: adding a
+user to a sketch twice changes nothing.
+"""
+
+import asyncio
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+import numpy as np
+
+from config import get_settings
+from services.blocking import run_blocking
+from services.buckets import SECONDS_PER_DAY, BucketSpec, epoch_seconds
+from services.hyperloglog import HyperLogLog, estimate_registers, register_position, standard_error
+from services.user_dimensions import AGE_GROUPS
+
+# (day start in epoch seconds, feature_name, age group, gender)
+Cell = tuple[int, str, str, str]
+
+# ({feature_name: distinct users}, {series bucket start: distinct users})
+UniqueUserCounts = tuple[dict[str, int], dict[int, int]]
+
+
+class UniqueUserSketches:
+    """One HyperLogLog sketch of user ids per (day, feature, age group, gender) cell."""
+
+    def __init__(self, precision: int = 12, window_days: int = 0):
+        self._precision = precision
+        # 0 keeps every day
+        self._window_seconds = window_days * SECONDS_PER_DAY
+        self._cells: dict[Cell, HyperLogLog] = {}
+        self._lock = threading.Lock()
+
+        self._ready = False
+        # Days before this one were evicted (None: nothing evicted)
+        self._covered_from: Optional[int] = None
+        self._high_id = 0
+
+        # Counters
+        self._added = 0
+        self._evicted_cells = 0
+
+    @property
+    def ready(self) -> bool:
+        return self._ready
+
+    def _cutoff_day(self) -> Optional[int]:
+        if not self._window_seconds:
+            return None
+        now = epoch_seconds(datetime.now(timezone.utc))
+        return (now - self._window_seconds) // SECONDS_PER_DAY * SECONDS_PER_DAY
+
+    def _add_rows(self, rows: list[dict], cutoff_day: Optional[int]) -> int:
+        added = 0
+
+        for row in rows:
+            if row["age_group"] is None:
+                continue
+
+            day = epoch_seconds(row["timestamp"]) // SECONDS_PER_DAY * SECONDS_PER_DAY
+            if cutoff_day is not None and day < cutoff_day:
+                continue
+
+            key = (day, row["feature_name"], row["age_group"], row["gender"])
+            sketch = self._cells.get(key)
+            if sketch is None:
+                with self._lock:
+                    sketch = self._cells.setdefault(key, HyperLogLog(self._precision))
+
+            # Registers only grow, so concurrent readers see a valid sketch
+            sketch.add_position(*register_position(row["user_id"], self._precision))
+            added += 1
+
+        self._added += added
+        return added
+
+    def load(self, storage) -> int:
+        """Build every cell from stored clicks; returns clicks added."""
+        self._ready = False
+        cutoff_day = self._cutoff_day()
+
+        # Later syncs start from the newest id, not from the start of the table
+        high_id = storage.latest_click_id()
+        with self._lock:
+            self._cells = {}
+
+        start = datetime.fromtimestamp(cutoff_day, timezone.utc) if cutoff_day is not None else None
+        loaded = 0
+        for page in storage.export_pages(start, None, None, None, None):
+            loaded += self._add_rows(page, cutoff_day)
+
+        # Clicks written while the backfill ran are picked up by id
+        self._high_id = high_id
+        self.sync(storage)
+        self._covered_from = cutoff_day
+        self._ready = True
+        return loaded
+
+    def sync(self, storage) -> int:
+        """Add clicks written (by any worker) since the last read."""
+        page_size = get_settings().postgrest_max_rows
+        added = 0
+
+        while True:
+            rows = storage.clicks_after(self._high_id, page_size)
+            # Stop on an empty page only: with a server max-rows below
+            # page_size every page looks short
+            if not rows:
+                return added
+
+            added += self._add_rows(rows, self._cutoff_day())
+            self._high_id = rows[-1]["id"]
+
+    def evict(self) -> int:
+        """Drop cells for days that left the window."""
+        cutoff_day = self._cutoff_day()
+        if cutoff_day is None:
+            return 0
+
+        with self._lock:
+            expired = [key for key in self._cells if key[0] < cutoff_day]
+            for key in expired:
+                del self._cells[key]
+        self._evicted_cells += len(expired)
+
+        if self._covered_from is not None:
+            self._covered_from = max(self._covered_from, cutoff_day)
+        return len(expired)
+
+    def query(
+        self,
+        start_date: Optional[datetime],
+        end_date: Optional[datetime],
+        age_group: Optional[str],
+        gender: Optional[str],
+        feature_name: Optional[str],
+        buckets: BucketSpec,
+    ) -> Optional[UniqueUserCounts]:
+        """
+        Distinct users per feature and per series bucket for the days the
+        window touches, or None if the sketches cannot answer (not loaded
+        yet, sub-day or non-UTC buckets, or days that were evicted).
+        """
+        if not self._ready or buckets.base_seconds != SECONDS_PER_DAY or buckets.base_offset_seconds:
+            return None
+
+        first_day = epoch_seconds(start_date) // SECONDS_PER_DAY * SECONDS_PER_DAY if start_date else None
+        last_day = epoch_seconds(end_date) // SECONDS_PER_DAY * SECONDS_PER_DAY if end_date else None
+        if self._covered_from is not None and (first_day is None or first_day < self._covered_from):
+            return None
+
+        # Unknown age groups span every age, as in get_age_range()
+        age_filter = age_group if age_group in AGE_GROUPS else None
+
+        with self._lock:
+            cells = [
+                (day, feature, sketch)
+                for (day, feature, cell_age_group, cell_gender), sketch in self._cells.items()
+                if (first_day is None or day >= first_day)
+                and (last_day is None or day <= last_day)
+                and (age_filter is None or cell_age_group == age_filter)
+                and (not gender or cell_gender == gender)
+            ]
+
+        per_feature: dict[str, np.ndarray] = {}
+        per_bucket: dict[int, np.ndarray] = {}
+
+        for day, feature, sketch in cells:
+            registers = sketch.view()
+            _merge_into(per_feature, feature, registers)
+
+            # If feature_name specified, the series covers that feature only
+            if feature_name and feature != feature_name:
+                continue
+            _merge_into(per_bucket, buckets.start_of(day), registers)
+
+        return (
+            {feature: round(estimate_registers(registers, self._precision)) for feature, registers in per_feature.items()},
+            {start: round(estimate_registers(registers, self._precision)) for start, registers in per_bucket.items()},
+        )
+
+    def stats(self) -> dict:
+        with self._lock:
+            cells = len(self._cells)
+
+        covered_from = None
+        if self._covered_from is not None:
+            covered_from = datetime.fromtimestamp(self._covered_from, timezone.utc).date().isoformat()
+
+        return {
+            "ready": self._ready,
+            "cells": cells,
+            "bytes": cells << self._precision,
+            "precision": self._precision,
+            "standard_error": round(standard_error(self._precision), 4),
+            "covered_from": covered_from,
+            "high_id": self._high_id,
+            "added": self._added,
+            "evicted_cells": self._evicted_cells,
+        }
+
+
+def _merge_into(merged: dict, key, registers: np.ndarray) -> None:
+    current = merged.get(key)
+    if current is None:
+        merged[key] = registers.copy()
+    else:
+        np.maximum(current, registers, out=current)
+
+
+_unique_users: Optional[UniqueUserSketches] = None
+_sync_task: Optional[asyncio.Task] = None
+
+
+def get_unique_users() -> Optional[UniqueUserSketches]:
+    """The running sketch store, or None when disabled."""
+    return _unique_users
+
+
+async def _sync_unique_users(storage, interval_seconds: float) -> None:
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            if not _unique_users.ready:
+                await run_blocking(_unique_users.load, storage)
+            else:
+                await run_blocking(_unique_users.sync, storage)
+                _unique_users.evict()
+        except Exception as e:
+            print(f"[UniqueUsers] Sync failed: {type(e).__name__}: {str(e)}")
+
+
+async def start_unique_users(storage) -> None:
+    """Create, backfill and start syncing the sketches if enabled (app lifespan)."""
+    global _unique_users, _sync_task
+    settings = get_settings()
+
+    if not settings.unique_users_enabled or _unique_users is not None:
+        return
+
+    _unique_users = UniqueUserSketches(
+        precision=settings.unique_users_precision,
+        window_days=settings.unique_users_window_days,
+    )
+
+    started = time.perf_counter()
+    try:
+        clicks = await run_blocking(_unique_users.load, storage)
+        print(f"[UniqueUsers] Sketched {clicks} clicks in {time.perf_counter() - started:.1f}s")
+    except Exception as e:
+        # unique_users stays null until a later sync loads the sketches
+        print(f"[UniqueUsers] Initial load failed: {type(e).__name__}: {str(e)}")
+
+    _sync_task = asyncio.create_task(_sync_unique_users(storage, settings.unique_users_sync_seconds))
+
+
+async def stop_unique_users() -> None:
+    global _unique_users, _sync_task
+    if _sync_task is not None:
+        _sync_task.cancel()
+        try:
+            await _sync_task
+        except asyncio.CancelledError:
+            pass
+        _sync_task = None
+    _unique_users = None
@@ -0,0 +1,240 @@
+"""
+In-memory user dimensions: user_id -> (age group, gender).
+
+Filtering clicks by demographics used to mean querying `profiles` for the
+matching ids on every request and sending all of them back to PostgREST in
+an `in.(...)` filter, which grows the URL with the user base. Instead the
+profiles are loaded once at startup and clicks are matched in memory.
+
+The cache stays fresh three ways: `register` writes new profiles through,
+a periodic delta pulls profiles created since the last load (other
+workers' registrations), and a slower full reload picks up edited ages
+and genders. Users first seen in a scan are looked up in small batches.
+"""
+
+import asyncio
+import threading
+import time
+from typing import Iterable, Optional
+
+from config import get_settings
+from services.blocking import run_blocking
+
+# (age_group, gender); None marks a user known to have no profile
+UserDimension = tuple[str, str]
+
+AGE_GROUPS = ("<18", "18-40", ">40")
+
+# Ids per lookup when resolving users missing from the cache
+_RESOLVE_CHUNK = 100
+
+
+def age_group_of(age: int) -> str:
+    """Age group for an age; matches age_group_of() in setup.sql."""
+    if age <= 17:
+        return "<18"
+    if age <= 40:
+        return "18-40"
+    return ">40"
+
+
+class UserDimensionCache:
+    """Profile dimensions keyed by user id."""
+
+    def __init__(self, page_size: Optional[int] = None):
+        self._page_size = page_size
+        self._dims: dict[str, Optional[UserDimension]] = {}
+        self._watermark: Optional[str] = None  # latest created_at loaded
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.Lock()
+        # Upserts made while a load runs, replayed onto what it loaded;
+        # the short lock never waits on a load's queries
+        self._upserts_lock = threading.Lock()
+        self._load_upserts: Optional[dict[str, UserDimension]] = None
+
+        # Counters
+        self._full_loads = 0
+        self._delta_loads = 0
+        self._resolved = 0
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded_at is not None
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._dims
+
+    def __len__(self) -> int:
+        return len(self._dims)
+
+    def get(self, user_id: str) -> Optional[UserDimension]:
+        """Dimensions for a cached user, or None if they have no profile."""
+        return self._dims.get(user_id)
+
+    def upsert(self, user_id: str, age: int, gender: str) -> None:
+        """Write through a created or updated profile."""
+        dimension = (age_group_of(age), gender)
+        with self._upserts_lock:
+            self._dims[user_id] = dimension
+            if self._load_upserts is not None:
+                self._load_upserts[user_id] = dimension
+
+    def _store_rows(self, target: dict, rows: list[dict]) -> None:
+        for row in rows:
+            target[row["id"]] = (age_group_of(row["age"]), row["gender"])
+
+            created_at = row.get("created_at")
+            if created_at and (self._watermark is None or created_at > self._watermark):
+                self._watermark = created_at
+
+    def load(self, supabase) -> int:
+        """Replace the cache with every profile, paged by id."""
+        page_size = self._page_size or get_settings().postgrest_max_rows
+
+        with self._lock:
+            dims: dict[str, Optional[UserDimension]] = {}
+            self._watermark = None
+            last_id: Optional[str] = None
+
+            with self._upserts_lock:
+                self._load_upserts = {}
+
+            try:
+                while True:
+                    query = supabase.table("profiles").select("id,age,gender,created_at")
+                    if last_id is not None:
+                        query = query.gt("id", last_id)
+
+                    rows = query.order("id").limit(page_size).execute().data or []
+                    if not rows:
+                        break
+
+                    self._store_rows(dims, rows)
+                    last_id = rows[-1]["id"]
+
+                with self._upserts_lock:
+                    # The pages may predate these writes
+                    dims.update(self._load_upserts)
+                    self._dims = dims
+            finally:
+                with self._upserts_lock:
+                    self._load_upserts = None
+            self._loaded_at = time.monotonic()
+            self._full_loads += 1
+            return len(dims)
+
+    def refresh(self, supabase) -> int:
+        """Pull profiles created since the last load; returns rows read."""
+        if not self.loaded or self._watermark is None:
+            return self.load(supabase)
+
+        page_size = self._page_size or get_settings().postgrest_max_rows
+
+        with self._lock:
+            # Re-reading rows at the watermark itself is harmless
+            since = self._watermark
+            last: Optional[dict] = None
+            count = 0
+
+            while True:
+                query = supabase.table("profiles").select("id,age,gender,created_at") \
+                    .gte("created_at", since)
+                if last is not None:
+                    ts = last["created_at"]
+                    query = query.or_(f'created_at.gt."{ts}",and(created_at.eq."{ts}",id.gt.{last["id"]})')
+
+                rows = query.order("created_at").order("id").limit(page_size).execute().data or []
+                if not rows:
+                    break
+
+                self._store_rows(self._dims, rows)
+                count += len(rows)
+                last = rows[-1]
+
+            self._delta_loads += 1
+            return count
+
+    def resolve(self, supabase, user_ids: Iterable[str]) -> None:
+        """Look up users missing from the cache, a bounded batch at a time."""
+        missing = [user_id for user_id in set(user_ids) if user_id not in self._dims]
+
+        for i in range(0, len(missing), _RESOLVE_CHUNK):
+            chunk = missing[i:i + _RESOLVE_CHUNK]
+            rows = supabase.table("profiles").select("id,age,gender") \
+                .in_("id", chunk).execute().data or []
+
+            found = {row["id"]: row for row in rows}
+            for user_id in chunk:
+                row = found.get(user_id)
+                self._dims[user_id] = (age_group_of(row["age"]), row["gender"]) if row else None
+
+            self._resolved += len(chunk)
+
+    def seconds_since_load(self) -> float:
+        if self._loaded_at is None:
+            return float("inf")
+        return time.monotonic() - self._loaded_at
+
+    def stats(self) -> dict:
+        return {
+            "users": len(self._dims),
+            "loaded": self.loaded,
+            "watermark": self._watermark,
+            "full_loads": self._full_loads,
+            "delta_loads": self._delta_loads,
+            "resolved": self._resolved,
+        }
+
+
+_user_dimensions = UserDimensionCache()
+_refresh_task: Optional[asyncio.Task] = None
+
+
+def get_user_dimensions() -> UserDimensionCache:
+    """Global user dimension cache."""
+    return _user_dimensions
+
+
+async def _refresh_user_dimensions(supabase, interval_seconds: float, full_reload_seconds: float) -> None:
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            if _user_dimensions.seconds_since_load() >= full_reload_seconds:
+                await run_blocking(_user_dimensions.load, supabase)
+            else:
+                await run_blocking(_user_dimensions.refresh, supabase)
+        except Exception as e:
+            print(f"[UserDimensions] Refresh failed: {type(e).__name__}: {str(e)}")
+
+
+async def start_user_dimensions(supabase) -> None:
+    """Load the cache and start the periodic refresh (called from the app lifespan)."""
+    global _refresh_task
+    settings = get_settings()
+
+    if _refresh_task is not None:
+        return
+
+    try:
+        users = await run_blocking(_user_dimensions.load, supabase)
+        print(f"[UserDimensions] Loaded {users} profiles")
+    except Exception as e:
+        # Analytics loads it on first use instead
+        print(f"[UserDimensions] Initial load failed: {type(e).__name__}: {str(e)}")
+
+    _refresh_task = asyncio.create_task(_refresh_user_dimensions(
+        supabase,
+        settings.user_dims_refresh_seconds,
+        settings.user_dims_full_reload_seconds,
+    ))
+
+
+async def stop_user_dimensions() -> None:
+    global _refresh_task
+    if _refresh_task is not None:
+        _refresh_task.cancel()
+        try:
+            await _refresh_task
+        except asyncio.CancelledError:
+            pass
+        _refresh_task = None
@@ -0,0 +1,246 @@
+"""
+Write-behind buffer for click events.
+
+/track puts events on a bounded asyncio queue and returns immediately.
+A background flusher drains the queue into multi-row inserts whenever
+`batch_size` events are waiting or `flush_interval_ms` has passed since
+the first event of the batch, whichever comes first.
+
+/track has already acknowledged the queued events, so a failed insert is
+retried with exponential backoff (`max_retries` times, starting at
+`retry_base_ms`) before the batch is dropped. While a batch is being
+retried it counts against the queue's capacity, so /track sees
+BufferFullError instead of the buffer holding more than `max_size`
+events. An insert that failed after committing (e.g. a timeout) is
+stored twice by its retry.
+"""
+
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+from config import get_settings
+from services.blocking import run_blocking
+from services.storage import get_storage
+
+
+class BufferFullError(Exception):
+    """Raised when the queue stays full for longer than the enqueue timeout."""
+
+
+class ClickWriteBuffer:
+    """Bounded queue plus a single flusher task that batches inserts."""
+
+    def __init__(
+        self,
+        insert_rows: Callable[[list[dict]], list[dict]],
+        max_size: int = 10000,
+        batch_size: int = 500,
+        flush_interval_ms: int = 200,
+        enqueue_timeout_ms: int = 50,
+        max_retries: int = 5,
+        retry_base_ms: int = 200,
+    ):
+        self._insert_rows = insert_rows
+        self._queue: asyncio.Queue[dict] = asyncio.Queue(maxsize=max_size)
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval_ms / 1000
+        self._enqueue_timeout = enqueue_timeout_ms / 1000
+        self._max_retries = max_retries
+        self._retry_base = retry_base_ms / 1000
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        # Events of the batch being retried, held outside the queue
+        self._retrying = 0
+
+        # Counters
+        self._enqueued = 0
+        self._rejected = 0
+        self._flushes = 0
+        self._flushed_events = 0
+        self._retries = 0
+        self._failed_flushes = 0
+        self._dropped_events = 0
+        self._last_flush_ms = 0.0
+        self._max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+    async def start(self) -> None:
+        """Start the background flusher."""
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop accepting events and flush everything still queued."""
+        self._stopping = True
+        if self._task is not None:
+            await self._task
+            self._task = None
+
+    async def put(self, click_data: dict) -> None:
+        """Queue one click row, waiting briefly for space if the queue is full."""
+        await self.put_many([click_data])
+
+    async def put_many(self, click_rows: list[dict]) -> None:
+        """
+        Queue several click rows.
+        Raises BufferFullError if space does not free up within the timeout.
+        """
+        if self._stopping:
+            raise BufferFullError("Write buffer is shutting down")
+
+        # Stamp the event time now; the NOW() column default would
+        # otherwise record the flush time instead
+        now = datetime.now(timezone.utc).isoformat()
+
+        rows = [{"timestamp": now, **click_data} for click_data in click_rows]
+
+        # Enqueue all-or-nothing so a rejected batch can be retried
+        # without duplicating the events that did fit
+        if self._free_slots() < len(rows):
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + self._enqueue_timeout
+
+            while self._free_slots() < len(rows):
+                if loop.time() >= deadline or len(rows) > self._queue.maxsize:
+                    self._rejected += len(rows)
+                    raise BufferFullError("Write buffer is full")
+                await asyncio.sleep(0.005)
+
+        for row in rows:
+            self._queue.put_nowait(row)
+        self._enqueued += len(rows)
+
+    def _free_slots(self) -> int:
+        return self._queue.maxsize - self._queue.qsize() - self._retrying
+
+    async def _run(self) -> None:
+        while not (self._stopping and self._queue.empty()):
+            batch = await self._collect()
+            if batch:
+                await self._flush(batch)
+
+    async def _collect(self) -> list[dict]:
+        """Wait for the first event, then gather until size or time limit."""
+        try:
+            first = await asyncio.wait_for(self._queue.get(), self._flush_interval)
+        except asyncio.TimeoutError:
+            return []
+
+        batch = [first]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self._flush_interval
+
+        while len(batch) < self._batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+
+            # On shutdown, flush what we have instead of waiting for more
+            remaining = deadline - loop.time()
+            if self._stopping or remaining <= 0:
+                break
+
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _flush(self, batch: list[dict]) -> None:
+        started = time.perf_counter()
+
+        delay = self._retry_base
+
+        try:
+            for attempt in range(self._max_retries + 1):
+                try:
+                    # The supabase client is synchronous; keep it off the event loop
+                    await run_blocking(self._insert_rows, batch)
+                except Exception as e:
+                    error = f"{type(e).__name__}: {str(e)}"
+                else:
+                    self._flushes += 1
+                    self._flushed_events += len(batch)
+                    break
+
+                if attempt == self._max_retries:
+                    self._failed_flushes += 1
+                    self._dropped_events += len(batch)
+                    print(f"[WriteBuffer] Dropped {len(batch)} events after {attempt + 1} attempts: {error}")
+                    break
+
+                self._retries += 1
+                self._retrying = len(batch)
+                print(f"[WriteBuffer] Failed to flush {len(batch)} events, retrying in {delay:.1f}s: {error}")
+                await asyncio.sleep(delay)
+                delay *= 2
+        finally:
+            self._retrying = 0
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self._last_flush_ms = elapsed_ms
+        self._max_flush_ms = max(self._max_flush_ms, elapsed_ms)
+        self._total_flush_ms += elapsed_ms
+
+    def stats(self) -> dict:
+        """Queue depth and flush counters."""
+        attempts = self._flushes + self._failed_flushes
+        return {
+            "queue_depth": self._queue.qsize(),
+            "queue_capacity": self._queue.maxsize,
+            "enqueued": self._enqueued,
+            "rejected": self._rejected,
+            "flushes": self._flushes,
+            "flushed_events": self._flushed_events,
+            "retries": self._retries,
+            "retrying_events": self._retrying,
+            "failed_flushes": self._failed_flushes,
+            "dropped_events": self._dropped_events,
+            "last_flush_ms": round(self._last_flush_ms, 3),
+            "max_flush_ms": round(self._max_flush_ms, 3),
+            "avg_flush_ms": round(self._total_flush_ms / attempts, 3) if attempts else 0.0,
+        }
+
+
+# Global buffer instance, created by the app lifespan when enabled
+_write_buffer: Optional[ClickWriteBuffer] = None
+
+
+def get_write_buffer() -> Optional[ClickWriteBuffer]:
+    """Return the running write buffer, or None when write-behind is off."""
+    return _write_buffer
+
+
+async def start_write_buffer() -> None:
+    """Create and start the global buffer if enabled in settings."""
+    global _write_buffer
+    settings = get_settings()
+
+    if not settings.track_write_behind or _write_buffer is not None:
+        return
+
+    _write_buffer = ClickWriteBuffer(
+        get_storage().insert_clicks,
+        max_size=settings.track_buffer_max_size,
+        batch_size=settings.track_buffer_batch_size,
+        flush_interval_ms=settings.track_buffer_flush_ms,
+        enqueue_timeout_ms=settings.track_buffer_enqueue_timeout_ms,
+        max_retries=settings.track_buffer_max_retries,
+        retry_base_ms=settings.track_buffer_retry_base_ms,
+    )
+    await _write_buffer.start()
+
+
+async def stop_write_buffer() -> None:
+    """Flush remaining events and stop the global buffer."""
+    global _write_buffer
+
+    if _write_buffer is not None:
+        await _write_buffer.stop()
+        _write_buffer = None
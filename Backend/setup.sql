@@ -48,3 +48,174 @@ CREATE INDEX IF NOT EXISTS idx_feature_clicks_timestamp ON feature_clicks(timest
 CREATE INDEX IF NOT EXISTS idx_feature_clicks_feature_name ON feature_clicks(feature_name);
 CREATE INDEX IF NOT EXISTS idx_profiles_age ON profiles(age);
 CREATE INDEX IF NOT EXISTS idx_profiles_gender ON profiles(gender);
+
+-- 7. Server-side aggregation for the analytics dashboard
+-- Returns one row per (feature, UTC day) with the profile join done here,
+-- so the API transfers groups instead of raw click rows. p_max_id leaves
+-- out clicks with higher ids (the /analytics cursor continues from it)
+DROP FUNCTION IF EXISTS analytics_click_counts(TIMESTAMPTZ, TIMESTAMPTZ, INTEGER, INTEGER, TEXT);
+
+CREATE OR REPLACE FUNCTION analytics_click_counts(
+  p_start TIMESTAMPTZ DEFAULT NULL,
+  p_end TIMESTAMPTZ DEFAULT NULL,
+  p_min_age INTEGER DEFAULT NULL,
+  p_max_age INTEGER DEFAULT NULL,
+  p_gender TEXT DEFAULT NULL,
+  p_max_id BIGINT DEFAULT NULL
+)
+RETURNS TABLE (feature_name TEXT, day DATE, count BIGINT)
+LANGUAGE sql STABLE
+AS $$
+  SELECT fc.feature_name,
+         (fc.timestamp AT TIME ZONE 'UTC')::date AS day,
+         COUNT(*) AS count
+  FROM feature_clicks fc
+  JOIN profiles p ON p.id = fc.user_id
+  WHERE (p_start IS NULL OR fc.timestamp >= p_start)
+    AND (p_end IS NULL OR fc.timestamp <= p_end)
+    AND (p_min_age IS NULL OR p.age >= p_min_age)
+    AND (p_max_age IS NULL OR p.age <= p_max_age)
+    AND (p_gender IS NULL OR p.gender = p_gender)
+    AND (p_max_id IS NULL OR fc.id <= p_max_id)
+  GROUP BY 1, 2
+  ORDER BY 2, 1;
+$$;
+
+-- 8. Daily rollup of clicks per feature x age group x gender
+-- Age groups match AGE_GROUPS / get_age_range() in services/analytics.py
+CREATE TABLE IF NOT EXISTS feature_clicks_daily (
+  day DATE NOT NULL,
+  feature_name TEXT NOT NULL,
+  age_group TEXT CHECK (age_group IN ('<18', '18-40', '>40')) NOT NULL,
+  gender TEXT NOT NULL,
+  count BIGINT NOT NULL DEFAULT 0,
+  PRIMARY KEY (day, feature_name, age_group, gender)
+);
+
+-- Only the service role reads or writes the rollup
+ALTER TABLE feature_clicks_daily ENABLE ROW LEVEL SECURITY;
+
+CREATE OR REPLACE FUNCTION age_group_of(p_age INTEGER)
+RETURNS TEXT
+LANGUAGE sql IMMUTABLE
+AS $$
+  SELECT CASE
+    WHEN p_age <= 17 THEN '<18'
+    WHEN p_age <= 40 THEN '18-40'
+    ELSE '>40'
+  END;
+$$;
+
+-- Insert click rows and bump their rollup cells in one transaction.
+-- p_events is a JSON array of {user_id, feature_name, timestamp?}
+CREATE OR REPLACE FUNCTION ingest_feature_clicks(p_events JSONB)
+RETURNS SETOF feature_clicks
+LANGUAGE sql
+AS $$
+  WITH inserted AS (
+    INSERT INTO feature_clicks (user_id, feature_name, timestamp)
+    SELECT e.user_id, e.feature_name, COALESCE(e."timestamp", NOW())
+    FROM jsonb_to_recordset(p_events) AS e(user_id UUID, feature_name TEXT, "timestamp" TIMESTAMPTZ)
+    RETURNING *
+  ), bumped AS (
+    INSERT INTO feature_clicks_daily AS d (day, feature_name, age_group, gender, count)
+    SELECT (i.timestamp AT TIME ZONE 'UTC')::date, i.feature_name, age_group_of(p.age), p.gender, COUNT(*)
+    FROM inserted i
+    JOIN profiles p ON p.id = i.user_id
+    GROUP BY 1, 2, 3, 4
+    ON CONFLICT (day, feature_name, age_group, gender)
+    DO UPDATE SET count = d.count + EXCLUDED.count
+  )
+  SELECT * FROM inserted;
+$$;
+
+-- Recompute rollup rows for [p_start_day, p_end_day] (NULL = unbounded)
+CREATE OR REPLACE FUNCTION rebuild_feature_clicks_daily(
+  p_start_day DATE DEFAULT NULL,
+  p_end_day DATE DEFAULT NULL
+)
+RETURNS BIGINT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  written BIGINT;
+BEGIN
+  -- Wait for running ingest_feature_clicks calls and hold off new ones
+  -- (and other rebuilds) until this transaction commits: otherwise an
+  -- ingest's upsert collides with the INSERT below, or its clicks are
+  -- counted by both
+  LOCK TABLE feature_clicks_daily IN SHARE ROW EXCLUSIVE MODE;
+
+  DELETE FROM feature_clicks_daily
+  WHERE (p_start_day IS NULL OR day >= p_start_day)
+    AND (p_end_day IS NULL OR day <= p_end_day);
+
+  INSERT INTO feature_clicks_daily (day, feature_name, age_group, gender, count)
+  SELECT (fc.timestamp AT TIME ZONE 'UTC')::date, fc.feature_name, age_group_of(p.age), p.gender, COUNT(*)
+  FROM feature_clicks fc
+  JOIN profiles p ON p.id = fc.user_id
+  WHERE (p_start_day IS NULL OR fc.timestamp >= p_start_day::timestamp AT TIME ZONE 'UTC')
+    AND (p_end_day IS NULL OR fc.timestamp < (p_end_day + 1)::timestamp AT TIME ZONE 'UTC')
+  GROUP BY 1, 2, 3, 4;
+
+  GET DIAGNOSTICS written = ROW_COUNT;
+  RETURN written;
+END;
+$$;
+
+-- Grouped counts for whole UTC days, read from the rollup
+CREATE OR REPLACE FUNCTION analytics_rollup_counts(
+  p_start_day DATE DEFAULT NULL,
+  p_end_day DATE DEFAULT NULL,
+  p_age_group TEXT DEFAULT NULL,
+  p_gender TEXT DEFAULT NULL
+)
+RETURNS TABLE (feature_name TEXT, day DATE, count BIGINT)
+LANGUAGE sql STABLE
+AS $$
+  SELECT d.feature_name, d.day, SUM(d.count)::BIGINT AS count
+  FROM feature_clicks_daily d
+  WHERE (p_start_day IS NULL OR d.day >= p_start_day)
+    AND (p_end_day IS NULL OR d.day <= p_end_day)
+    AND (p_age_group IS NULL OR d.age_group = p_age_group)
+    AND (p_gender IS NULL OR d.gender = p_gender)
+  GROUP BY 1, 2
+  ORDER BY 2, 1;
+$$;
+
+-- 9. Buckets other than UTC days for the analytics series
+-- Counts per (feature, bucket) where buckets are p_bucket_seconds long and
+-- start p_bucket_offset seconds before multiples of it since the epoch
+-- (local midnights for a UTC offset); bucket is that start in epoch
+-- seconds. Minute/hour and non-UTC day/week/month buckets use these.
+DROP FUNCTION IF EXISTS analytics_click_buckets(INTEGER, TIMESTAMPTZ, TIMESTAMPTZ, INTEGER, INTEGER, TEXT);
+DROP FUNCTION IF EXISTS analytics_click_buckets(INTEGER, INTEGER, TIMESTAMPTZ, TIMESTAMPTZ, INTEGER, INTEGER, TEXT);
+
+CREATE OR REPLACE FUNCTION analytics_click_buckets(
+  p_bucket_seconds INTEGER,
+  p_bucket_offset INTEGER DEFAULT 0,
+  p_start TIMESTAMPTZ DEFAULT NULL,
+  p_end TIMESTAMPTZ DEFAULT NULL,
+  p_min_age INTEGER DEFAULT NULL,
+  p_max_age INTEGER DEFAULT NULL,
+  p_gender TEXT DEFAULT NULL,
+  p_max_id BIGINT DEFAULT NULL
+)
+RETURNS TABLE (feature_name TEXT, bucket BIGINT, count BIGINT)
+LANGUAGE sql STABLE
+AS $$
+  SELECT fc.feature_name,
+         (floor((extract(epoch FROM fc.timestamp) + p_bucket_offset) / p_bucket_seconds) * p_bucket_seconds
+          - p_bucket_offset)::BIGINT AS bucket,
+         COUNT(*) AS count
+  FROM feature_clicks fc
+  JOIN profiles p ON p.id = fc.user_id
+  WHERE (p_start IS NULL OR fc.timestamp >= p_start)
+    AND (p_end IS NULL OR fc.timestamp <= p_end)
+    AND (p_min_age IS NULL OR p.age >= p_min_age)
+    AND (p_max_age IS NULL OR p.age <= p_max_age)
+    AND (p_gender IS NULL OR p.gender = p_gender)
+    AND (p_max_id IS NULL OR fc.id <= p_max_id)
+  GROUP BY 1, 2
+  ORDER BY 2, 1;
+$$;
@@ -0,0 +1,23 @@
+import os
+
+import pytest
+
+# Settings are read on first import of config; tests never reach Supabase
+os.environ.setdefault("SUPABASE_URL", "http://supabase.invalid")
+os.environ.setdefault("SUPABASE_KEY", "test")
+os.environ.setdefault("SUPABASE_SERVICE_KEY", "test")
+
+
+class _CappedPages:
+    def __init__(self, storage, max_rows: int):
+        self._storage = storage
+        self._max_rows = max_rows
+
+    def clicks_after(self, after_id: int, limit: int) -> list[dict]:
+        return self._storage.clicks_after(after_id, min(limit, self._max_rows))
+
+
+@pytest.fixture
+def capped_pages():
+    """Wrap a storage backend so its clicks_after pages stop at max_rows, like a server max-rows below page_size."""
+    return _CappedPages
@@ -0,0 +1,63 @@
+import pytest
+
+from services import admission as admission_module
+from services.admission import AdmissionRejected, TrackAdmission
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(admission_module.time, "monotonic", lambda: now[0])
+    return now
+
+
+def admit(admission: TrackAdmission, user_id: str, cost: int = 1) -> bool:
+    try:
+        admission.acquire(user_id, cost)
+    except AdmissionRejected:
+        return False
+    admission.release()
+    return True
+
+
+def test_single_events_are_limited_to_the_burst(clock):
+    admission = TrackAdmission(rate=10, burst=5, max_in_flight=0)
+
+    assert [admit(admission, "user") for _ in range(6)] == [True] * 5 + [False]
+    clock[0] += 0.1
+    assert admit(admission, "user")
+
+
+def test_batches_are_charged_per_event(clock):
+    admission = TrackAdmission(rate=10, burst=50, max_in_flight=0)
+
+    assert admit(admission, "user", 30)
+    assert not admit(admission, "user", 30)
+    assert admit(admission, "user", 20)
+    assert not admit(admission, "user")
+    # Other users have their own buckets
+    assert admit(admission, "other", 50)
+
+
+def test_batch_larger_than_the_burst_leaves_the_bucket_in_debt(clock):
+    admission = TrackAdmission(rate=10, burst=50, max_in_flight=0)
+
+    assert admit(admission, "user", 500)
+
+    # 500 events at 10/s: nothing more until the debt is paid off
+    clock[0] += 45
+    with pytest.raises(AdmissionRejected) as rejected:
+        admission.acquire("user")
+    assert rejected.value.retry_after == pytest.approx(0.1)
+
+    clock[0] += 5.1
+    assert admit(admission, "user")
+
+
+def test_large_batch_needs_a_full_bucket(clock):
+    admission = TrackAdmission(rate=10, burst=50, max_in_flight=0)
+
+    assert admit(admission, "user", 10)
+    assert not admit(admission, "user", 500)
+    clock[0] += 1
+    assert admit(admission, "user", 500)
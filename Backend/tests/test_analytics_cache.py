@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+from services.analytics_cache import AnalyticsCache
+
+KEY = ("2026-10-01", None, None, None, None)
+
+
+def make_compute(calls: list, delay: float = 0):
+    async def compute():
+        calls.append(len(calls))
+        await asyncio.sleep(delay)
+        return {"computed": len(calls)}
+
+    return compute
+
+
+def test_concurrent_misses_share_one_computation():
+    cache = AnalyticsCache()
+    calls = []
+    compute = make_compute(calls, delay=0.01)
+
+    async def run():
+        return await asyncio.gather(*(cache.get_or_compute(KEY, compute) for _ in range(20)))
+
+    results = asyncio.run(run())
+
+    assert calls == [0]
+    assert all(result is results[0] for result in results)
+
+
+def test_waiters_compute_again_when_the_computing_request_is_cancelled():
+    cache = AnalyticsCache()
+    calls = []
+    compute = make_compute(calls, delay=0.05)
+
+    async def run():
+        leader = asyncio.create_task(cache.get_or_compute(KEY, compute))
+        await asyncio.sleep(0.01)
+        waiters = [asyncio.create_task(cache.get_or_compute(KEY, compute)) for _ in range(5)]
+        await asyncio.sleep(0.01)
+
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await asyncio.gather(*waiters)
+
+    results = asyncio.run(run())
+
+    # One of the waiters took over; the others coalesced onto it
+    assert calls == [0, 1]
+    assert all(result == {"computed": 2} for result in results)
+    assert asyncio.run(cache.get_or_compute(KEY, compute)) == {"computed": 2}
+
+
+def test_cancelled_waiter_does_not_cancel_the_computation():
+    cache = AnalyticsCache()
+    calls = []
+    compute = make_compute(calls, delay=0.05)
+
+    async def run():
+        leader = asyncio.create_task(cache.get_or_compute(KEY, compute))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(cache.get_or_compute(KEY, compute))
+        await asyncio.sleep(0.01)
+
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        return await leader
+
+    assert asyncio.run(run()) == {"computed": 1}
+    assert calls == [0]
@@ -0,0 +1,125 @@
+import asyncio
+import base64
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+
+from routes.analytics import get_analytics
+from services.analytics_cache import make_cache_key
+from services.analytics_cursor import InvalidCursor, encode_cursor, fetch_click_deltas, read_cursor
+from services.buckets import SECONDS_PER_DAY
+from services.sqlite_storage import SQLiteStorage
+
+TIMESTAMP = "2026-10-17T10:00:00+00:00"
+DAY = int(datetime(2026, 10, 17, tzinfo=timezone.utc).timestamp())
+START = datetime(2026, 10, 10, tzinfo=timezone.utc)
+END = datetime(2026, 10, 17, 23, 59, 59, tzinfo=timezone.utc)
+FILTERS = make_cache_key(START, END, None, "Female", None)
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "analytics.db"))
+    storage.upsert_profile({"id": "user-1", "username": "ada", "age": 30, "gender": "Female"})
+    yield storage
+    storage.close()
+
+
+def test_cursor_cannot_be_combined_with_max_points():
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(get_analytics(
+            request=None, start_date=None, end_date=None, age_group=None, gender=None,
+            feature_name=None, bucket="day", tz_offset_minutes=0, max_points=100,
+            cursor="WzEsMCwwLCIiXQ", current_user={},
+        ))
+
+    assert error.value.status_code == 400
+
+
+def test_deltas_read_past_pages_capped_by_the_server(storage, capped_pages):
+    storage.insert_clicks([{"user_id": "user-1", "feature_name": "date_picker", "timestamp": TIMESTAMP}] * 10)
+
+    groups, high_id = fetch_click_deltas(
+        capped_pages(storage, max_rows=3), 0, None, None, None, None, SECONDS_PER_DAY, 0, 1000, 1000
+    )
+
+    assert groups == [("date_picker", DAY, 10)]
+    assert high_id == storage.latest_click_id()
+
+
+def test_cursor_round_trip():
+    issued_at = time.time()
+    cursor = encode_cursor(1234, issued_at, FILTERS)
+
+    assert read_cursor(cursor, FILTERS, 900) == (1234, int(issued_at))
+
+
+def test_expired_cursor_or_other_filters_read_as_none():
+    fresh = encode_cursor(1234, time.time(), FILTERS)
+    expired = encode_cursor(1234, time.time() - 901, FILTERS)
+
+    assert read_cursor(expired, FILTERS, 900) is None
+    assert read_cursor(fresh, make_cache_key(START, END, None, "Male", None), 900) is None
+    assert read_cursor(fresh, make_cache_key(START, END, None, "Female", None, "hour"), 900) is None
+
+
+@pytest.mark.parametrize("cursor", [
+    "not a cursor!",
+    base64.urlsafe_b64encode(b"{not json").decode(),
+    base64.urlsafe_b64encode(b"[1, 2, 3]").decode(),
+    base64.urlsafe_b64encode(b'[99, 1234, 0, "digest"]').decode(),
+    base64.urlsafe_b64encode(b'[1, "1234", 0, "digest"]').decode(),
+])
+def test_malformed_cursor_raises(cursor):
+    with pytest.raises(InvalidCursor):
+        read_cursor(cursor, FILTERS, 900)
+
+
+def _clicks(*spec: tuple[str, str, datetime]) -> list[dict]:
+    return [{"user_id": user, "feature_name": feature, "timestamp": ts.isoformat()} for user, feature, ts in spec]
+
+
+def _merge(*parts: list) -> dict:
+    merged: dict = {}
+    for groups in parts:
+        for feature, bucket, count in groups:
+            merged[(feature, bucket)] = merged.get((feature, bucket), 0) + count
+    return merged
+
+
+def test_full_response_plus_deltas_equals_a_recompute(storage):
+    storage.upsert_profile({"id": "user-2", "username": "bob", "age": 50, "gender": "Male"})
+    at = datetime(2026, 10, 15, 12, tzinfo=timezone.utc)
+    storage.insert_clicks(_clicks(
+        ("user-1", "date_picker", at), ("user-1", "chart_bar", at), ("user-2", "date_picker", at),
+    ))
+    aggregate = (START, END, None, "Female", SECONDS_PER_DAY, 0)
+    full, high_id = storage.grouped_counts_snapshot(*aggregate)
+
+    deltas = []
+    for batch in [
+        # New clicks, one by a user the filters leave out
+        _clicks(("user-1", "date_picker", END - timedelta(hours=1)), ("user-2", "chart_bar", END)),
+        # Backdated into buckets the full response already has, and
+        # before the window (not counted)
+        _clicks(
+            ("user-1", "date_picker", at),
+            ("user-1", "filter_age", START),
+            ("user-1", "chart_bar", START - timedelta(days=1)),
+        ),
+    ]:
+        storage.insert_clicks(batch)
+        groups, high_id = fetch_click_deltas(storage, high_id, START, END, None, "Female", SECONDS_PER_DAY, 0, 1000, 2)
+        deltas.append(groups)
+
+    assert _merge(full, *deltas) == _merge(storage.grouped_counts(*aggregate))
+    assert high_id == storage.latest_click_id()
+
+
+def test_deltas_over_max_rows_return_none(storage):
+    storage.insert_clicks(_clicks(*[("user-1", "date_picker", START)] * 5))
+
+    assert fetch_click_deltas(storage, 0, None, None, None, None, SECONDS_PER_DAY, 0, 4, 2) is None
+    assert fetch_click_deltas(storage, 0, None, None, None, None, SECONDS_PER_DAY, 0, 5, 2) is not None
@@ -0,0 +1,76 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from config import get_settings
+from services import blocking
+from services.blocking import run_blocking
+
+
+@pytest.fixture
+def pool_size(monkeypatch):
+    monkeypatch.setattr(get_settings(), "db_threadpool_size", 4)
+    # A fresh limiter per test: it binds to the event loop that first uses it
+    monkeypatch.setattr(blocking, "_limiter", None)
+    return 4
+
+
+def test_calls_never_exceed_the_pool_size(pool_size):
+    lock = threading.Lock()
+    running = 0
+    peak = 0
+
+    def query():
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        time.sleep(0.02)
+        with lock:
+            running -= 1
+
+    async def run():
+        await asyncio.gather(*(run_blocking(query) for _ in range(20)))
+
+    asyncio.run(run())
+
+    assert peak == pool_size
+
+
+def test_event_loop_keeps_running_during_blocking_calls(pool_size):
+    ticks = 0
+
+    async def heartbeat(stop: asyncio.Event):
+        nonlocal ticks
+        while not stop.is_set():
+            ticks += 1
+            await asyncio.sleep(0.005)
+
+    async def run():
+        stop = asyncio.Event()
+        beat = asyncio.create_task(heartbeat(stop))
+        started = time.perf_counter()
+        await asyncio.gather(*(run_blocking(time.sleep, 0.05) for _ in range(8)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await beat
+        return elapsed
+
+    elapsed = asyncio.run(run())
+
+    # Two rounds of four calls, not eight in a row on the loop
+    assert elapsed < 8 * 0.05
+    assert ticks >= 10
+
+
+def test_passes_arguments_and_raises_errors(pool_size):
+    def query(table, *, limit):
+        if limit < 0:
+            raise ValueError("negative limit")
+        return f"{table}:{limit}"
+
+    assert asyncio.run(run_blocking(query, "feature_clicks", limit=10)) == "feature_clicks:10"
+    with pytest.raises(ValueError):
+        asyncio.run(run_blocking(query, "feature_clicks", limit=-1))
@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from services.buckets import SECONDS_PER_DAY, BucketSpec, base_bucket, epoch_seconds
+
+
+def local_counts(spec: BucketSpec, timestamps: list[int]) -> dict[str, int]:
+    """Series labels and counts as /analytics builds them from base buckets."""
+    base: dict[int, int] = {}
+    for ts in timestamps:
+        start = base_bucket(ts, spec.base_seconds, spec.base_offset_seconds)
+        base[start] = base.get(start, 0) + 1
+    return {spec.label(start): count for start, count in spec.rebucket(base).items()}
+
+
+@pytest.mark.parametrize("bucket", ["day", "week", "month"])
+@pytest.mark.parametrize("offset_minutes", [0, 330, -420, 345])
+def test_calendar_buckets_at_an_offset_use_day_base_buckets(bucket, offset_minutes):
+    spec = BucketSpec(bucket, offset_minutes)
+
+    assert spec.base_seconds == SECONDS_PER_DAY
+    assert 0 <= spec.base_offset_seconds < SECONDS_PER_DAY
+
+
+@pytest.mark.parametrize("bucket", ["minute", "hour", "day", "week", "month"])
+@pytest.mark.parametrize("offset_minutes", [0, 330, -420, 345, 840])
+def test_series_matches_local_wall_clock(bucket, offset_minutes):
+    spec = BucketSpec(bucket, offset_minutes)
+    start = datetime(2026, 1, 28, tzinfo=timezone.utc)
+    moments = [start + timedelta(minutes=37 * i) for i in range(3000)]
+
+    expected: dict[str, int] = {}
+    for moment in moments:
+        local = moment + timedelta(minutes=offset_minutes)
+        if bucket == "minute":
+            label = local.strftime("%Y-%m-%dT%H:%M")
+        elif bucket == "hour":
+            label = local.strftime("%Y-%m-%dT%H:00")
+        elif bucket == "day":
+            label = local.strftime("%Y-%m-%d")
+        elif bucket == "week":
+            label = (local.date() - timedelta(days=local.weekday())).isoformat()
+        else:
+            label = local.strftime("%Y-%m")
+        expected[label] = expected.get(label, 0) + 1
+
+    assert local_counts(spec, [epoch_seconds(moment) for moment in moments]) == expected
+
+
+def test_base_bucket_floors_before_the_epoch():
+    assert base_bucket(-1, 60) == -60
+    assert base_bucket(-1, SECONDS_PER_DAY, 3_600) == -3_600
+    assert base_bucket(-3_601, SECONDS_PER_DAY, 3_600) == -3_600 - SECONDS_PER_DAY
@@ -0,0 +1,96 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import services.hot_store as hot_store
+from benchmarks.fake_supabase import FakeSupabase
+from config import get_settings
+from services.hot_store import ColumnarClickStore
+from services.user_dimensions import get_user_dimensions
+
+TIMESTAMP = "2026-10-17T10:00:00+00:00"
+DAY = int(datetime(2026, 10, 17, tzinfo=timezone.utc).timestamp())
+
+
+def _rows(ids: range) -> list[dict]:
+    return [{"id": i, "user_id": "user-1", "feature_name": "date_picker", "timestamp": TIMESTAMP} for i in ids]
+
+
+@pytest.fixture
+def store():
+    get_user_dimensions().upsert("user-1", 30, "Female")
+    store = ColumnarClickStore(window_days=365_000, chunk_size=4)
+    # Loaded: queries may be answered from here
+    store._covered_from_us = 0
+    return store
+
+
+def test_query_stops_at_max_id(store):
+    store._append_polled(None, _rows(range(1, 4)), 0)
+    # Inserted by this worker, ahead of what sync has read
+    store.ingest(None, _rows(range(5, 7)))
+
+    assert store.high_id == 3
+    assert store.query(None, None, None, None) == [("date_picker", DAY, 5)]
+    assert store.query(None, None, None, None, max_id=store.high_id) == [("date_picker", DAY, 3)]
+
+    # Sync reaches the other worker's click 4 and passes the local ones
+    store._append_polled(None, _rows(range(4, 7)), 0)
+
+    assert store.high_id == 6
+    assert store.query(None, None, None, None, max_id=store.high_id) == [("date_picker", DAY, 6)]
+
+
+def test_load_keeps_rows_written_during_the_backfill(monkeypatch):
+    get_user_dimensions().upsert("user-1", 30, "Female")
+    monkeypatch.setattr(get_settings(), "postgrest_max_rows", 5)
+    now = datetime.now(timezone.utc)
+    supabase = FakeSupabase()
+
+    def click(days_ago: float) -> dict:
+        timestamp = (now - timedelta(days=days_ago)).isoformat()
+        return {"user_id": "user-1", "feature_name": "date_picker", "timestamp": timestamp}
+
+    supabase.table("feature_clicks").insert([click(20 - i) for i in range(20)]).execute()
+    scan = hot_store.iter_click_pages
+
+    def scan_with_writes(*args, **kwargs):
+        for number, page in enumerate(scan(*args, **kwargs), 1):
+            yield page
+            if number == 3:
+                # Backdated into pages already read, then one still ahead
+                supabase.table("feature_clicks").insert([click(9), click(0)]).execute()
+
+    monkeypatch.setattr(hot_store, "iter_click_pages", scan_with_writes)
+    store = ColumnarClickStore(window_days=30, chunk_size=8)
+    store.load(supabase)
+
+    assert store.high_id == 22
+    assert sum(count for _, _, count in store.query(None, None, None, None)) == 22
+
+    supabase.table("feature_clicks").insert([click(2)]).execute()
+    store.sync(supabase)
+
+    assert store.high_id == 23
+    assert sum(count for _, _, count in store.query(None, None, None, None)) == 23
+
+
+def test_evict_drops_codes_of_users_no_longer_stored(store):
+    for user_id in ("user-2", "user-3"):
+        get_user_dimensions().upsert(user_id, 30, "Female")
+    old = (datetime.now(timezone.utc) - timedelta(days=400)).isoformat()
+    new = datetime.now(timezone.utc).isoformat()
+    store._window_us = 365 * 86_400_000_000
+
+    store._append_polled(None, [
+        {"id": i, "user_id": f"user-{i}", "feature_name": "date_picker", "timestamp": old} for i in (1, 2)
+    ] + [
+        {"id": 3, "user_id": "user-1", "feature_name": "date_picker", "timestamp": old},
+        {"id": 4, "user_id": "user-3", "feature_name": "chart_bar", "timestamp": old},
+        {"id": 5, "user_id": "user-3", "feature_name": "chart_bar", "timestamp": new},
+    ], 0)
+
+    assert store.evict() == 1
+    assert store._users == {"user-3": 0}
+    assert store._chunks[0].user[:store._chunks[0].size].tolist() == [0]
+    assert store.stats()["users"] == 1
@@ -0,0 +1,51 @@
+import pytest
+
+from services.hyperloglog import HyperLogLog, standard_error
+
+
+def sketch_of(values, precision: int = 12) -> HyperLogLog:
+    sketch = HyperLogLog(precision)
+    for value in values:
+        sketch.add(value)
+    return sketch
+
+
+def test_empty_sketch_estimates_zero():
+    assert HyperLogLog().estimate() == 0
+
+
+@pytest.mark.parametrize("precision", [10, 12, 14])
+@pytest.mark.parametrize("cardinality", [10, 1_000, 20_000, 200_000])
+def test_estimate_within_a_few_standard_errors(precision, cardinality):
+    sketch = sketch_of((f"user-{i}" for i in range(cardinality)), precision)
+
+    relative_error = abs(sketch.estimate() - cardinality) / cardinality
+    assert relative_error < 4 * standard_error(precision)
+
+
+def test_adding_a_value_again_changes_nothing():
+    sketch = sketch_of(f"user-{i}" for i in range(500))
+    registers = bytes(sketch.registers)
+
+    for i in range(500):
+        sketch.add(f"user-{i}")
+
+    assert bytes(sketch.registers) == registers
+
+
+def test_merge_equals_sketch_of_the_union():
+    first = sketch_of(f"user-{i}" for i in range(0, 6_000))
+    second = sketch_of(f"user-{i}" for i in range(4_000, 10_000))
+    union = sketch_of(f"user-{i}" for i in range(10_000))
+
+    first.merge(second)
+
+    assert bytes(first.registers) == bytes(union.registers)
+
+    merged = HyperLogLog.union([sketch_of(["a"]), sketch_of(["b"])])
+    assert bytes(merged.registers) == bytes(sketch_of(["a", "b"]).registers)
+
+
+def test_merge_rejects_other_precisions():
+    with pytest.raises(ValueError):
+        HyperLogLog(12).merge(HyperLogLog(14))
@@ -0,0 +1,54 @@
+from services.live import LiveCounters
+
+NOW = 1_760_000_000
+
+
+def rows(*features: str) -> list[dict]:
+    # No timestamp: counted at `now`
+    return [{"feature_name": feature} for feature in features]
+
+
+def test_snapshot_and_drain():
+    counters = LiveCounters(window_seconds=60)
+    counters.record(rows("chart_bar", "chart_bar", "date_picker"), now=NOW)
+    counters.record(rows("chart_bar"), now=NOW + 1)
+
+    assert counters.snapshot(NOW + 1) == {
+        "chart_bar": [[NOW, 2], [NOW + 1, 1]],
+        "date_picker": [[NOW, 1]],
+    }
+    assert counters.drain() == counters.snapshot(NOW + 1)
+    assert counters.drain() == {}
+
+
+def test_seconds_leave_the_window():
+    counters = LiveCounters(window_seconds=60)
+    counters.record(rows("chart_bar"), now=NOW)
+    counters.record(rows("date_picker"), now=NOW + 59)
+
+    assert counters.snapshot(NOW + 60) == {"date_picker": [[NOW + 59, 1]]}
+
+    # The slot is reused for a later second without the old counts
+    counters.record(rows("filter_age"), now=NOW + 60)
+    assert counters.snapshot(NOW + 60) == {"date_picker": [[NOW + 59, 1]], "filter_age": [[NOW + 60, 1]]}
+
+
+def test_memory_follows_the_window_not_every_feature_ever_seen():
+    counters = LiveCounters(window_seconds=10)
+    for i in range(1000):
+        counters.record(rows(f"feature_{i}"), now=NOW + i)
+
+    # Only the last ten seconds' features are held
+    held = sum(len(slot) for slot in counters._slots)
+    assert held == 10
+    assert sorted(counters.snapshot(NOW + 999)) == [f"feature_{i}" for i in range(990, 1000)]
+
+
+def test_events_outside_the_window_are_counted_apart():
+    counters = LiveCounters(window_seconds=60)
+    counters.record(
+        [{"feature_name": "chart_bar", "timestamp": "2020-01-01T00:00:00+00:00"}] + rows("chart_bar"), now=NOW
+    )
+
+    assert counters.snapshot(NOW) == {"chart_bar": [[NOW, 1]]}
+    assert counters.stats()["outside_window"] == 1
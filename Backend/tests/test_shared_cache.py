@@ -0,0 +1,98 @@
+import asyncio
+import time
+
+import pytest
+
+from services.analytics_cache import AnalyticsCache
+from services.shared_cache import SharedCache
+
+KEY = ("2026-10-01", None, None, None, None)
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "shared_cache.db")
+
+
+@pytest.fixture
+def shared(path):
+    cache = SharedCache(path, max_entries=3)
+    yield cache
+    cache.close()
+
+
+def test_get_returns_unexpired_entries(shared):
+    now = time.time()
+    shared.set("tokens", "a", b"alpha", now + 60, now - 1)
+    shared.set("tokens", "b", b"beta", now - 1)
+
+    assert shared.get("tokens", "a") == (b"alpha", now - 1, now + 60)
+    assert shared.get("tokens", "b") is None
+    assert shared.get("analytics", "a") is None
+    assert shared.get("tokens", "missing") is None
+    assert shared.stats()["hits"] == 1
+    assert shared.stats()["misses"] == 3
+
+
+def test_set_replaces_and_delete_removes(shared):
+    expires_at = time.time() + 60
+    shared.set("tokens", "a", b"old", expires_at)
+    shared.set("tokens", "a", b"new", expires_at)
+    assert shared.get("tokens", "a")[0] == b"new"
+
+    shared.delete("tokens", "a")
+    assert shared.get("tokens", "a") is None
+
+
+def test_sweep_removes_expired_then_trims_to_max_entries(shared):
+    now = time.time()
+    for i in range(2):
+        shared.set("tokens", f"expired-{i}", b"x", now - 1)
+    for i in range(5):
+        shared.set("tokens", f"live-{i}", b"x", now + 60 + i)
+
+    assert shared.sweep() == 4
+
+    kept = [key for key in (f"live-{i}" for i in range(5)) if shared.get("tokens", key) is not None]
+    # The soonest to expire go first
+    assert kept == ["live-2", "live-3", "live-4"]
+    assert shared.sweep() == 0
+
+
+def test_instances_on_one_file_share_entries(path, shared):
+    other = SharedCache(path)
+    try:
+        shared.set("analytics", "k", b"computed here", time.time() + 60)
+        assert other.get("analytics", "k")[0] == b"computed here"
+
+        other.delete("analytics", "k")
+        assert shared.get("analytics", "k") is None
+    finally:
+        other.close()
+
+
+def test_analytics_cache_ignores_shared_entries_from_before_its_last_bump(shared):
+    cache = AnalyticsCache(ttl_seconds=30)
+    cache.use_shared(shared, bytes, bytes)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        return b"fresh"
+
+    cache.bump_generation()
+    # Stored by another worker before this one saw new clicks
+    shared.set("analytics", repr(KEY), b"stale", time.time() + 30, cache._bumped_at - 1)
+
+    assert cache._load_shared(KEY) is None
+    assert asyncio.run(cache.get_or_compute(KEY, compute)) == b"fresh"
+    assert calls == [1]
+
+    # Stored after the bump: another worker picks it up without computing
+    shared.set("analytics", repr(("other",)), b"shared", time.time() + 30, time.time())
+    other_worker = AnalyticsCache(ttl_seconds=30)
+    other_worker.use_shared(shared, bytes, bytes)
+
+    assert asyncio.run(other_worker.get_or_compute(("other",), compute)) == b"shared"
+    assert calls == [1]
+    assert other_worker.stats()["shared_hits"] == 1
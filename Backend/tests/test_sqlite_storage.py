@@ -0,0 +1,82 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from services.buckets import SECONDS_PER_DAY, base_bucket, epoch_seconds
+from services.sqlite_storage import SQLiteStorage
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "analytics.db"))
+    storage.upsert_profile({"id": "user-1", "username": "ada", "age": 30, "gender": "Female"})
+    yield storage
+    storage.close()
+
+
+TIMESTAMPS = [
+    "1969-12-31T23:59:59.500000+00:00",
+    "1969-12-31T12:00:00+00:00",
+    "1969-12-30T23:00:00+00:00",
+    "1970-01-01T00:00:00+00:00",
+    "1970-01-01T05:30:00+00:00",
+    "2026-10-17T18:45:12+00:00",
+]
+
+
+@pytest.mark.parametrize("base_seconds, base_offset_seconds", [
+    (SECONDS_PER_DAY, 0),
+    (3_600, 0),
+    (60, 0),
+    (SECONDS_PER_DAY, 19_800),   # UTC+05:30
+    (SECONDS_PER_DAY, 61_200),   # UTC-07:00
+])
+def test_grouped_counts_floor_to_bucket_starts(storage, base_seconds, base_offset_seconds):
+    storage.insert_clicks([
+        {"user_id": "user-1", "feature_name": "date_picker", "timestamp": ts} for ts in TIMESTAMPS
+    ])
+
+    expected: dict[int, int] = {}
+    for ts in TIMESTAMPS:
+        # epoch_seconds floors sub-second parts, as the bucket must
+        start = base_bucket(epoch_seconds(ts), base_seconds, base_offset_seconds)
+        expected[start] = expected.get(start, 0) + 1
+
+    groups = storage.grouped_counts(None, None, None, None, base_seconds, base_offset_seconds)
+
+    assert {bucket: count for _, bucket, count in groups} == expected
+
+
+def test_grouped_counts_apply_filters(storage):
+    storage.upsert_profile({"id": "user-2", "username": "bob", "age": 15, "gender": "Male"})
+    storage.insert_clicks([
+        {"user_id": "user-1", "feature_name": "date_picker", "timestamp": "2026-10-17T10:00:00+00:00"},
+        {"user_id": "user-2", "feature_name": "date_picker", "timestamp": "2026-10-17T11:00:00+00:00"},
+        {"user_id": "user-2", "feature_name": "chart_bar", "timestamp": "2026-10-18T11:00:00+00:00"},
+    ])
+    day = epoch_seconds(datetime(2026, 10, 17, tzinfo=timezone.utc))
+
+    assert sorted(storage.grouped_counts(None, None, "<18", None)) == [
+        ("chart_bar", day + SECONDS_PER_DAY, 1), ("date_picker", day, 1)
+    ]
+    assert storage.grouped_counts(None, datetime(2026, 10, 17, 23, tzinfo=timezone.utc), None, "Female") == [
+        ("date_picker", day, 1)
+    ]
+
+
+def test_snapshot_counts_stop_at_the_high_id(storage, monkeypatch):
+    click = {"user_id": "user-1", "feature_name": "date_picker", "timestamp": "2026-10-17T10:00:00+00:00"}
+    storage.insert_clicks([click, click])
+    latest_click_id = storage.latest_click_id
+
+    def read_then_insert():
+        # A click stored between reading the id and aggregating
+        high_id = latest_click_id()
+        storage.insert_clicks([click])
+        return high_id
+
+    monkeypatch.setattr(storage, "latest_click_id", read_then_insert)
+    groups, high_id = storage.grouped_counts_snapshot(None, None, None, None)
+
+    assert [count for _, _, count in groups] == [2]
+    assert [row["id"] for row in storage.clicks_after(high_id, 10)] == [high_id + 1]
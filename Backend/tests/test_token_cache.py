@@ -0,0 +1,139 @@
+import asyncio
+import tracemalloc
+
+import pytest
+
+from middleware.auth import TokenCache
+
+
+def make_verify(calls: list, delay: float = 0):
+    async def verify(token: str):
+        calls.append(token)
+        await asyncio.sleep(delay)
+        return {"id": token, "email": f"{token}@example.com", "role": "authenticated", "metadata": {}}, None
+
+    return verify
+
+
+def test_memory_bounded_under_many_distinct_tokens():
+    cache = TokenCache(ttl_seconds=300, max_entries=1000)
+
+    async def verify(token: str):
+        return {"id": token, "email": f"{token}@example.com", "role": "authenticated", "metadata": {}}, None
+
+    async def run(start: int, stop: int):
+        for i in range(start, stop):
+            await cache.get_or_verify(f"token-{i}", verify)
+
+    tracemalloc.start()
+    try:
+        asyncio.run(run(0, 10_000))
+        after_warmup, _ = tracemalloc.get_traced_memory()
+        asyncio.run(run(10_000, 100_000))
+        after_all, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert len(cache) == 1000
+    stats = cache.stats()
+    assert stats["evictions"] == 99_000
+    assert stats["inflight"] == 0
+    # Ten times the tokens, about the same memory
+    assert after_all - after_warmup < 100_000
+
+
+def test_evicts_least_recently_used():
+    cache = TokenCache(ttl_seconds=300, max_entries=2)
+    cache.set("a", {"id": "a"})
+    cache.set("b", {"id": "b"})
+    assert cache.get("a") is not None
+    cache.set("c", {"id": "c"})
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+
+
+def test_concurrent_misses_share_one_verification():
+    cache = TokenCache()
+    calls = []
+    verify = make_verify(calls, delay=0.01)
+
+    async def run():
+        return await asyncio.gather(*(cache.get_or_verify("token", verify) for _ in range(50)))
+
+    results = asyncio.run(run())
+
+    assert calls == ["token"]
+    assert all(result is results[0] for result in results)
+    assert cache.stats()["coalesced"] == 49
+    assert cache.stats()["inflight"] == 0
+
+
+def test_failed_verification_reaches_waiters_and_is_not_cached():
+    cache = TokenCache()
+    calls = []
+
+    async def verify(token: str):
+        calls.append(token)
+        await asyncio.sleep(0.01)
+        raise ValueError("invalid token")
+
+    async def run():
+        return await asyncio.gather(
+            *(cache.get_or_verify("token", verify) for _ in range(5)), return_exceptions=True
+        )
+
+    results = asyncio.run(run())
+
+    assert len(calls) == 1
+    assert all(isinstance(result, ValueError) for result in results)
+
+    with pytest.raises(ValueError):
+        asyncio.run(cache.get_or_verify("token", verify))
+    assert len(calls) == 2
+
+
+def test_waiters_verify_again_when_the_verifier_is_cancelled():
+    cache = TokenCache()
+    calls = []
+    verify = make_verify(calls, delay=0.05)
+
+    async def run():
+        verifier = asyncio.create_task(cache.get_or_verify("token", verify))
+        await asyncio.sleep(0.01)
+        waiters = [asyncio.create_task(cache.get_or_verify("token", verify)) for _ in range(5)]
+        await asyncio.sleep(0.01)
+
+        verifier.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await verifier
+        return await asyncio.gather(*waiters)
+
+    results = asyncio.run(run())
+
+    # One of the waiters took over; the others coalesced onto it
+    assert calls == ["token", "token"]
+    assert all(result["id"] == "token" for result in results)
+    assert cache.get("token") is not None
+    assert cache.stats()["inflight"] == 0
+
+
+def test_cancelled_waiter_does_not_cancel_the_verification():
+    cache = TokenCache()
+    calls = []
+    verify = make_verify(calls, delay=0.05)
+
+    async def run():
+        verifier = asyncio.create_task(cache.get_or_verify("token", verify))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(cache.get_or_verify("token", verify))
+        await asyncio.sleep(0.01)
+
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        return await verifier
+
+    assert asyncio.run(run())["id"] == "token"
+    assert calls == ["token"]
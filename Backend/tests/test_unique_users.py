@@ -0,0 +1,79 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from services.buckets import SECONDS_PER_DAY, BucketSpec, epoch_seconds
+from services.sqlite_storage import SQLiteStorage
+from services.unique_users import UniqueUserSketches
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "analytics.db"))
+    yield storage
+    storage.close()
+
+
+def test_sync_reads_past_pages_capped_by_the_server(storage, capped_pages):
+    timestamp = datetime.now(timezone.utc).isoformat()
+    for i in range(10):
+        storage.upsert_profile({"id": f"user-{i}", "username": f"u{i}", "age": 30, "gender": "Female"})
+    storage.insert_clicks([
+        {"user_id": f"user-{i}", "feature_name": "date_picker", "timestamp": timestamp} for i in range(10)
+    ])
+    sketches = UniqueUserSketches(precision=10)
+
+    assert sketches.sync(capped_pages(storage, max_rows=3)) == 10
+    assert sketches.stats()["high_id"] == storage.latest_click_id()
+
+
+@pytest.fixture
+def loaded(storage):
+    """Sketches over a 30-day window; clicks today and 40 days back."""
+    now = datetime.now(timezone.utc)
+    for i, gender in enumerate(["Female", "Female", "Male"]):
+        storage.upsert_profile({"id": f"user-{i}", "username": f"u{i}", "age": 30, "gender": gender})
+    storage.insert_clicks([
+        {"user_id": "user-0", "feature_name": "date_picker", "timestamp": now.isoformat()},
+        {"user_id": "user-0", "feature_name": "date_picker", "timestamp": now.isoformat()},
+        {"user_id": "user-1", "feature_name": "date_picker", "timestamp": now.isoformat()},
+        {"user_id": "user-2", "feature_name": "chart_bar", "timestamp": now.isoformat()},
+        {"user_id": "user-2", "feature_name": "chart_bar", "timestamp": (now - timedelta(days=40)).isoformat()},
+    ])
+    sketches = UniqueUserSketches(precision=10, window_days=30)
+    sketches.load(storage)
+    return sketches, now
+
+
+def test_query_counts_distinct_users(loaded):
+    sketches, now = loaded
+    today = epoch_seconds(now) // SECONDS_PER_DAY * SECONDS_PER_DAY
+
+    per_feature, per_bucket = sketches.query(now - timedelta(days=7), now, None, None, None, BucketSpec())
+    assert per_feature == {"date_picker": 2, "chart_bar": 1}
+    assert per_bucket == {today: 3}
+
+    per_feature, per_bucket = sketches.query(now - timedelta(days=7), now, None, "Female", "date_picker", BucketSpec())
+    assert per_feature == {"date_picker": 2}
+    assert per_bucket == {today: 2}
+
+
+def test_query_refuses_days_before_the_window(loaded):
+    sketches, now = loaded
+
+    assert sketches.query(now - timedelta(days=40), now, None, None, None, BucketSpec()) is None
+    # No start date reaches back past the evicted days too
+    assert sketches.query(None, now, None, None, None, BucketSpec()) is None
+
+
+@pytest.mark.parametrize("buckets", [BucketSpec("hour"), BucketSpec("minute"), BucketSpec("day", 60)])
+def test_query_refuses_sub_day_and_non_utc_buckets(loaded, buckets):
+    sketches, now = loaded
+
+    assert sketches.query(now - timedelta(days=7), now, None, None, None, buckets) is None
+
+
+def test_query_before_load_returns_none():
+    sketches = UniqueUserSketches()
+
+    assert sketches.query(None, None, None, None, None, BucketSpec()) is None
@@ -0,0 +1,72 @@
+from types import SimpleNamespace
+
+from services.user_dimensions import UserDimensionCache
+
+
+class FakeProfiles:
+    """Just enough of the supabase query builder for a paged load."""
+
+    def __init__(self, rows: list[dict], on_page=None):
+        self._rows = sorted(rows, key=lambda row: row["id"])
+        self._on_page = on_page
+        self._after = None
+        self._limit = None
+
+    def table(self, name):
+        self._after = None
+        return self
+
+    def select(self, columns):
+        return self
+
+    def gt(self, column, value):
+        self._after = value
+        return self
+
+    def order(self, column):
+        return self
+
+    def limit(self, count):
+        self._limit = count
+        return self
+
+    def execute(self):
+        rows = [row for row in self._rows if self._after is None or row["id"] > self._after]
+        if self._on_page is not None:
+            self._on_page()
+        return SimpleNamespace(data=rows[:self._limit])
+
+
+def profile(user_id: str, age: int, gender: str) -> dict:
+    return {"id": user_id, "age": age, "gender": gender, "created_at": "2026-01-01T00:00:00+00:00"}
+
+
+def test_load_replaces_the_cache():
+    cache = UserDimensionCache(page_size=2)
+    cache.upsert("gone", 30, "Other")
+
+    loaded = cache.load(FakeProfiles([profile("a", 15, "Male"), profile("b", 30, "Female"), profile("c", 50, "Other")]))
+
+    assert loaded == 3
+    assert cache.get("a") == ("<18", "Male")
+    assert cache.get("c") == (">40", "Other")
+    assert "gone" not in cache
+
+
+def test_upserts_during_a_load_are_kept():
+    cache = UserDimensionCache(page_size=1)
+    rows = [profile("a", 15, "Male"), profile("b", 30, "Female")]
+
+    def register_during_load():
+        # A registration and a profile edit land while the pages are read
+        cache.upsert("new", 25, "Female")
+        cache.upsert("a", 45, "Male")
+
+    cache.load(FakeProfiles(rows, on_page=register_during_load))
+
+    assert cache.get("new") == ("18-40", "Female")
+    assert cache.get("a") == (">40", "Male")
+    assert cache.get("b") == ("18-40", "Female")
+
+    cache.upsert("later", 70, "Other")
+    assert cache.get("later") == (">40", "Other")
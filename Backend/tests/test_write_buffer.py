@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+from services.write_buffer import BufferFullError, ClickWriteBuffer
+
+
+def flaky_insert(failures: int, stored: list):
+    attempts = 0
+
+    def insert(rows):
+        nonlocal attempts
+        attempts += 1
+        if attempts <= failures:
+            raise ConnectionError("database unavailable")
+        stored.extend(rows)
+        return rows
+
+    return insert
+
+
+def click(i: int) -> dict:
+    return {"user_id": f"user-{i}", "feature_name": "date_picker"}
+
+
+def test_failed_flush_is_retried_before_dropping():
+    stored = []
+    buffer = ClickWriteBuffer(flaky_insert(2, stored), flush_interval_ms=10, retry_base_ms=1)
+
+    async def run():
+        await buffer.start()
+        await buffer.put_many([click(i) for i in range(3)])
+        await buffer.stop()
+
+    asyncio.run(run())
+
+    stats = buffer.stats()
+    assert len(stored) == 3
+    assert stats["retries"] == 2
+    assert stats["flushes"] == 1
+    assert stats["failed_flushes"] == 0
+    assert stats["dropped_events"] == 0
+
+
+def test_batch_dropped_after_max_retries():
+    stored = []
+    buffer = ClickWriteBuffer(flaky_insert(100, stored), flush_interval_ms=10, max_retries=3, retry_base_ms=1)
+
+    async def run():
+        await buffer.start()
+        await buffer.put_many([click(i) for i in range(3)])
+        await buffer.stop()
+
+    asyncio.run(run())
+
+    stats = buffer.stats()
+    assert stored == []
+    assert stats["retries"] == 3
+    assert stats["failed_flushes"] == 1
+    assert stats["dropped_events"] == 3
+    assert stats["retrying_events"] == 0
+
+
+def test_retried_batch_counts_against_capacity():
+    stored = []
+    buffer = ClickWriteBuffer(
+        flaky_insert(1, stored), max_size=5, flush_interval_ms=10, enqueue_timeout_ms=10, retry_base_ms=200
+    )
+
+    async def run():
+        await buffer.start()
+        await buffer.put_many([click(i) for i in range(4)])
+        # The flusher took the four events and is waiting to retry them
+        await asyncio.sleep(0.1)
+        assert buffer.stats()["retrying_events"] == 4
+
+        with pytest.raises(BufferFullError):
+            await buffer.put_many([click(i) for i in range(2)])
+        await buffer.put(click(4))
+        await buffer.stop()
+
+    asyncio.run(run())
+
+    assert len(stored) == 5